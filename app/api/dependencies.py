@@ -1,3 +1,20 @@
+import os
 from concurrent.futures import ThreadPoolExecutor
+from app.db import AsyncDatabase
+from app.hnsw import HNSW
+from app.metrics import ADMISSION_PENDING
+from app.services import Similarity, SearchCoalescer, SimilarCache, AdmissionController, Warmup, ViewCounter
+from app.settings.config import SEARCH_WORKERS
 
-executor = ThreadPoolExecutor(max_workers=1)
\ No newline at end of file
+# OMP-потоки FAISS делим между воркерами пула, чтобы не было переподписки ядер
+HNSW.set_omp_threads(max(1, (os.cpu_count() or 1) // SEARCH_WORKERS))
+
+executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+coalescer = SearchCoalescer(executor)
+database = AsyncDatabase()
+admission = AdmissionController()
+ADMISSION_PENDING.set_function(lambda: admission.pending)
+similar_cache = SimilarCache()
+similarity = Similarity(coalescer, database, admission, on_change=similar_cache.clear)
+warmup = Warmup(similarity, coalescer, database)
+views = ViewCounter(database)
@@ -1,11 +1,13 @@
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
 from app.db import Migrator
-from app.api.routers import similar_router, feedback_router
-from app.settings.config import SITE_BASE_PATH, BASE_DIR
+from app.api.routers import similar_router, feedback_router, metrics_router
+from app.api.dependencies import similarity, database, warmup, views
+from app.settings.config import SITE_BASE_PATH, BASE_DIR, WARMUP_ENABLED, INDEX_RELOAD_SECONDS
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,11 +20,44 @@ path_for_static = f"{SITE_BASE_PATH}/static" if SITE_BASE_PATH else "/static"
 async def lifespan(app: FastAPI):
     logger.info("App init...")
     Migrator().apply_schema()
+
+    warmup_task = None
+    if WARMUP_ENABLED:
+        # прогрев идёт в фоне: процесс уже отвечает, готовность видна в /similar/ready
+        logger.info("Starting warmup...")
+        warmup.logger = logger
+        warmup_task = asyncio.create_task(warmup.run())
+    else:
+        logger.info("Loading search engine...")
+        try:
+            engine = await asyncio.to_thread(similarity.load_engine)
+            logger.info(f"Search engine loaded ({engine.index.ntotal:,} vectors, {len(engine.books):,} books)")
+        except FileNotFoundError as e:
+            logger.warning(f"Search engine not loaded, will retry on first search: {e}")
+        warmup.skip()
+
+    reload_task = None
+    if INDEX_RELOAD_SECONDS > 0:
+        # новая версия индекса подхватывается без перезапуска процесса
+        reload_task = asyncio.create_task(similarity.watch_index(INDEX_RELOAD_SECONDS, logger))
+
+    views_task = asyncio.create_task(views.run(logger))
+
     logger.info("App init finished")
     yield
 
+    for task in (warmup_task, reload_task, views_task):
+        if task is not None and not task.done():
+            task.cancel()
+    try:
+        await views.flush()
+    except Exception as e:
+        logger.warning(f"Views not saved on shutdown: {e}")
+    database.close()
+
 app = FastAPI(title="Book Similarity HTML API", lifespan=lifespan)
 app.mount(path_for_static, StaticFiles(directory=f"{str(BASE_DIR)}/api/static"), name="static")
 
 app.include_router(similar_router, prefix="/similar")
-app.include_router(feedback_router, prefix="/similar/feedback")
\ No newline at end of file
+app.include_router(feedback_router, prefix="/similar/feedback")
+app.include_router(metrics_router)
\ No newline at end of file
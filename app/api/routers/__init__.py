@@ -1,4 +1,5 @@
 from .similar_router import router as similar_router
 from .feedback_router import router as feedback_router
+from .metrics_router import router as metrics_router
 
-__all__ = ["similar_router", "feedback_router"]
\ No newline at end of file
+__all__ = ["similar_router", "feedback_router", "metrics_router"]
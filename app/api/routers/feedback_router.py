@@ -1,33 +1,46 @@
 from fastapi import APIRouter, HTTPException
 from app.models import Book, FeedbackReq, Feedbacks
-from app.db import db, BookRepository, FeedbackRepository, SimilarRepository
+from app.db import BookRepository, FeedbackRepository, SimilarRepository
+from ..dependencies import similar_cache, database
 
 router = APIRouter()
 
+def _submit(conn, fb: FeedbackReq) -> int | None:
+    source_row = BookRepository().get_by_file(conn, fb.source_file_name)
+    candidate_row = BookRepository().get_by_file(conn, fb.candidate_file_name)
+    if not source_row or not candidate_row:
+        return None
+
+    source = Book.map(source_row)
+    candidate = Book.map(candidate_row)
+
+    if fb.label > 0:
+        FeedbackRepository.submit(conn, source.id, candidate.id, fb.label)
+    elif fb.label == 0:
+        FeedbackRepository.delete(conn, source.id, candidate.id)
+    elif fb.label < 0:
+        FeedbackRepository.submit(conn, source.id, candidate.id, fb.label)
+        SimilarRepository().delete(conn, source.id, candidate.id)
+
+    return source.id
+
 @router.post("/")
 async def submit_feedback(fb: FeedbackReq):
     try:
-        with db() as conn:
-            source = Book.map(BookRepository().get_by_file(conn, fb.source_file_name))
-            candidate = Book.map(BookRepository().get_by_file(conn, fb.candidate_file_name))
-
-            if fb.label > 0:
-                FeedbackRepository.submit(conn, source.id, candidate.id, fb.label)
-            elif fb.label == 0:
-                FeedbackRepository.delete(conn, source.id, candidate.id)
-            elif fb.label < 0:
-                FeedbackRepository.submit(conn, source.id, candidate.id, fb.label)
-                SimilarRepository().delete(conn, source.id, candidate.id)
-
-        return {"status": "ok"}
+        source_id = await database.write(_submit, fb)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    if source_id is None:
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+
+    similar_cache.invalidate_book(source_id)
+    return {"status": "ok"}
     
 @router.get("/")
 async def get_all_feedback():
     try:
-        with db() as conn:
-            feedbacks = Feedbacks(FeedbackRepository.get_all(conn))
+        feedbacks = Feedbacks(await database.read(FeedbackRepository.get_all))
 
         return {
             "feedback": [
@@ -41,4 +54,4 @@ async def get_all_feedback():
         }
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
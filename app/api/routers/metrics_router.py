@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.metrics import REGISTRY
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # текстовый формат Prometheus 0.0.4
+    return PlainTextResponse(REGISTRY.expose(), media_type="text/plain; version=0.0.4; charset=utf-8")
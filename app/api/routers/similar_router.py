@@ -1,21 +1,58 @@
-import asyncio
+import hashlib
 import json
 import time
+from contextlib import aclosing
 
-from fastapi import APIRouter, Request, Query
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, Query, Response
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 
-from app.db import db, BookRepository, SimilarRepository, EmbeddingsRepository, FeedbackRepository
-from app.models import Book, Feedbacks
+from app.db import BookRepository, SimilarRepository, EmbeddingsRepository, FeedbackRepository
+from app.models import Book, Embedding, Feedbacks, Similar, SimilarBatchReq
 from app.utils import Html
-from app.services import TaskState, Similarity
-from ..dependencies import executor
-from app.settings.config import SITE_BASE_PATH
+from app.services import AdmissionRejected
+from app.metrics import memory_usage
+from ..dependencies import similarity, similar_cache, database, admission, warmup, views
+from app.settings.config import SITE_BASE_PATH, TRUSTED_PROXIES
 
 router = APIRouter()
-similarity = Similarity()
 path_for_static = f"{SITE_BASE_PATH}/static" if SITE_BASE_PATH else "/static"
 
+def _make_etag(book_id: int, limit: int, exclude_same_author: bool, feedback_fingerprint: tuple[int, int]) -> str:
+    raw = f"{similarity.index_version}:{book_id}:{limit}:{int(exclude_same_author)}:{feedback_fingerprint[0]}:{feedback_fingerprint[1]}"
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+def _cache_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+def _client_id(request: Request) -> str:
+    host = request.client.host if request.client else ""
+    # заголовок подделывается любым клиентом, поэтому верим ему только от своих прокси
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and host in TRUSTED_PROXIES:
+        return forwarded.split(",")[0].strip()
+    return host
+
+def _overloaded(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        {"detail": str(e), "reason": e.reason},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+def _sse(event: dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+async def _single_event(event: dict):
+    yield _sse(event)
+
 @router.get("/", response_class=HTMLResponse)
 async def similar_page(
     request: Request,
@@ -36,6 +73,121 @@ async def similar_page(
         }
     )
 
+def _load_book(conn, file: str) -> Book | None:
+    row = BookRepository().get_by_file(conn, file)
+    return Book.map(row) if row else None
+
+def _load_book_fingerprint(conn, file: str) -> tuple[Book | None, tuple[int, int]]:
+    book = _load_book(conn, file)
+    if book is None:
+        return None, (0, 0)
+    return book, FeedbackRepository.fingerprint(conn, book.id)
+
+def _load_table_data(
+    conn,
+    source_ids: list[int],
+    similars: list[tuple[float, int, int]],
+) -> tuple[Feedbacks, dict[int, Book]]:
+    feedbacks = Feedbacks(FeedbackRepository.get_many(conn, source_ids))
+    candidates = BookRepository().get_many(conn, list({s[2] for s in similars}))
+    return feedbacks, Book.map_by_id(candidates, Book.map)
+
+def _load_batch(conn, files: list[str], limit: int):
+    books = {
+        file_name: Book.map(row)
+        for file_name, row in BookRepository().get_many_by_files(conn, files).items()
+    }
+    similars = SimilarRepository().get_many(conn, [book.id for book in books.values()], limit)
+    misses = [book.id for book in books.values() if book.id not in similars]
+    return books, similars, EmbeddingsRepository().get_many(conn, misses)
+
+@router.get("/api")
+async def similar_api(
+    request: Request,
+    file: str = Query(...),
+    limit: int = Query(50, ge=1, le=100),
+    exclude_same_author: bool = False,
+):
+    book, fingerprint = await database.read(_load_book_fingerprint, file)
+    if book is None:
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+    views.add(book.id)
+
+    etag = _make_etag(book.id, limit, exclude_same_author, fingerprint)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=_cache_headers(etag))
+
+    similars = await database.read(SimilarRepository().get, book.id, limit)
+
+    if not similars:
+        embedding_raw = await database.read(EmbeddingsRepository().get, book.id)
+        if embedding_raw is None:
+            raise HTTPException(status_code=404, detail="Для книги не сгенерирован вектор")
+
+        try:
+            state = similarity.get_or_start(book, embedding_raw, limit, exclude_same_author, _client_id(request))
+        except AdmissionRejected as e:
+            return _overloaded(e)
+
+        try:
+            similars = (await similarity.wait_result(state))[:limit]
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    feedbacks, books_by_id = await database.read(_load_table_data, [book.id], similars)
+
+    return JSONResponse(
+        {
+            "file": book.file_name,
+            "title": book.title,
+            "items": Similar.to_rows(book, similars, feedbacks, books_by_id),
+        },
+        headers=_cache_headers(etag),
+    )
+
+@router.post("/batch")
+async def similar_batch(request: Request, req: SimilarBatchReq):
+    files = list(dict.fromkeys(req.files))
+    books, similars, embeddings_raw = await database.read(_load_batch, files, req.limit)
+
+    # промахи ищем одним запросом (n, d) к резидентному индексу
+    queries = [
+        (book, Embedding.from_db(embeddings_raw.get(book.id)))
+        for book in books.values()
+        if book.id not in similars
+    ]
+    queries = [(book, embedding) for book, embedding in queries if embedding is not None]
+
+    if queries:
+        try:
+            computed = await similarity.search_many(
+                [book for book, _ in queries],
+                [embedding for _, embedding in queries],
+                req.limit,
+                req.exclude_same_author,
+                _client_id(request),
+            )
+        except AdmissionRejected as e:
+            return _overloaded(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        similars.update(computed)
+
+    feedbacks, books_by_id = await database.read(
+        _load_table_data,
+        [book.id for book in books.values()],
+        [s for rows in similars.values() for s in rows],
+    )
+
+    return {
+        "items": {
+            file_name: Similar.to_rows(book, similars[book.id], feedbacks, books_by_id)
+            for file_name, book in books.items()
+            if book.id in similars
+        },
+        "missing": [file_name for file_name in files if file_name not in books or books[file_name].id not in similars],
+    }
+
 @router.get("/events")
 async def similar_events(
     request: Request,
@@ -44,58 +196,91 @@ async def similar_events(
     exclude_same_author: bool = False,
     force: bool = False,
 ):
-    async def event_stream():
-        start = time.perf_counter()
-
-        with db() as conn:
-            book = Book.map(BookRepository().get_by_file(conn, file))
-            if not book:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Книга не найдена'})}\n\n"
-                return
-
-            if force:
-                similarity.remove_task(book.file_name)
-
-            if not force and SimilarRepository().has_similar(conn, book.id):
-                similars = SimilarRepository().get(conn, book.id, limit)
-                feedbacks = Feedbacks(FeedbackRepository.get(conn, book.id))
-
-                elapsed = time.perf_counter() - start
-                html = Html.render_similar_table(request, book, similars, elapsed, feedbacks)
-                yield f"data: {json.dumps({'type': 'done', 'html': html.body.decode()})}\n\n"
-                return
-
-            embedding_raw = EmbeddingsRepository().get(conn, book.id)
-
-        if book.file_name not in similarity.tasks:
-            similarity.tasks[book.file_name] = TaskState()
-            asyncio.get_running_loop().run_in_executor(
-                executor,
-                similarity.compute_similar,
-                book, embedding_raw, limit, exclude_same_author
-            )
+    start = time.perf_counter()
+
+    async def render(book: Book, similars: list[tuple[float, int, int]]) -> str:
+        feedbacks, books_by_id = await database.read(_load_table_data, [book.id], similars)
+        return Html.render_similar_table(request, book, similars, feedbacks, books_by_id).body.decode()
+
+    def done(html: str) -> dict:
+        return {'type': 'done', 'html': Html.render_elapsed(time.perf_counter() - start) + html}
+
+    def stream(events) -> StreamingResponse:
+        return StreamingResponse(events, media_type="text/event-stream")
+
+    book = await database.read(_load_book, file)
+    if not book:
+        return stream(_single_event({'type': 'error', 'message': 'Книга не найдена'}))
+    # счётчик просмотров нужен прогреву: он заранее считает соседей популярных книг
+    views.add(book.id)
+    cache_key = (book.id, limit, exclude_same_author)
+
+    if force:
+        similarity.remove_task((book.file_name, limit, exclude_same_author))
+        similar_cache.invalidate_book(book.id)
+    else:
+        html = similar_cache.get(cache_key)
+        if html is not None:
+            return stream(_single_event(done(html)))
 
-        state = similarity.tasks[book.file_name]
+    generation = similar_cache.generation(book.id)
 
-        while True:
-            if state.error:
-                yield f"data: {json.dumps({'type': 'error', 'message': state.error})}\n\n"
-                break
+    similars = [] if force else await database.read(SimilarRepository().get, book.id, limit)
+    if similars:
+        html = await render(book, similars)
+        similar_cache.put(cache_key, html, generation)
+        return stream(_single_event(done(html)))
 
-            if state.result is not None:
-                elapsed = time.perf_counter() - start
-                with db() as conn:                 
-                    feedbacks = Feedbacks(FeedbackRepository.get(conn, book.id))
+    # решение о приёме работы принимается до начала потока, чтобы можно было ответить 503
+    embedding_raw = await database.read(EmbeddingsRepository().get, book.id)
+    if embedding_raw is None:
+        return stream(_single_event({'type': 'error', 'message': 'Для книги не сгенерирован вектор'}))
+    try:
+        state = similarity.get_or_start(book, embedding_raw, limit, exclude_same_author, _client_id(request))
+    except AdmissionRejected as e:
+        return _overloaded(e)
 
-                html = Html.render_similar_table(request, book, state.result, elapsed, feedbacks)
-                yield f"data: {json.dumps({'type': 'done', 'html': html.body.decode()})}\n\n"
-                break
+    async def event_stream():
+        async with aclosing(state.events()) as events:
+            async for event in events:
+                if event["type"] != "done":
+                    yield _sse(event)
+                    continue
+
+                html = await render(book, state.result)
+                similar_cache.put(cache_key, html, generation)
+                yield _sse(done(html))
+
+    return stream(event_stream())
+
+@router.get("/search")
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+):
+    rows = await database.read(BookRepository().search, q, limit)
+    books = [Book.map(row) for row in rows]
 
-            yield f"data: {json.dumps({'type': 'progress', 'progress': state.progress})}\n\n"
+    return {
+        "items": [
+            {
+                "file_name": book.file_name,
+                "title": book.title,
+                "authors": book.authors,
+            }
+            for book in books
+        ],
+    }
 
-            try:
-                await asyncio.wait_for(state.done_event.wait(), 1.2)
-            except asyncio.TimeoutError:
-                continue
+@router.get("/ready")
+async def similar_ready():
+    return JSONResponse(warmup.stats(), status_code=200 if warmup.ready else 503)
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+@router.get("/stats")
+async def similar_stats():
+    return {
+        "cache": similar_cache.stats(),
+        "admission": admission.stats(),
+        "warmup": warmup.stats(),
+        "memory": memory_usage(),
+    }
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+from app.hnsw import HNSW
+from app.hnsw.hnsw import INDEX_TYPES
+from app.metrics import memory_usage
+from app.models import EmbeddingMatrix
+from app.settings.config import HNSW_M, HNSW_EF_SEARCH, IVF_NPROBE, SEARCH_BATCH_MAX_SIZE, DATA_DIR
+
+RECALL_KS = (10, 100)
+# колонка, ширина, знаков после запятой
+COLUMNS = (
+    ("recall@10", 9, 4),
+    ("recall@100", 10, 4),
+    ("p50_ms", 8, 3),
+    ("p99_ms", 8, 3),
+    ("qps", 9, 0),
+    ("build_seconds", 13, 1),
+    ("bytes_per_vector", 16, 0),
+    ("rss_delta_mb", 12, 0),
+)
+CONFIG_WIDTH = 28
+
+def parse_ints(value: str) -> List[int]:
+    return sorted({int(v) for v in value.split(",") if v.strip()})
+
+def sample_queries(matrix: EmbeddingMatrix, count: int, seed: int = 0) -> np.ndarray:
+    rows = np.random.default_rng(seed).choice(len(matrix), min(count, len(matrix)), replace=False)
+    return matrix.vectors[np.sort(rows)]
+
+def exact_neighbors(matrix: EmbeddingMatrix, queries: np.ndarray, k: int) -> np.ndarray:
+    # эталон — точный поиск по скалярному произведению (векторы нормированы)
+    _, rows = faiss.knn(queries, matrix.vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
+    return np.where(rows >= 0, matrix.ids[rows], -1)
+
+def measure(index: faiss.Index, queries: np.ndarray, exact: np.ndarray, batch_size: int) -> Dict[str, float]:
+    """
+    Задержка — по одиночным запросам (как запрос страницы), QPS — пачками
+    по batch_size (как склеенные коалесцером запросы и массовые задачи).
+    """
+    k = exact.shape[1]
+    found = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries), dtype=np.float64)
+
+    for i in range(len(queries)):
+        started_at = time.perf_counter()
+        _, found[i:i + 1] = index.search(queries[i:i + 1], k)
+        latencies[i] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        index.search(queries[start:start + batch_size], k)
+    qps = len(queries) / max(time.perf_counter() - started_at, 1e-9)
+
+    result = {f"recall@{r}": round(HNSW.recall(exact[:, :r], found[:, :r]), 4) for r in RECALL_KS if r <= k}
+    result.update({
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "qps": round(qps, 1),
+    })
+    return result
+
+def build_flat(matrix: EmbeddingMatrix) -> tuple[faiss.Index, Dict[str, Any]]:
+    memory_before = memory_usage()["anon"]
+    started_at = time.perf_counter()
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(matrix.dim))
+    index.add_with_ids(matrix.vectors, matrix.ids)
+    return index, {
+        "build_seconds": round(time.perf_counter() - started_at, 2),
+        "bytes_per_vector": matrix.dim * 4,
+        "rss_delta_mb": round((memory_usage()["anon"] - memory_before) / (1024 ** 2), 1),
+    }
+
+def build(matrix: EmbeddingMatrix, index_type: str, m: int, workdir: str, threads: int) -> tuple[faiss.Index, Dict[str, Any]]:
+    hnsw = HNSW(index_file=os.path.join(workdir, f"{index_type}-{m}.faiss"), index_type=index_type, m=m, threads=threads)
+    hnsw.load_matrix(matrix)
+
+    memory_before = memory_usage()["anon"]
+    index = hnsw.generate_and_save()
+    stats = hnsw.build_stats
+    return index, {
+        "description": hnsw.factory_string(len(matrix)),
+        # обучение и добавление векторов, без самопроверки recall и записи файла
+        "build_seconds": round(stats["train_seconds"] + stats["add_seconds"], 2),
+        "bytes_per_vector": round(stats["index_bytes"] / max(1, index.ntotal), 1),
+        "rss_delta_mb": round((memory_usage()["anon"] - memory_before) / (1024 ** 2), 1),
+    }
+
+def run_benchmark(
+    matrix: EmbeddingMatrix,
+    index_types: List[str],
+    ms: List[int],
+    ef_searches: List[int],
+    nprobes: List[int],
+    queries: int = 1000,
+    batch_size: int = SEARCH_BATCH_MAX_SIZE,
+    threads: int = 0,
+    include_flat: bool = True,
+    logger=None,
+) -> Dict[str, Any]:
+    query_vectors = sample_queries(matrix, queries)
+    k = min(max(RECALL_KS), len(matrix))
+    exact = exact_neighbors(matrix, query_vectors, k)
+    results: List[Dict[str, Any]] = []
+
+    def log(message: str):
+        if logger: logger(message)
+
+    if include_flat:
+        index, built = build_flat(matrix)
+        results.append({"config": "flat", "index_type": "flat", **built, **measure(index, query_vectors, exact, batch_size)})
+        del index
+        log(f"flat: {results[-1]}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for index_type in index_types:
+            # M влияет только на графовые индексы, IVF строится один раз
+            for m in (ms if index_type.startswith("hnsw") else [ms[0]]):
+                index, built = build(matrix, index_type, m, workdir, threads)
+                is_hnsw = isinstance(HNSW.get_base(index), faiss.IndexHNSW)
+
+                for value in (ef_searches if is_hnsw else nprobes):
+                    if is_hnsw:
+                        HNSW.apply_search_params(index, ef_search=value)
+                        config = {"config": f"{index_type} M={m} ef={value}", "m": m, "ef_search": value}
+                    else:
+                        HNSW.apply_search_params(index, nprobe=value)
+                        config = {"config": f"{index_type} nprobe={value}", "nprobe": value}
+
+                    results.append({"index_type": index_type, **config, **built, **measure(index, query_vectors, exact, batch_size)})
+                    log(f"{config['config']}: {results[-1]}")
+
+                del index
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "vectors": len(matrix),
+        "dim": matrix.dim,
+        "queries": len(query_vectors),
+        "batch_size": batch_size,
+        "results": results,
+    }
+
+def format_table(report: Dict[str, Any]) -> str:
+    header = f"{'config':<{CONFIG_WIDTH}}" + "".join(f"  {name:>{width}}" for name, width, _ in COLUMNS)
+    lines = [header, "-" * len(header)]
+
+    for row in report["results"]:
+        cells = [f"{row['config']:<{CONFIG_WIDTH}}"]
+        for name, width, precision in COLUMNS:
+            value = row.get(name)
+            cells.append(f"  {value:>{width}.{precision}f}" if value is not None else f"  {'—':>{width}}")
+        lines.append("".join(cells))
+
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение конфигураций индекса с точным поиском: recall, задержка, память")
+    parser.add_argument("--types", default="hnsw_flat", help=f"Типы индекса через запятую: {', '.join(INDEX_TYPES)}")
+    parser.add_argument("--m", default=str(HNSW_M), help="Значения HNSW_M через запятую")
+    parser.add_argument("--ef-search", default=f"16,32,{HNSW_EF_SEARCH},128,256", help="Значения efSearch для HNSW")
+    parser.add_argument("--nprobe", default=f"8,16,{IVF_NPROBE},64", help="Значения nprobe для IVF")
+    parser.add_argument("--queries", type=int, default=1000, help="Количество запросов из базы")
+    parser.add_argument("--vectors", type=int, default=0, help="Взять случайное подмножество векторов (0 — все)")
+    parser.add_argument("--threads", type=int, default=0, help="Потоки OpenMP для сборки (0 — все ядра)")
+    parser.add_argument("--no-flat", action="store_true", help="Не измерять точный поиск")
+    parser.add_argument("--output", default=str(DATA_DIR / "benchmark_index.json"), help="Файл JSON с результатами")
+    args = parser.parse_args()
+
+    index_types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = set(index_types) - set(INDEX_TYPES)
+    if unknown:
+        parser.error(f"неизвестные типы индекса: {', '.join(sorted(unknown))}")
+
+    print("Загрузка эмбеддингов")
+    matrix = EmbeddingMatrix.load()
+    if args.vectors and args.vectors < len(matrix):
+        rows = np.sort(np.random.default_rng(0).choice(len(matrix), args.vectors, replace=False))
+        matrix = EmbeddingMatrix(matrix.ids[rows], matrix.vectors[rows])
+    print(f"Векторов: {len(matrix):,}, размерность: {matrix.dim}")
+
+    report = run_benchmark(
+        matrix,
+        index_types,
+        parse_ints(args.m),
+        parse_ints(args.ef_search),
+        parse_ints(args.nprobe),
+        queries=args.queries,
+        threads=args.threads,
+        include_flat=not args.no_flat,
+        logger=print,
+    )
+
+    print()
+    print(format_table(report))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"\nРезультаты сохранены в '{args.output}'")
+
+if __name__ == "__main__":
+    main()
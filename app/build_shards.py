@@ -0,0 +1,65 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.db import db, EmbeddingsRepository
+from app.hnsw import HNSW, IndexBuilder, Shard
+from app.settings.config import INDEX_SHARDS, INDEX_SHARD_SCHEME, INDEX_BUILD_THREADS
+
+def build_shard(shard: Shard, threads: int, full_rebuild: bool) -> tuple[Shard, int, float]:
+    logging.basicConfig(level=logging.INFO, format=f"[шард {shard.name}] %(message)s")
+    logger = logging.getLogger(f"shard-{shard.number}")
+
+    started_at = time.perf_counter()
+    hnsw = HNSW(index_file=shard.index_file, batch_size=10000, threads=threads, logger=logger)
+    IndexBuilder(hnsw, shard, logger=logger).update(full_rebuild)
+    return shard, (hnsw.read_meta() or {}).get("ntotal", 0), time.perf_counter() - started_at
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка шардов индекса, каждый в своём процессе")
+    parser.add_argument("--shards", type=int, default=INDEX_SHARDS, help="Количество шардов")
+    parser.add_argument("--scheme", choices=["range", "hash"], default=INDEX_SHARD_SCHEME, help="Разбиение по диапазону book_id или по хэшу")
+    parser.add_argument("--shard", type=int, action="append", help="Собрать только этот шард (можно несколько раз)")
+    parser.add_argument("--processes", type=int, default=0, help="Параллельных процессов (0 — по числу шардов, не больше ядер)")
+    parser.add_argument("--full-rebuild", action="store_true", help="Перестроить шарды целиком вместо дописывания")
+    args = parser.parse_args()
+
+    if args.shards < 2:
+        parser.error("для шардирования нужно --shards >= 2")
+
+    with db() as conn:
+        _, min_id, max_id = EmbeddingsRepository().stats(conn)
+
+    # план считается один раз здесь, чтобы все процессы собирали согласованные диапазоны
+    shards = Shard.load_plan(args.shards, args.scheme, min_id, max_id)
+    if args.shard:
+        shards = [shard for shard in shards if shard.number in set(args.shard)]
+
+    cores = os.cpu_count() or 1
+    processes = args.processes or min(len(shards), cores)
+    threads = max(1, (INDEX_BUILD_THREADS or cores) // processes)
+    print(f"Шардов к сборке: {len(shards)}, процессов: {processes}, потоков на процесс: {threads}")
+
+    started_at = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(build_shard, shard, threads, args.full_rebuild): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                _, ntotal, seconds = future.result()
+                print(f"Шард {shard.name}: {ntotal:,} векторов за {seconds:.1f} с -> {shard.index_file}")
+            except Exception as e:
+                # остальные шарды продолжают собираться, сервис работает со старым файлом этого шарда
+                failed += 1
+                print(f"Шард {shard.name}: ошибка сборки: {e}")
+
+    print(f"Готово за {time.perf_counter() - started_at:.1f} с, ошибок: {failed}")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
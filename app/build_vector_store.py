@@ -0,0 +1,44 @@
+import argparse
+import logging
+import os
+import time
+
+from app.db import VectorStore, VectorStoreOutOfSync
+from app.settings.config import VECTOR_STORE_FILE, VECTOR_STORE_DTYPE
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранилище векторов в файлах, отображаемых в память, рядом с SQLite")
+    parser.add_argument("--dtype", choices=["float16", "int8"], default=VECTOR_STORE_DTYPE, help="Формат новых файлов (для --rebuild или пустого хранилища)")
+    parser.add_argument("--rebuild", action="store_true", help="Удалить хранилище и записать заново из SQLite")
+    parser.add_argument("--check", action="store_true", help="Только сверить id хранилища с таблицей embeddings")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = VectorStore(VECTOR_STORE_FILE, args.dtype, logger=logging.getLogger("vector_store"))
+
+    if args.check:
+        try:
+            books, extra = store.check()
+        except FileNotFoundError as e:
+            print(f"Хранилище ещё не создано: {e}")
+            raise SystemExit(1)
+        except VectorStoreOutOfSync as e:
+            print(f"Хранилище не совпадает с базой: {e}")
+            raise SystemExit(1)
+        print(f"Хранилище совпадает с базой: {books:,} книг, лишних строк: {extra:,}")
+        return
+
+    if args.rebuild:
+        store.remove()
+
+    started_at = time.perf_counter()
+    added = store.sync()
+    header = store.read_header() or {}
+    size = sum(os.path.getsize(path) for path in store.files(header.get("generation", 1)).values() if os.path.exists(path))
+    print(
+        f"Дописано {added:,} книг за {time.perf_counter() - started_at:.1f} с; всего строк: {header.get('count', 0):,}, "
+        f"{header.get('dtype', args.dtype)}, {size / (1024 ** 2):,.1f} MB"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import argparse
+import logging
+
+from app.hnsw import IndexCompactor
+from app.settings.config import INDEX_COMPACT_RATIO
+
+def main():
+    parser = argparse.ArgumentParser(description="Удаление помеченных удалёнными книг из embeddings, similar и индекса")
+    parser.add_argument("--ratio", type=float, default=INDEX_COMPACT_RATIO, help="Порог доли удалённых книг, например 0.05")
+    parser.add_argument("--force", action="store_true", help="Компактизировать независимо от порога")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, сколько книг ждёт удаления")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    compactor = IndexCompactor(ratio=args.ratio, logger=logging.getLogger("compact_index"))
+
+    if args.dry_run:
+        pending, total = compactor.status()
+        print(f"Ждут удаления: {len(pending):,} из {total:,} ({len(pending) / max(1, total):.2%}), порог {args.ratio:.1%}")
+        print("Компактизация нужна" if compactor.due(len(pending), total) else "Компактизация не нужна")
+        return
+
+    removed = compactor.run(force=args.force)
+    print(f"Удалено книг: {removed:,}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,26 @@
 from .connection import db
+from .async_connection import AsyncDatabase
 from .migrate import Migrator
 from .books import BookRepository
 from .feedback import FeedbackRepository
 from .similar import SimilarRepository
 from .embeddings import EmbeddingsRepository
 from .authors import AuthorRepository
+from .views import BookViewsRepository
+from .tombstones import TombstoneRepository
+from .vector_store import VectorStore, VectorStoreOutOfSync
 
 __all__ = [
     "db",
+    "AsyncDatabase",
     "Migrator",
     "BookRepository",
     "FeedbackRepository",
     "SimilarRepository",
     "EmbeddingsRepository",
-    "AuthorRepository"
+    "AuthorRepository",
+    "BookViewsRepository",
+    "TombstoneRepository",
+    "VectorStore",
+    "VectorStoreOutOfSync",
 ]
@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+from app.metrics import DB_SECONDS
+from app.settings.config import DB_FILE, DB_READERS
+
+T = TypeVar("T")
+
+class AsyncDatabase:
+    """
+    Неблокирующий доступ к SQLite для async-роутеров.
+    У каждого потока пула своё постоянное соединение; чтение идёт параллельно
+    в reader-потоках, запись — последовательно в единственном writer-потоке.
+    Функция получает соединение первым аргументом и выполняется в одной транзакции.
+    """
+    def __init__(self, db_file: Path = DB_FILE, readers: int = DB_READERS):
+        self._db_file = db_file
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._reader_count = max(1, readers)
+        self._start()
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._readers, self._run, fn, args, "read")
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._writer, self._run, fn, args, "write")
+
+    def close(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+        # после close() объект можно использовать снова — потоки и соединения создадутся заново
+        self._local = threading.local()
+        self._start()
+
+    def _start(self):
+        self._readers = ThreadPoolExecutor(max_workers=self._reader_count, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+    def _run(self, fn: Callable[..., T], args: tuple, op: str) -> T:
+        conn = self._connection()
+        started_at = time.perf_counter()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started_at, op=op)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        # соединение используется только своим потоком, check_same_thread нужен лишь для close()
+        conn = sqlite3.connect(self._db_file, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL: читатели не ждут писателя, а писатель — читателей
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
@@ -1,6 +1,10 @@
+import re
 from datetime import datetime
 from typing import Any, Generator, Tuple
 
+FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+FTS_MIN_PREFIX = 2
+
 class BookRepository:
     GET_QUERY = """
     SELECT
@@ -53,6 +57,48 @@ class BookRepository:
             for row in rows
         }
 
+    def get_many_by_files(self, conn, files: list[str]) -> dict[str, Any]:
+        if not files:
+            return {}
+
+        placeholders = ",".join("?" for _ in files)
+        rows = conn.execute(f"{self.GET_QUERY} WHERE b.book IN ({placeholders})", files).fetchall()
+
+        return {
+            row["book"]: row
+            for row in rows
+        }
+
+    def search(self, conn, text: str, limit: int) -> list[Any]:
+        match = self.fts_query(text)
+        if match is None:
+            return []
+
+        # bm25: вес совпадения в названии выше, чем в авторах
+        return conn.execute(
+            f"""
+            {self.GET_QUERY}
+            JOIN books_fts f ON f.rowid = b.id
+            WHERE books_fts MATCH ?
+            ORDER BY bm25(books_fts, 10.0, 1.0)
+            LIMIT ?
+            """,
+            (match, limit)
+        ).fetchall()
+
+    @staticmethod
+    def fts_query(text: str) -> str | None:
+        # пользовательский ввод не должен попадать в синтаксис FTS5 как есть:
+        # каждое слово берём в кавычки, последнее (набираемое) ищем по префиксу
+        tokens = FTS_TOKEN.findall((text or "").replace("ё", "е").replace("Ё", "Е"))
+        if not tokens:
+            return None
+
+        terms = [f'"{token}"' for token in tokens]
+        if len(tokens[-1]) >= FTS_MIN_PREFIX:
+            terms[-1] += "*"
+        return " ".join(terms)
+
     def get_names(conn) -> list[str]:
         rows = conn.execute("SELECT book FROM books").fetchall()
         return [row[0] for row in rows]
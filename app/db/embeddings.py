@@ -1,5 +1,8 @@
 from typing import Iterator, Tuple
 
+# условие WHERE с параметрами для выборок части таблицы (например, шарда индекса)
+ALL: Tuple[str, tuple] = ("1", ())
+
 class EmbeddingsRepository:
     GET_QUERY: str = "SELECT book_id, embedding FROM embeddings"
 
@@ -7,11 +10,93 @@ class EmbeddingsRepository:
         row = conn.execute(f"{self.GET_QUERY} WHERE book_id = ?", (book_id,)).fetchone()
         return row[1] if row else None
 
+    def get_many(self, conn, book_ids: list[int]) -> dict[int, bytes]:
+        if not book_ids:
+            return {}
+
+        placeholders = ",".join("?" for _ in book_ids)
+        rows = conn.execute(f"{self.GET_QUERY} WHERE book_id IN ({placeholders})", book_ids).fetchall()
+        return {row["book_id"]: row["embedding"] for row in rows}
+
     def get_all(self, conn) -> Iterator[Tuple[int, bytes]]:
         cursor = conn.execute(f"{self.GET_QUERY} ORDER BY book_id ASC")
         for row in cursor:
             yield (row["book_id"], row["embedding"])
 
+    def get_after(self, conn, book_id: int, where: Tuple[str, tuple] = ALL) -> Iterator[Tuple[int, bytes]]:
+        cursor = conn.execute(f"{self.GET_QUERY} WHERE book_id > ? AND {where[0]} ORDER BY book_id ASC", (book_id, *where[1]))
+        for row in cursor:
+            yield (row["book_id"], row["embedding"])
+
+    def get_chunks(self, conn, chunk_size: int, after_id: int = -1, where: Tuple[str, tuple] = ALL) -> Iterator[list[Tuple[int, bytes]]]:
+        # порции по первичному ключу: каждая — отдельный короткий запрос, без долгого курсора
+        while True:
+            rows = conn.execute(
+                f"{self.GET_QUERY} WHERE book_id > ? AND {where[0]} ORDER BY book_id ASC LIMIT ?", (after_id, *where[1], chunk_size)
+            ).fetchall()
+            if not rows:
+                return
+
+            yield [(row["book_id"], row["embedding"]) for row in rows]
+            after_id = rows[-1]["book_id"]
+
+    def get_ids(self, conn, where: Tuple[str, tuple] = ALL) -> list[int]:
+        cursor = conn.execute(f"SELECT book_id FROM embeddings WHERE {where[0]} ORDER BY book_id ASC", where[1])
+        cursor.row_factory = None
+        return [row[0] for row in cursor]
+
+    def get_versions(self, conn, where: Tuple[str, tuple] = ALL) -> list[Tuple[int, int]]:
+        # (book_id, версия вектора) для сверки с хранилищем векторов
+        cursor = conn.execute(
+            f"""
+            SELECT book_id, COALESCE((SELECT version FROM embedding_versions v WHERE v.book_id = embeddings.book_id), 0)
+            FROM embeddings WHERE {where[0]} ORDER BY book_id ASC
+            """,
+            where[1],
+        )
+        cursor.row_factory = None
+        return cursor.fetchall()
+
+    def get_changed(self, conn, chunk_size: int, after_version: int = 0) -> Iterator[list[Tuple[int, bytes, int]]]:
+        # векторы, записанные после after_version, порциями по возрастанию версии
+        while True:
+            rows = conn.execute(
+                """
+                SELECT e.book_id, e.embedding, v.version FROM embedding_versions v
+                JOIN embeddings e ON e.book_id = v.book_id
+                WHERE v.version > ? ORDER BY v.version ASC LIMIT ?
+                """,
+                (after_version, chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+
+            yield [(row[0], row[1], row[2]) for row in rows]
+            after_version = rows[-1][2]
+
+    def count_range(self, conn, start: int, end: int) -> int:
+        return conn.execute("SELECT COUNT(*) FROM embeddings WHERE book_id >= ? AND book_id < ?", (start, end)).fetchone()[0]
+
+    def get_range(self, conn, start: int, end: int, limit: int, batch_size: int = 10000) -> Iterator[list[Tuple[int, bytes]]]:
+        # диапазон [start, end) по первичному ключу; без row_factory — строки читаются кортежами
+        cursor = conn.execute(
+            "SELECT book_id, embedding FROM embeddings WHERE book_id >= ? AND book_id < ? ORDER BY book_id ASC LIMIT ?",
+            (start, end, limit),
+        )
+        cursor.row_factory = None
+        while rows := cursor.fetchmany(batch_size):
+            yield rows
+
+    def get_sample(self, conn, size: int, where: Tuple[str, tuple] = ALL) -> list[Tuple[int, bytes]]:
+        if size <= 0:
+            return []
+        rows = conn.execute(f"{self.GET_QUERY} WHERE {where[0]} ORDER BY random() LIMIT ?", (*where[1], size)).fetchall()
+        return [(row["book_id"], row["embedding"]) for row in rows]
+
+    def stats(self, conn, where: Tuple[str, tuple] = ALL) -> Tuple[int, int | None, int | None]:
+        row = conn.execute(f"SELECT COUNT(*), MIN(book_id), MAX(book_id) FROM embeddings WHERE {where[0]}", where[1]).fetchone()
+        return row[0], row[1], row[2]
+
     def save(conn, book_id: int, embedding: bytes):
         conn.execute(
             "INSERT OR REPLACE INTO embeddings(book_id, embedding) VALUES (?, ?)",
@@ -30,6 +30,26 @@ class FeedbackRepository:
             (book_id,)
         ).fetchall()
 
+    @staticmethod
+    def get_many(conn, book_ids: list[int]) -> list[Row]:
+        if not book_ids:
+            return []
+
+        placeholders = ",".join("?" for _ in book_ids)
+        return conn.execute(
+            FeedbackRepository.GET_QUERY + f" WHERE source_book_id IN ({placeholders})",
+            book_ids
+        ).fetchall()
+
+    @staticmethod
+    def fingerprint(conn, book_id: int) -> tuple[int, int]:
+        # id AUTOINCREMENT, поэтому любая вставка/замена/удаление меняет пару (count, max_id)
+        row = conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM feedback WHERE source_book_id = ?",
+            (book_id,)
+        ).fetchone()
+        return (row[0], row[1])
+
     @staticmethod
     def get_all(conn) -> list[Row]:
         return conn.execute(FeedbackRepository.GET_QUERY).fetchall()
@@ -8,3 +8,32 @@ class Migrator:
 
         with db() as conn:
             conn.executescript(schema)
+            self._fill_books_fts(conn)
+            self._fill_embedding_versions(conn)
+
+    @staticmethod
+    def _fill_books_fts(conn):
+        # books_fts появилась позже books: существующие строки индексируем один раз,
+        # дальше индекс поддерживают триггеры. Пустоту проверяем по теневой таблице,
+        # т.к. SELECT из external-content FTS читает саму books
+        fts_empty = conn.execute("SELECT 1 FROM books_fts_docsize LIMIT 1").fetchone() is None
+        books_empty = conn.execute("SELECT 1 FROM books LIMIT 1").fetchone() is None
+        if fts_empty and not books_empty:
+            # не 'rebuild': он взял бы title/author без замены ё, как это делают триггеры
+            conn.execute("""
+            INSERT INTO books_fts(rowid, title, author)
+            SELECT
+                id,
+                replace(replace(title, 'ё', 'е'), 'Ё', 'Е'),
+                replace(replace(author, 'ё', 'е'), 'Ё', 'Е')
+            FROM books
+            """)
+
+    @staticmethod
+    def _fill_embedding_versions(conn):
+        # векторам, записанным до появления триггеров, версии выдаются после уже существующих
+        conn.execute("""
+        INSERT INTO embedding_versions(book_id, version)
+        SELECT book_id, (SELECT COALESCE(MAX(version), 0) FROM embedding_versions) + book_id FROM embeddings
+        WHERE book_id NOT IN (SELECT book_id FROM embedding_versions)
+        """)
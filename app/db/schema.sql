@@ -44,6 +44,72 @@ CREATE TABLE IF NOT EXISTS feedback (
     FOREIGN KEY (source_book_id) REFERENCES books(id),
     FOREIGN KEY (candidate_book_id) REFERENCES books(id)
 );
+
+CREATE TABLE IF NOT EXISTS book_views (
+    book_id INTEGER PRIMARY KEY,
+    views INTEGER NOT NULL DEFAULT 0,
+    last_viewed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (book_id) REFERENCES books(id)
+);
+
+-- версия вектора книги: растёт при каждой записи в embeddings, по ней хранилище
+-- векторов (VectorStore) находит пересчитанные книги. Строки удалённых векторов
+-- не удаляются, чтобы MAX(version) не уменьшался и версии не повторялись
+CREATE TABLE IF NOT EXISTS embedding_versions (
+    book_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_versions_version ON embedding_versions(version);
+
+CREATE TRIGGER IF NOT EXISTS embeddings_version_ai AFTER INSERT ON embeddings BEGIN
+    INSERT OR REPLACE INTO embedding_versions(book_id, version)
+    VALUES (new.book_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM embedding_versions));
+END;
+
+CREATE TRIGGER IF NOT EXISTS embeddings_version_au AFTER UPDATE OF embedding ON embeddings BEGIN
+    INSERT OR REPLACE INTO embedding_versions(book_id, version)
+    VALUES (new.book_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM embedding_versions));
+END;
+
+-- книги, помеченные удалёнными в INPX: из выдачи убираются сразу,
+-- из embeddings и индекса — при компактизации (compacted_at)
+CREATE TABLE IF NOT EXISTS tombstones (
+    book_id INTEGER PRIMARY KEY,
+    reason TEXT NOT NULL,
+    deleted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    compacted_at DATETIME,
+    FOREIGN KEY (book_id) REFERENCES books(id)
+);
+
+-- полнотекстовый индекс по названию и авторам; содержимое берётся из books,
+-- синхронизация — триггерами ниже, первичное наполнение — в Migrator.
+-- remove_diacritics не трогает кириллицу, поэтому ё/Ё приводим к е/Е сами
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title,
+    author,
+    content='books',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3 4'
+);
+
+CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts(rowid, title, author)
+    VALUES (new.id, replace(replace(new.title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(new.author, 'ё', 'е'), 'Ё', 'Е'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts(books_fts, rowid, title, author)
+    VALUES ('delete', old.id, replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(old.author, 'ё', 'е'), 'Ё', 'Е'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+    INSERT INTO books_fts(books_fts, rowid, title, author)
+    VALUES ('delete', old.id, replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(old.author, 'ё', 'е'), 'Ё', 'Е'));
+    INSERT INTO books_fts(rowid, title, author)
+    VALUES (new.id, replace(replace(new.title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(new.author, 'ё', 'е'), 'Ё', 'Е'));
+END;
                     
 CREATE INDEX IF NOT EXISTS idx_books_book_archive ON books(book, archive);
 CREATE INDEX IF NOT EXISTS idx_embeddings_book_id ON embeddings(book_id);
@@ -53,4 +119,5 @@ CREATE INDEX IF NOT EXISTS idx_book_authors_author_id ON book_authors(author_id)
 CREATE INDEX IF NOT EXISTS idx_similar_book_id ON similar(book_id);
 CREATE INDEX IF NOT EXISTS idx_similar_similar_book_id ON similar(similar_book_id);
 CREATE INDEX IF NOT EXISTS idx_feedback_source_book_id ON feedback(source_book_id);
-CREATE INDEX IF NOT EXISTS idx_feedback_candidate_book_id ON feedback(candidate_book_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_feedback_candidate_book_id ON feedback(candidate_book_id);
+CREATE INDEX IF NOT EXISTS idx_book_views_views ON book_views(views);
\ No newline at end of file
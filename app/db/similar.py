@@ -35,6 +35,35 @@ class SimilarRepository:
             for row in cursor
         ]
     
+    def get_many(self, conn, book_ids: list[int], limit: int) -> dict[int, List[Tuple[float, int, int]]]:
+        if not book_ids:
+            return {}
+
+        placeholders = ",".join("?" for _ in book_ids)
+        cursor = conn.execute(
+            f"""
+            SELECT score, source_id, similar_book_id FROM (
+                SELECT
+                    score,
+                    book_id AS source_id,
+                    similar_book_id,
+                    ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY score DESC) AS rn
+                FROM similar
+                WHERE book_id IN ({placeholders})
+            )
+            WHERE rn <= ?
+            ORDER BY source_id, rn
+            """,
+            [*book_ids, limit]
+        )
+
+        result: dict[int, List[Tuple[float, int, int]]] = {}
+        for row in cursor:
+            result.setdefault(row["source_id"], []).append(
+                (row["score"], row["source_id"], row["similar_book_id"])
+            )
+        return result
+
     def get_score(self, conn, book_id: int, candidate_id: int) -> float:
         row = conn.execute(
             f"{self.GET_QUERY} WHERE book_id = ? AND similar_book_id = ?",
@@ -0,0 +1,51 @@
+from typing import Iterable
+
+class TombstoneRepository:
+    """
+    Удалённые книги. Запись остаётся и после компактизации: compacted_at
+    отмечает, что вектор книги уже вычищен из embeddings и индекса.
+    """
+    PENDING_QUERY: str = "SELECT book_id FROM tombstones WHERE compacted_at IS NULL"
+
+    def add(self, conn, book_ids: Iterable[int], reason: str) -> int:
+        before = self.count(conn)
+        conn.executemany(
+            "INSERT OR IGNORE INTO tombstones (book_id, reason) VALUES (?, ?)",
+            [(int(book_id), reason) for book_id in book_ids]
+        )
+        return self.count(conn) - before
+
+    def add_by_files(self, conn, files: Iterable[str], reason: str) -> int:
+        # книги, которых нет в базе, пропускаются: удалять из индекса нечего
+        before = self.count(conn)
+        conn.executemany(
+            "INSERT OR IGNORE INTO tombstones (book_id, reason) SELECT id, ? FROM books WHERE book = ?",
+            [(reason, file) for file in files]
+        )
+        return self.count(conn) - before
+
+    def get_ids(self, conn) -> list[int]:
+        return [row[0] for row in conn.execute("SELECT book_id FROM tombstones ORDER BY book_id")]
+
+    def get_pending(self, conn) -> list[int]:
+        return [row[0] for row in conn.execute(f"{self.PENDING_QUERY} ORDER BY book_id")]
+
+    def count(self, conn) -> int:
+        return conn.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+
+    def drop_similar(self, conn) -> int:
+        # сохранённые списки похожих не должны ссылаться на удалённые книги
+        cursor = conn.execute(
+            f"DELETE FROM similar WHERE book_id IN ({self.PENDING_QUERY}) OR similar_book_id IN ({self.PENDING_QUERY})"
+        )
+        return cursor.rowcount
+
+    def purge(self, conn, book_ids: list[int]) -> int:
+        cursor = conn.executemany("DELETE FROM embeddings WHERE book_id = ?", [(int(book_id),) for book_id in book_ids])
+        return cursor.rowcount
+
+    def mark_compacted(self, conn, book_ids: list[int]):
+        conn.executemany(
+            "UPDATE tombstones SET compacted_at = CURRENT_TIMESTAMP WHERE book_id = ?",
+            [(int(book_id),) for book_id in book_ids]
+        )
@@ -0,0 +1,264 @@
+import os
+import glob
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+import numpy as np
+
+from app.settings.config import VECTOR_STORE_FILE, VECTOR_STORE_DTYPE, INDEX_BUILD_CHUNK_SIZE
+from .connection import db
+from .embeddings import EmbeddingsRepository
+
+DTYPES = {"float16": np.float16, "int8": np.int8}
+
+class VectorStoreOutOfSync(ValueError):
+    pass
+
+class VectorStore:
+    """
+    Копия таблицы embeddings в файлах, отображаемых в память: коды векторов
+    (float16 или int8 с масштабом на вектор), book_id и версия вектора из
+    embedding_versions, строки только дописываются. Заголовок <path>.json с количеством
+    строк подменяется последним, поэтому читатели не видят недописанных строк.
+    Пишет один процесс — воркер эмбеддингов.
+
+    Пересчитанная книга дописывается заново, действует её последняя строка; книги,
+    которых уже нет в SQLite, отбрасываются при чтении и вычищаются rewrite.
+    """
+    PARTS = ("ids", "versions", "codes", "scales")
+
+    def __init__(self, path: str = VECTOR_STORE_FILE, dtype: str = VECTOR_STORE_DTYPE, logger=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Неизвестный тип хранилища векторов '{dtype}', допустимы: {', '.join(DTYPES)}")
+        self.path = str(path)
+        self.dtype = dtype
+        self.logger = logger
+
+    @property
+    def header_file(self) -> str:
+        return f"{self.path}.json"
+
+    def files(self, generation: int) -> Dict[str, str]:
+        return {part: f"{self.path}.{generation}.{part}" for part in self.PARTS}
+
+    def read_header(self) -> Dict[str, Any] | None:
+        if not os.path.exists(self.header_file):
+            return None
+        with open(self.header_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_header(self, header: Dict[str, Any]):
+        tmp_file = f"{self.header_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.header_file)
+
+    def exists(self) -> bool:
+        return self.read_header() is not None
+
+    def open(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+        """ids, версии, коды и масштабы (для int8) — отображения файлов только для чтения."""
+        header = self.read_header()
+        if header is None:
+            raise FileNotFoundError(f"Файл '{self.header_file}' не существует")
+        if "version" not in header:
+            raise VectorStoreOutOfSync("Хранилище векторов старого формата, без версий векторов: его перепишет sync")
+
+        count, dim, dtype = header["count"], header["dim"], DTYPES[header["dtype"]]
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=dtype), None
+
+        files = self.files(header["generation"])
+        ids = np.memmap(files["ids"], dtype=np.int64, mode="r", shape=(count,))
+        versions = np.memmap(files["versions"], dtype=np.int64, mode="r", shape=(count,))
+        codes = np.memmap(files["codes"], dtype=dtype, mode="r", shape=(count, dim))
+        scales = np.memmap(files["scales"], dtype=np.float32, mode="r", shape=(count,)) if header["dtype"] == "int8" else None
+        return ids, versions, codes, scales
+
+    @staticmethod
+    def encode(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray | None]:
+        if dtype == "float16":
+            return vectors.astype(np.float16), None
+
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    @staticmethod
+    def decode(codes: np.ndarray, scales: np.ndarray | None, out: np.ndarray | None = None) -> np.ndarray:
+        out = np.empty(codes.shape, dtype=np.float32) if out is None else out
+        out[:] = codes
+        if scales is not None:
+            out *= scales[:, None]
+        return out
+
+    def rows_for(self, book_ids: np.ndarray, versions: np.ndarray | None = None) -> np.ndarray:
+        """
+        Номера строк хранилища для book_ids (отсортированных, как их отдаёт SQLite).
+        Проверка согласованности: каждой книге из базы должна найтись строка, а если
+        переданы versions — с той же версией вектора, что и в базе.
+        """
+        ids, row_versions, _, _ = self.open()
+        return self._rows(ids, row_versions, book_ids, versions)
+
+    @staticmethod
+    def _rows(ids: np.ndarray, row_versions: np.ndarray, book_ids: np.ndarray, versions: np.ndarray | None) -> np.ndarray:
+        # при повторной записи книги берётся последняя строка
+        unique_ids, reversed_rows = np.unique(ids[::-1], return_index=True)
+        rows = len(ids) - 1 - reversed_rows
+
+        positions = np.searchsorted(unique_ids, book_ids)
+        found = positions < len(unique_ids)
+        found[found] = unique_ids[positions[found]] == book_ids[found]
+        if not found.all():
+            raise VectorStoreOutOfSync(
+                f"В хранилище векторов нет {np.count_nonzero(~found):,} книг из базы (например, {int(book_ids[~found][0])})"
+            )
+
+        rows = rows[positions]
+        if versions is not None:
+            stale = row_versions[rows] != versions
+            if stale.any():
+                raise VectorStoreOutOfSync(
+                    f"В хранилище векторов устарели {np.count_nonzero(stale):,} пересчитанных книг (например, {int(book_ids[stale][0])})"
+                )
+        return rows
+
+    def read(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ids, _, vectors = self._read(rows)
+        return ids, vectors
+
+    def _read(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ids, versions, codes, scales = self.open()
+        return np.asarray(ids[rows]), np.asarray(versions[rows]), self.decode(codes[rows], None if scales is None else scales[rows])
+
+    def load(
+        self,
+        book_ids: np.ndarray,
+        versions: np.ndarray | None = None,
+        chunk_size: int = INDEX_BUILD_CHUNK_SIZE,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Векторы book_ids в float32 одной матрицей; коды читаются из отображения порциями."""
+        ids, row_versions, codes, scales = self.open()
+        rows = self._rows(ids, row_versions, book_ids, versions)
+
+        vectors = np.empty((len(rows), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(rows), chunk_size):
+            part = rows[start:start + chunk_size]
+            self.decode(codes[part], None if scales is None else scales[part], vectors[start:start + chunk_size])
+        return np.asarray(book_ids, dtype=np.int64), vectors
+
+    def chunks(self, rows: np.ndarray, chunk_size: int = INDEX_BUILD_CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        for start in range(0, len(rows), chunk_size):
+            yield self.read(rows[start:start + chunk_size])
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray, versions: np.ndarray) -> int:
+        if not len(ids):
+            return 0
+
+        header = self.read_header() or {"dtype": self.dtype, "dim": int(vectors.shape[1]), "count": 0, "generation": 1, "version": 0}
+        if vectors.shape[1] != header["dim"]:
+            raise ValueError(f"Размерность векторов ({vectors.shape[1]}) не совпадает с хранилищем ({header['dim']})")
+
+        codes, scales = self.encode(np.asarray(vectors, dtype=np.float32), header["dtype"])
+        versions = np.asarray(versions, dtype=np.int64)
+        files = self.files(header["generation"])
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        parts = [("ids", np.asarray(ids, dtype=np.int64)), ("versions", versions), ("codes", codes)]
+        if scales is not None:
+            parts.append(("scales", scales))
+        for part, data in parts:
+            with open(files[part], "ab") as f:
+                # хвост после сбоя прошлой записи, не попавший в заголовок, отрезается
+                f.truncate(header["count"] * data.itemsize * (data.shape[1] if data.ndim == 2 else 1))
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        header["count"] += len(ids)
+        header["version"] = max(header["version"], int(np.max(versions)))
+        self.write_header(header)
+        return len(ids)
+
+    def sync(self, chunk_size: int = INDEX_BUILD_CHUNK_SIZE) -> int:
+        # дописываем новые и пересчитанные книги: всё, что записано в embeddings после версии хранилища
+        header = self.read_header()
+        if header is not None and "version" not in header:
+            # файлы без версий векторов не сверить с базой — собираются заново
+            if self.logger: self.logger.info("Хранилище векторов старого формата, записываем заново")
+            self.remove()
+            header = None
+
+        after_version = (header or {}).get("version", 0)
+        added = 0
+        with db() as conn:
+            for rows in EmbeddingsRepository().get_changed(conn, chunk_size, after_version):
+                ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                versions = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+                vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+                added += self.append(ids, vectors, versions)
+
+        if self.logger and added: self.logger.info(f"В хранилище векторов дописано {added:,} книг")
+        return added
+
+    def check(self) -> Tuple[int, int]:
+        """Сверяет book_id и версии векторов с таблицей embeddings: (книг в базе, лишних строк в хранилище)."""
+        with db() as conn:
+            book_ids, versions = self.split_versions(EmbeddingsRepository().get_versions(conn))
+        ids, row_versions, _, _ = self.open()
+        self._rows(ids, row_versions, book_ids, versions)
+        return len(book_ids), len(ids) - len(book_ids)
+
+    @staticmethod
+    def split_versions(rows: list[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        # строки get_versions -> (book_ids, versions)
+        data = np.asarray(rows, dtype=np.int64).reshape(-1, 2)
+        return data[:, 0].copy(), data[:, 1].copy()
+
+    def rewrite(self, keep_ids: np.ndarray | None = None) -> int:
+        """
+        Переписывает хранилище новым поколением файлов: только keep_ids, по одной
+        строке на книгу. Старые файлы удаляются после подмены заголовка, уже
+        отображённые читателями остаются валидными.
+        """
+        header = self.read_header()
+        if header is None:
+            return 0
+
+        ids = self.open()[0]
+        keep_ids = np.unique(ids) if keep_ids is None else np.asarray(keep_ids, dtype=np.int64)
+        rows = self.rows_for(keep_ids)
+
+        # новое поколение собирается отдельным хранилищем и переносится под своими именами
+        generation = header["generation"] + 1
+        fresh = VectorStore(f"{self.path}.rewrite", header["dtype"])
+        fresh.remove()
+        for start in range(0, len(rows), INDEX_BUILD_CHUNK_SIZE):
+            book_ids, versions, vectors = self._read(rows[start:start + INDEX_BUILD_CHUNK_SIZE])
+            fresh.append(book_ids, vectors, versions)
+
+        # версия хранилища не уменьшается: удалённые книги уже учтены
+        fresh_header = {**(fresh.read_header() or {**header, "count": 0}), "version": header["version"]}
+        for part, path in fresh.files(1).items():
+            if os.path.exists(path):
+                os.replace(path, self.files(generation)[part])
+        fresh.remove()
+        self.write_header({**fresh_header, "generation": generation})
+
+        self.remove_generations(keep=generation)
+        if self.logger: self.logger.info(f"Хранилище векторов переписано: {len(keep_ids):,} книг")
+        return len(keep_ids)
+
+    def remove_generations(self, keep: int | None = None):
+        for path in glob.glob(f"{glob.escape(self.path)}.[0-9]*.*"):
+            if keep is None or path not in self.files(keep).values():
+                os.remove(path)
+
+    def remove(self):
+        # сначала заголовок: без него хранилище считается отсутствующим
+        if os.path.exists(self.header_file):
+            os.remove(self.header_file)
+        self.remove_generations()
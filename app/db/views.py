@@ -0,0 +1,22 @@
+class BookViewsRepository:
+    @staticmethod
+    def add_many(conn, views: dict[int, int]):
+        # книга могла быть удалена, пока просмотры ждали записи
+        conn.executemany(
+            """
+            INSERT INTO book_views (book_id, views, last_viewed_at)
+            SELECT id, ?, CURRENT_TIMESTAMP FROM books WHERE id = ?
+            ON CONFLICT(book_id) DO UPDATE SET
+                views = views + excluded.views,
+                last_viewed_at = excluded.last_viewed_at
+            """,
+            [(count, book_id) for book_id, count in views.items()]
+        )
+
+    @staticmethod
+    def top(conn, limit: int) -> list[int]:
+        rows = conn.execute(
+            "SELECT book_id FROM book_views ORDER BY views DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [row[0] for row in rows]
@@ -1,8 +1,17 @@
+import argparse
 import asyncio
 from app.workers import GenerateEmbeddingsWorker
 from app.model.model import Model
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация эмбеддингов для новых книг")
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="Перестроить HNSW-индекс целиком вместо дописывания новых книг",
+    )
+    args = parser.parse_args()
+
     model = Model().get()
-    worker = GenerateEmbeddingsWorker(model=model, title="Generate embeddings")
+    worker = GenerateEmbeddingsWorker(model=model, full_rebuild=args.full_rebuild, title="Generate embeddings")
     asyncio.run(worker.run())
@@ -1,3 +1,7 @@
-from .hnsw import HNSW
+from .hnsw import HNSW, IndexOutOfSync
+from .tuner import SearchParamsTuner
+from .shards import Shard, ShardedIndex, shard_file
+from .builder import IndexBuilder
+from .compaction import IndexCompactor
 
-__all__ = ["HNSW"]
\ No newline at end of file
+__all__ = ["HNSW", "IndexOutOfSync", "SearchParamsTuner", "Shard", "ShardedIndex", "shard_file", "IndexBuilder", "IndexCompactor"]
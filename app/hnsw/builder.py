@@ -0,0 +1,140 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from app.db import db, BookRepository, EmbeddingsRepository, FeedbackRepository, VectorStore, VectorStoreOutOfSync
+from app.models import Book, EmbeddingMatrix, Feedbacks
+from app.settings.config import INDEX_BUILD_STREAMING, INDEX_BUILD_CHUNK_SIZE, INDEX_SHARDS, VECTOR_STORE_ENABLED
+from .hnsw import HNSW, IndexOutOfSync
+from .shards import Shard
+
+class IndexBuilder:
+    """
+    Обновляет индекс по таблице embeddings: дописывает новые книги или
+    перестраивает целиком. С shard — только книги этого шарда.
+    """
+    def __init__(self, hnsw: HNSW, shard: Shard | None = None, logger=None):
+        self.hnsw = hnsw
+        self.shard = shard
+        self.logger = logger
+
+    @staticmethod
+    def for_config(logger=None) -> List["IndexBuilder"]:
+        # один индекс или по сборщику на каждый шард INDEX_SHARDS; шарды независимы
+        if INDEX_SHARDS <= 1:
+            return [IndexBuilder(HNSW(batch_size=10000, logger=logger), logger=logger)]
+
+        with db() as conn:
+            _, min_id, max_id = EmbeddingsRepository().stats(conn)
+        return [
+            IndexBuilder(HNSW(index_file=shard.index_file, batch_size=10000, logger=logger), shard, logger=logger)
+            for shard in Shard.load_plan(min_id=min_id, max_id=max_id)
+        ]
+
+    @property
+    def where(self) -> Tuple[str, tuple]:
+        return self.shard.where() if self.shard else ("1", ())
+
+    def update(self, full_rebuild: bool = False):
+        if not full_rebuild and self.hnsw.check_index():
+            try:
+                self.append()
+                return
+            except IndexOutOfSync as e:
+                if self.logger: self.logger.warning(f"Индекс не совпадает с базой, перестраиваем полностью: {e}")
+
+        self.rebuild()
+
+    def append(self):
+        # в индекс уходят только книги, добавленные после последней сборки
+        # дописываем в индекс, поэтому он нужен целиком в памяти, а не отображённым
+        index = self.hnsw.load_from_file(mmap=False)
+        indexed_max_id = self.hnsw.covered_max_id(index)
+
+        with db() as conn:
+            embeddings = list[Tuple[int, bytes]](EmbeddingsRepository().get_after(conn, indexed_max_id, self.where))
+            count, min_id, max_id = EmbeddingsRepository().stats(conn, self.where)
+
+        self.hnsw.load_emb(embeddings)
+        self.hnsw.append(index)
+        HNSW.verify(index, count, min_id, max_id, (self.hnsw.read_meta() or {}).get("skipped_ids", []))
+
+    def rebuild(self):
+        if INDEX_BUILD_STREAMING:
+            self.rebuild_streaming()
+        else:
+            self.rebuild_in_memory()
+
+        if self.shard:
+            self.hnsw.update_meta({"shard": self.shard.to_meta()})
+
+    def rebuild_in_memory(self):
+        with db() as conn:
+            feedbacks = Feedbacks(FeedbackRepository.get_all(conn))
+            books: list[Book] = [
+                Book.map_row(row)
+                for row in BookRepository().get_all(conn)
+            ]
+
+        matrix = EmbeddingMatrix.load(logger=self.logger)
+        if self.shard:
+            mask = self.shard.contains(matrix.ids)
+            skipped = np.asarray(matrix.skipped_ids, dtype=np.int64)
+            matrix = EmbeddingMatrix(matrix.ids[mask], matrix.vectors[mask], skipped[self.shard.contains(skipped)].tolist())
+
+        self.hnsw.load_matrix(matrix)
+        self.hnsw.rebuild(
+            feedbacks=feedbacks,
+            books=books,
+        )
+
+    def rebuild_streaming(self):
+        # векторы читаются порциями прямо в индекс, полная матрица в памяти не собирается
+        with db() as conn:
+            if self.hnsw.reranker_trainer:
+                self.train_reranker(conn)
+            versions = EmbeddingsRepository().get_versions(conn, self.where) if VECTOR_STORE_ENABLED else None
+
+        if versions is not None and self.rebuild_from_store(VectorStore(logger=self.logger), *VectorStore.split_versions(versions)):
+            return
+
+        with db() as conn:
+            count, _, _ = EmbeddingsRepository().stats(conn, self.where)
+            sample = EmbeddingsRepository().get_sample(conn, self.hnsw.sample_size(), self.where)
+            self.hnsw.generate_streaming(
+                EmbeddingsRepository().get_chunks(conn, INDEX_BUILD_CHUNK_SIZE, where=self.where),
+                count,
+                sample,
+            )
+
+    def rebuild_from_store(self, store: VectorStore, book_ids: np.ndarray, versions: np.ndarray) -> bool:
+        # файлы хранилища вместо SQLite, если в них есть все книги из базы в тех же версиях
+        if not store.exists():
+            return False
+        try:
+            rows = store.rows_for(book_ids, versions)
+        except VectorStoreOutOfSync as e:
+            if self.logger: self.logger.warning(f"Хранилище векторов не совпадает с базой, читаем из SQLite: {e}")
+            return False
+
+        sample_rows = np.random.default_rng().choice(rows, size=min(len(rows), self.hnsw.sample_size()), replace=False)
+        self.hnsw.generate_streaming(
+            (EmbeddingMatrix.from_vectors(ids, vectors) for ids, vectors in store.chunks(rows, INDEX_BUILD_CHUNK_SIZE)),
+            len(rows),
+            EmbeddingMatrix.from_vectors(*store.read(sample_rows)),
+        )
+        return True
+
+    def train_reranker(self, conn):
+        feedbacks = Feedbacks(FeedbackRepository.get_all(conn))
+        books: list[Book] = [
+            Book.map_row(row)
+            for row in BookRepository().get_all(conn)
+        ]
+        if not feedbacks.items or not books:
+            return
+
+        # reranker'у нужны только векторы книг из feedback
+        book_ids = {int(book_id) for fb in feedbacks.items for book_id in (fb.source_id, fb.candidate_id)}
+        rows = list(EmbeddingsRepository().get_many(conn, list(book_ids)).items())
+        self.hnsw.rebuild_trainer(feedbacks, books, EmbeddingMatrix.from_rows(rows))
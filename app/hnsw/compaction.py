@@ -0,0 +1,60 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.db import db, EmbeddingsRepository, TombstoneRepository, VectorStore, VectorStoreOutOfSync
+from app.settings.config import INDEX_COMPACT_RATIO
+from .builder import IndexBuilder
+
+class IndexCompactor:
+    """
+    Физически удаляет книги, помеченные удалёнными: векторы из embeddings,
+    списки похожих и сам индекс. Удалить вектор из IndexIDMap на месте нельзя
+    (HNSW не умеет, у IVF ломается соответствие меток), поэтому индекс
+    перестраивается — и только когда доля удалённых превысила порог.
+    """
+    def __init__(self, ratio: float = INDEX_COMPACT_RATIO, logger=None):
+        self.ratio = ratio
+        self.logger = logger
+
+    def status(self) -> Tuple[List[int], int]:
+        with db() as conn:
+            return TombstoneRepository().get_pending(conn), EmbeddingsRepository().count(conn)
+
+    def due(self, pending: int, total: int) -> bool:
+        return pending > 0 and pending / max(1, total) >= self.ratio
+
+    def run(self, force: bool = False, builders: Optional[List[IndexBuilder]] = None) -> int:
+        pending, total = self.status()
+        if not pending or (not force and not self.due(len(pending), total)):
+            if self.logger: self.logger.info(
+                f"Удалённых книг в индексе: {len(pending):,} из {total:,} — меньше порога {self.ratio:.1%}, компактизация не нужна"
+            )
+            return 0
+
+        if self.logger: self.logger.info(f"Компактизация: {len(pending):,} удалённых книг из {total:,}")
+        with db() as conn:
+            TombstoneRepository().drop_similar(conn)
+            purged = TombstoneRepository().purge(conn, pending)
+            book_ids = np.asarray(EmbeddingsRepository().get_ids(conn), dtype=np.int64)
+        self.compact_store(book_ids)
+
+        # если перестроение упадёт, следующий запуск увидит расхождение индекса с базой и перестроит его
+        for builder in builders or IndexBuilder.for_config(logger=self.logger):
+            builder.rebuild()
+
+        with db() as conn:
+            TombstoneRepository().mark_compacted(conn, pending)
+        if self.logger: self.logger.info(f"Компактизация завершена: удалено векторов {purged:,}")
+        return len(pending)
+
+    def compact_store(self, book_ids: np.ndarray):
+        # перестроение индекса прочитает векторы уже из переписанного хранилища
+        store = VectorStore(logger=self.logger)
+        if not store.exists():
+            return
+        try:
+            store.sync()
+            store.rewrite(book_ids)
+        except VectorStoreOutOfSync as e:
+            if self.logger: self.logger.warning(f"Хранилище векторов не переписано, нужна пересборка build_vector_store.py --rebuild: {e}")
@@ -1,51 +1,158 @@
 import os
+import glob
+import json
+import time
+import hashlib
 import faiss
 import numpy as np
 from tqdm import tqdm
-from typing import List, Tuple
-from app.models import Embedding
-from app.settings.config import HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, INDEX_FILE
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+from app.models import EmbeddingMatrix
+from app.metrics import INDEX_LOAD_SECONDS, memory_usage, peak_rss
+from app.settings.config import (
+    INDEX_FILE,
+    INDEX_MMAP,
+    INDEX_KEEP_VERSIONS,
+    INDEX_VERIFY_CHECKSUM,
+    INDEX_TYPE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    IVF_NLIST,
+    IVF_NPROBE,
+    PQ_M,
+    PQ_NBITS,
+    INDEX_TRAIN_SIZE,
+    INDEX_RECALL_SAMPLE,
+    INDEX_BUILD_THREADS,
+)
 from .trainers.rerankerTrainer import RerankerTrainer
 
+class IndexOutOfSync(ValueError):
+    pass
+
+INDEX_TYPES = ("hnsw_flat", "hnsw_sq8", "ivf_pq", "opq_ivf_pq")
+RECALL_K = 10
+
 class HNSW:
+    """
+    Векторный индекс поиска похожих книг. Исторически — HNSW, сейчас тип выбирается
+    настройкой INDEX_TYPE: HNSW с float32 или SQ8-векторами, IVF-PQ и OPQ+IVF-PQ.
+    Метки всегда books.id (IndexIDMap).
+
+    Каждая сборка пишется в отдельный файл версии (index.v<версия>.faiss), а
+    публикуется подменой манифеста index.faiss.meta.json: читатель видит либо
+    старую версию целиком, либо новую. Без манифеста читается сам index_file.
+    """
     def __init__(
         self,
         index_file: str = f"{INDEX_FILE}",
         batch_size: int = None,
         reranker_trainer: RerankerTrainer | None = None,
         logger=None,
+        mmap: bool = INDEX_MMAP,
+        index_type: str = INDEX_TYPE,
+        threads: int = INDEX_BUILD_THREADS,
+        m: int = HNSW_M,
     ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Неизвестный тип индекса '{index_type}', допустимы: {', '.join(INDEX_TYPES)}")
+
         self.index_file = index_file
+        self.mmap = mmap
+        self.index_type = index_type
+        self.m = m
         self.batch_size = batch_size
+        # 0 — все ядра; число потоков OpenMP для обучения и добавления векторов
+        self.threads = threads if threads > 0 else (os.cpu_count() or 1)
         self.reranker_trainer = reranker_trainer
         self.logger = logger
 
         self._index = None
         self.embeddings = []
+        self.ids = np.empty(0, dtype=np.int64)
+        self.skipped_ids: list[int] = []
         self.embedding_dim = 0
+        self.build_stats: dict[str, Any] = {}
+        self.loaded_version: str | None = None
+
+    @property
+    def meta_file(self) -> str:
+        return f"{self.index_file}.meta.json"
+
+    def version_file(self, version: str) -> str:
+        root, ext = os.path.splitext(str(self.index_file))
+        return f"{root}.v{version}{ext}"
+
+    def current_file(self, meta: dict[str, Any] | None = None) -> str:
+        # файл опубликованной версии; старые индексы без манифеста лежат в index_file
+        meta = self.read_meta() if meta is None else meta
+        if meta and meta.get("file"):
+            return os.path.join(os.path.dirname(str(self.index_file)), meta["file"])
+        return str(self.index_file)
+
+    @staticmethod
+    def set_omp_threads(threads: int):
+        faiss.omp_set_num_threads(max(1, threads))
+
+    @staticmethod
+    def is_id_mapped(index: faiss.Index) -> bool:
+        return isinstance(index, faiss.IndexIDMap)
+
+    @staticmethod
+    def get_base(index: faiss.Index) -> faiss.Index:
+        # снимаем обёртки IDMap и OPQ-преобразования, под ними — HNSW или IVF
+        if HNSW.is_id_mapped(index):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexPreTransform):
+            index = faiss.downcast_index(index.index)
+        return index
 
-    def __estimate_hnsw_memory_gb(self, ntotal: int, dim: int, overhead_factor: float = 1.12) -> float:
-        bytes_per_vector = (dim * 4) + (HNSW_M * 8)
-        total_bytes = ntotal * bytes_per_vector
-        total_bytes_with_overhead = total_bytes * overhead_factor
-        gb = total_bytes_with_overhead / (1024 ** 3)
-        return gb
+    @staticmethod
+    def apply_search_params(index: faiss.Index, ef_search: int = HNSW_EF_SEARCH, nprobe: int = IVF_NPROBE):
+        base = HNSW.get_base(index)
+        if isinstance(base, faiss.IndexHNSW):
+            base.hnsw.efSearch = ef_search
+        elif isinstance(base, faiss.IndexIVF):
+            base.nprobe = nprobe
 
-    def load_emb(self, embeddings: List[Tuple[int, bytes]]):     
-        valid_embeddings = []
+    def factory_string(self, n_total: int) -> str:
+        if self.index_type == "hnsw_flat":
+            return f"HNSW{self.m},Flat"
+        if self.index_type == "hnsw_sq8":
+            return f"HNSW{self.m},SQ8"
 
-        # можно и из памяти, но сейчас влом. Важно, чтобы сохранился индекс
-        with tqdm(total=len(embeddings), desc="Загружаем ембеддинги", unit=" строк\с", unit_scale=True) as pbar:
-            for embedding in embeddings:
-                emb = Embedding.from_db(embedding[1]).vec
-                valid_embeddings.append(emb)
-                pbar.update(1)
+        if self.embedding_dim % PQ_M != 0:
+            raise ValueError(f"PQ_M ({PQ_M}) должно делить размерность векторов ({self.embedding_dim})")
 
-        self.embeddings = np.ascontiguousarray(valid_embeddings).astype(np.float32)
-        self.embedding_dim = self.embeddings.shape[1]  # [кол-во_строк, размерность_вектора]
-        del valid_embeddings
+        # ~4·√N списков, но не меньше 39 обучающих векторов на центроид
+        nlist = IVF_NLIST or int(4 * np.sqrt(n_total))
+        nlist = max(1, min(nlist, n_total // 39))
+        ivf_pq = f"IVF{nlist},PQ{PQ_M}x{PQ_NBITS}"
+        return ivf_pq if self.index_type == "ivf_pq" else f"OPQ{PQ_M},{ivf_pq}"
 
-    def get_index(self) -> faiss.IndexHNSWFlat:
+    @staticmethod
+    def get_ids(index: faiss.Index) -> np.ndarray:
+        # метки индекса: books.id для IDMap, позиции для старых индексов без IDMap
+        if HNSW.is_id_mapped(index):
+            return faiss.vector_to_array(index.id_map)
+        return np.arange(index.ntotal, dtype=np.int64)
+
+    def load_emb(self, embeddings: List[Tuple[int, bytes]]):
+        self.load_matrix(EmbeddingMatrix.from_rows(embeddings))
+
+    def load_matrix(self, matrix: EmbeddingMatrix):
+        # нулевой вектор не нормируется: в индекс не попадает, но запоминается в метаданных
+        self.skipped_ids = list(matrix.skipped_ids)
+        if self.skipped_ids and self.logger:
+            self.logger.warning(f"Пропущено {len(self.skipped_ids):,} нулевых векторов")
+
+        self.embeddings = matrix.vectors
+        self.ids = matrix.ids
+        self.embedding_dim = matrix.dim  # [кол-во_строк, размерность_вектора]
+
+    def get_index(self) -> faiss.Index:
         if len(self.embeddings) == 0:
             raise ValueError(f"Попытка сохранить индекс с пустым списокм векторов")
         
@@ -55,7 +162,7 @@ class HNSW:
         if self._index is not None:
             return self._index
 
-        if os.path.exists(self.index_file):
+        if self.check_index():
             if self.logger: self.logger.info(f"Файл '{self.index_file}' найден. Загружаем...")
             self._index = self.load_from_file()
         else:
@@ -64,76 +171,433 @@ class HNSW:
 
         return self._index
     
+    def version(self) -> str:
+        # версия из манифеста; для старого индекса без неё — по времени изменения и размеру файла
+        meta = self.read_meta()
+        if meta and meta.get("version"):
+            return meta["version"]
+        stat = os.stat(self.index_file)
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
     def check_index(self):
-        if os.path.exists(self.index_file):
+        if os.path.exists(self.current_file()):
             return True
         else:
             return False
 
-    def generate_and_save(self) -> faiss.IndexHNSWFlat:
+    def generate_and_save(self) -> faiss.IndexIDMap:
         if len(self.embeddings) == 0:
             raise ValueError(f"Попытка сохранить индекс с пустым списокм векторов")
         
         if self.embeddings.shape[1] != self.embedding_dim:
             raise ValueError(f"Размерность embeddings ({self.embeddings.shape[1]}) не совпадает с embedding_dim ({self.embedding_dim})")
 
-        index = faiss.IndexHNSWFlat(self.embedding_dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
-        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
-        index.hnsw.efSearch = HNSW_EF_SEARCH
+        if len(self.ids) != len(self.embeddings):
+            raise ValueError(f"Количество id ({len(self.ids)}) не совпадает с количеством векторов ({len(self.embeddings)})")
 
         n_total = self.embeddings.shape[0]
-        if self.logger: self.logger.info(f"Генерация HNSW: {n_total:,} векторов, dim={self.embedding_dim}, M={HNSW_M}, efConstruction={HNSW_EF_CONSTRUCTION}")
+        self.set_omp_threads(self.threads)
+        base, description = self.create_base(n_total)
+        train_seconds = self.train(base, self.embeddings)
 
-        with tqdm(total=n_total, desc="Добавление векторов в HNSW", unit="vec", unit_scale=True) as pbar:
-            for i in range(0, n_total, self.batch_size):
-                end = min(i + self.batch_size, n_total)
-                batch = self.embeddings[i:end]
-                index.add(batch)
+        # метки индекса — books.id: так новые книги можно дописывать без перестроения
+        index = faiss.IndexIDMap(base)
+
+        batch_size = self.batch_size or max(1, n_total // 100)
+        started_at = time.perf_counter()
+        with tqdm(total=n_total, desc="Добавление векторов в индекс", unit="vec", unit_scale=True) as pbar:
+            for i in range(0, n_total, batch_size):
+                end = min(i + batch_size, n_total)
+                index.add_with_ids(self.embeddings[i:end], self.ids[i:end])
                 pbar.update(end - i)
-        
-        mem_gb = self.__estimate_hnsw_memory_gb(
-            ntotal=index.ntotal,
-            dim=self.embedding_dim,
-            overhead_factor=1.10          # консервативно 10%, можно 1.15
+        build_seconds = time.perf_counter() - started_at
+
+        self.apply_search_params(index)
+        recall = self.measure_recall(index)
+        self.finish_build(index, description, train_seconds, build_seconds, recall)
+        return index
+
+    def generate_streaming(
+        self,
+        chunks: Iterable[List[Tuple[int, bytes]] | EmbeddingMatrix],
+        n_total: int,
+        sample: List[Tuple[int, bytes]] | EmbeddingMatrix,
+    ) -> faiss.IndexIDMap:
+        """
+        Строит индекс, читая векторы порциями (chunks — строки embeddings частями
+        по возрастанию book_id или готовые матрицы из хранилища векторов) и сразу
+        добавляя их в индекс: в памяти только индекс и одна порция.
+        sample — случайная выборка (не меньше sample_size()):
+        по ней обучается индекс, первые INDEX_RECALL_SAMPLE из неё — запросы для
+        оценки recall, точный ответ для них считается по тем же порциям.
+        """
+        if not isinstance(sample, EmbeddingMatrix):
+            sample = EmbeddingMatrix.from_rows(sample)
+        if len(sample) == 0 or n_total <= 0:
+            raise ValueError(f"Попытка сохранить индекс с пустым списокм векторов")
+
+        self.embedding_dim = sample.dim
+        self.set_omp_threads(self.threads)
+        base, description = self.create_base(n_total)
+        train_seconds = self.train(base, sample.vectors[:INDEX_TRAIN_SIZE])
+
+        queries = sample.vectors[:INDEX_RECALL_SAMPLE]
+        del sample
+        k = RECALL_K
+        exact = faiss.ResultHeap(len(queries), k, keep_max=True) if len(queries) else None
+
+        index = faiss.IndexIDMap(base)
+        self.skipped_ids = []
+        started_at = time.perf_counter()
+        with tqdm(total=n_total, desc="Потоковое добавление векторов", unit="vec", unit_scale=True) as pbar:
+            for rows in chunks:
+                chunk = rows if isinstance(rows, EmbeddingMatrix) else EmbeddingMatrix.from_rows(rows, self.embedding_dim)
+                self.skipped_ids.extend(chunk.skipped_ids)
+                pbar.update(len(chunk) + len(chunk.skipped_ids))
+                if not len(chunk):
+                    continue
+
+                index.add_with_ids(chunk.vectors, chunk.ids)
+                if exact is not None:
+                    self._merge_exact(exact, queries, chunk.ids, chunk.vectors, k)
+        build_seconds = time.perf_counter() - started_at
+
+        if index.ntotal == 0:
+            raise ValueError(f"Попытка сохранить индекс с пустым списокм векторов")
+        if self.skipped_ids and self.logger:
+            self.logger.warning(f"Пропущено {len(self.skipped_ids):,} нулевых векторов")
+
+        self.apply_search_params(index)
+        recall = None
+        if exact is not None:
+            exact.finalize()
+            _, found = index.search(queries, k)
+            recall = self.recall(exact.I, found)
+
+        self.finish_build(index, description, train_seconds, build_seconds, recall)
+        self._index = index
+        return index
+
+    def sample_size(self) -> int:
+        # HNSW с float32 не обучается, остальным типам нужна обучающая выборка
+        train_size = 0 if self.index_type == "hnsw_flat" else INDEX_TRAIN_SIZE
+        return max(train_size, INDEX_RECALL_SAMPLE)
+
+    @staticmethod
+    def _merge_exact(heap: "faiss.ResultHeap", queries: np.ndarray, ids: np.ndarray, vecs: np.ndarray, k: int):
+        # точный поиск по порции; ResultHeap держит лучшие k по всем порциям
+        kc = min(k, len(ids))
+        distances, rows = faiss.knn(queries, vecs, kc, metric=faiss.METRIC_INNER_PRODUCT)
+        labels = ids[rows]
+        if kc < k:
+            distances = np.pad(distances, ((0, 0), (0, k - kc)), constant_values=-np.inf)
+            labels = np.pad(labels, ((0, 0), (0, k - kc)), constant_values=-1)
+        heap.add_result(np.ascontiguousarray(distances, dtype=np.float32), np.ascontiguousarray(labels))
+
+    def create_base(self, n_total: int) -> Tuple[faiss.Index, str]:
+        description = self.factory_string(n_total)
+        base = faiss.index_factory(self.embedding_dim, description, faiss.METRIC_INNER_PRODUCT)
+        if isinstance(self.get_base(base), faiss.IndexHNSW):
+            self.get_base(base).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+        if self.logger: self.logger.info(
+            f"Генерация индекса {self.index_type} ({description}): {n_total:,} векторов, "
+            f"dim={self.embedding_dim}, потоков: {self.threads}"
         )
+        return base, description
+
+    def finish_build(self, index: faiss.Index, description: str, train_seconds: float, build_seconds: float, recall: float | None):
+        self.save(index, self.skipped_ids, {
+            "index_type": self.index_type,
+            "description": description,
+            f"recall_at_{RECALL_K}": recall,
+        })
+        index_bytes = os.path.getsize(self.current_file())
+        bytes_per_vector = index_bytes / max(1, index.ntotal)
+        throughput = index.ntotal / build_seconds if build_seconds > 0 else 0.0
+        self.build_stats = {
+            "train_seconds": train_seconds,
+            "add_seconds": build_seconds,
+            "vectors_per_second": throughput,
+            "index_bytes": index_bytes,
+            f"recall_at_{RECALL_K}": recall,
+        }
 
         if self.logger: self.logger.info(
-            "HNSW индекс построен:\n"
+            "Индекс построен:\n"
+            f"  • тип                       : {self.index_type} ({description})\n"
             f"  • количество векторов       : {index.ntotal:,}\n"
             f"  • размерность               : {index.d}\n"
-            f"  • M (связи на узел)         : {HNSW_M}\n"
-            f"  • efConstruction            : {HNSW_EF_CONSTRUCTION}\n"
-            f"  • efSearch (по умолчанию)   : {HNSW_EF_SEARCH}\n"
-            f"  • память                    : ~ {mem_gb:.1f}–{mem_gb*1.15:.1f} GB"
+            f"  • обучение / добавление     : {train_seconds:.1f} с / {build_seconds:.1f} с\n"
+            f"  • скорость добавления       : {throughput:,.0f} векторов/с ({self.threads} потоков)\n"
+            f"  • память на вектор          : {bytes_per_vector:,.0f} байт (float32: {index.d * 4:,})\n"
+            f"  • пик RSS процесса          : {peak_rss() / (1024 ** 2):,.0f} MB\n"
+            f"  • recall@{RECALL_K} к точному поиску : {'—' if recall is None else f'{recall:.4f}'}"
         )
-            
-        # Сохранение на диск
-        faiss.write_index(index, self.index_file)
-        if self.logger: self.logger.info(f"Индекс сохранён в '{self.index_file}' (размер: {os.path.getsize(self.index_file) / (1024**2):.2f} MB)")
 
-        return index
+    def train(self, base: faiss.Index, vectors: np.ndarray) -> float:
+        if base.is_trained:
+            return 0.0
+
+        n_total = vectors.shape[0]
+        size = min(n_total, INDEX_TRAIN_SIZE)
+        sample = vectors
+        if size < n_total:
+            rows = np.sort(np.random.default_rng(0).choice(n_total, size, replace=False))
+            sample = vectors[rows]
+
+        if self.logger: self.logger.info(f"Обучение индекса на {size:,} векторах")
+        started_at = time.perf_counter()
+        base.train(sample)
+        return time.perf_counter() - started_at
 
-    def load_from_file(self) -> faiss.IndexHNSWFlat:
-        if not os.path.exists(self.index_file):
-            raise FileNotFoundError(f"Файл '{self.index_file}' не существует")
+    def measure_recall(self, index: faiss.Index, sample: int = INDEX_RECALL_SAMPLE, k: int = RECALL_K) -> float | None:
+        # доля истинных k ближайших (точный перебор по тем же векторам), найденных индексом
+        n_total = self.embeddings.shape[0]
+        sample = min(sample, n_total)
+        k = min(k, n_total)
+        if sample <= 0 or k <= 0:
+            return None
+
+        rows = np.random.default_rng(1).choice(n_total, sample, replace=False)
+        queries = self.embeddings[rows]
+
+        _, exact_rows = faiss.knn(queries, self.embeddings, k, metric=faiss.METRIC_INNER_PRODUCT)
+        _, found = index.search(queries, k)
+        return self.recall(self.ids[exact_rows], found)
+
+    @staticmethod
+    def recall(exact: np.ndarray, found: np.ndarray) -> float:
+        total = int((exact >= 0).sum())
+        hits = sum(len(set(e) & set(f) - {-1}) for e, f in zip(exact.tolist(), found.tolist()))
+        return hits / total if total else 0.0
+
+
+    def save(self, index: faiss.Index, skipped_ids: list[int], info: dict[str, Any] | None = None):
+        # новая версия пишется рядом со старой, публикация — атомарная подмена манифеста.
+        # Файл текущей версии не трогаем: его могут читать или держать отображённым
+        version = f"{datetime.now():%Y%m%d%H%M%S}-{os.urandom(3).hex()}"
+        version_file = self.version_file(version)
+        tmp_file = f"{version_file}.tmp"
+        faiss.write_index(index, tmp_file)
+        checksum = self.checksum(tmp_file)
+        os.replace(tmp_file, version_file)
+
+        self.write_meta({
+            **(info or {}),
+            **self.make_meta(index, skipped_ids),
+            "version": version,
+            "file": os.path.basename(version_file),
+            "size": os.path.getsize(version_file),
+            "sha256": checksum,
+        })
+        if self.logger: self.logger.info(f"Индекс версии {version} опубликован: '{version_file}' (размер: {os.path.getsize(version_file) / (1024**2):.2f} MB)")
+        self.remove_old_versions()
+
+    @staticmethod
+    def checksum(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def remove_old_versions(self, keep: int = INDEX_KEEP_VERSIONS):
+        # предыдущая версия остаётся: процесс мог прочитать старый манифест и ещё не открыть файл
+        current = os.path.abspath(self.current_file())
+        root, ext = os.path.splitext(str(self.index_file))
+        versions = sorted(
+            (path for path in glob.glob(f"{glob.escape(root)}.v*{ext}") if os.path.abspath(path) != current),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        legacy = [str(self.index_file)] if os.path.exists(self.index_file) else []
+        for path in versions[keep - 1:] + legacy:
+            try:
+                os.remove(path)
+                if self.logger: self.logger.info(f"Удалена старая версия индекса '{path}'")
+            except OSError as e:
+                if self.logger: self.logger.warning(f"Не удалось удалить '{path}': {e}")
+
+    @staticmethod
+    def make_meta(index: faiss.Index, skipped_ids: list[int]) -> dict[str, Any]:
+        ids = HNSW.get_ids(index)
+        return {
+            "ntotal": int(index.ntotal),
+            "dim": int(index.d),
+            "id_mapped": HNSW.is_id_mapped(index),
+            "min_id": int(ids.min()) if len(ids) else None,
+            "max_id": int(ids.max()) if len(ids) else None,
+            "ids_sha1": hashlib.sha1(ids.tobytes()).hexdigest(),
+            "skipped_ids": sorted({int(i) for i in skipped_ids}),
+            "saved_at": datetime.now().isoformat(),
+        }
 
-        index = faiss.read_index(self.index_file)
-        if not isinstance(index, faiss.IndexHNSWFlat):
-            raise TypeError("Загруженный индекс не является HNSWFlat")
+    def read_meta(self) -> dict[str, Any] | None:
+        if not os.path.exists(self.meta_file):
+            return None
+        with open(self.meta_file, encoding="utf-8") as f:
+            return json.load(f)
 
-        index.hnsw.efSearch = HNSW_EF_SEARCH
+    def update_meta(self, info: Dict[str, Any], version: str | None = None):
+        """
+        Дополняет метаданные без перезаписи индекса; None удаляет ключ.
+        version — версия, к которой относятся данные: если сборка успела
+        опубликовать другую, запись отменяется.
+        """
+        meta = self.read_meta()
+        if meta is None:
+            raise FileNotFoundError(f"Файл '{self.meta_file}' не существует")
+        if version is not None and (meta.get("version") or self.version()) != version:
+            raise IndexOutOfSync(f"Опубликована версия индекса {meta.get('version')}, а данные получены для {version}")
 
-        if self.logger: self.logger.info(f"Индекс загружен из '{self.index_file}' (ntotal: {index.ntotal:,})")
+        meta.update(info)
+        self.write_meta({key: value for key, value in meta.items() if value is not None})
+
+    def write_meta(self, meta: Dict[str, Any]):
+        tmp_meta = f"{self.meta_file}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self.meta_file)
+
+    @staticmethod
+    def check_meta(index: faiss.Index, meta: dict[str, Any]):
+        # метаданные пишутся вместе с индексом: расхождение значит, что файл подменён или недописан
+        actual = HNSW.make_meta(index, meta.get("skipped_ids", []))
+        for key in ("ntotal", "dim", "id_mapped", "ids_sha1"):
+            if meta.get(key) != actual[key]:
+                raise IndexOutOfSync(f"Индекс не совпадает с метаданными: {key} = {actual[key]}, ожидалось {meta.get(key)}")
+
+    def append(self, index: faiss.IndexIDMap) -> int:
+        """
+        Дописывает в индекс загруженные load_emb векторы книг, которых в нём ещё нет
+        (id больше максимального id индекса), и сохраняет результат.
+        """
+        if not self.is_id_mapped(index):
+            raise IndexOutOfSync("Индекс без IDMap (старый формат), нужно полное перестроение")
+
+        meta = self.read_meta() or {}
+        skipped_ids = meta.get("skipped_ids", []) + self.skipped_ids
+
+        if len(self.embeddings) == 0:
+            if self.skipped_ids:
+                self.save(index, skipped_ids, meta)
+            return 0
+
+        if self.embedding_dim != index.d:
+            raise IndexOutOfSync(f"Размерность новых векторов ({self.embedding_dim}) не совпадает с индексом ({index.d})")
+
+        max_id = self.covered_max_id(index)
+        fresh = self.ids > max_id
+        if not fresh.all():
+            raise IndexOutOfSync(f"Новые векторы должны иметь id больше {max_id:,}")
+
+        n_total = len(self.ids)
+        batch_size = self.batch_size or n_total
+        with tqdm(total=n_total, desc="Дописываем векторы в HNSW", unit="vec", unit_scale=True) as pbar:
+            for i in range(0, n_total, batch_size):
+                end = min(i + batch_size, n_total)
+                index.add_with_ids(self.embeddings[i:end], self.ids[i:end])
+                pbar.update(end - i)
+
+        self.save(index, skipped_ids, meta)
+        self._index = index
+        if self.logger: self.logger.info(f"В индекс добавлено {n_total:,} векторов (ntotal: {index.ntotal:,})")
+        return n_total
+
+    def covered_max_id(self, index: faiss.Index) -> int:
+        # максимальный id, который уже учтён: в индексе или среди пропущенных нулевых векторов
+        skipped_ids = (self.read_meta() or {}).get("skipped_ids", [])
+        ids_max = int(self.get_ids(index).max()) if index.ntotal else -1
+        return max([ids_max, *skipped_ids])
+
+    @staticmethod
+    def verify(index: faiss.Index, count: int, min_id: int | None, max_id: int | None, skipped_ids: list[int] = ()):
+        # индекс (вместе с пропущенными нулевыми векторами) и таблица embeddings
+        # должны описывать один и тот же набор книг
+        if index.ntotal + len(skipped_ids) != count:
+            raise IndexOutOfSync(f"В индексе {index.ntotal:,} векторов (+{len(skipped_ids)} пропущено), в базе {count:,}")
+
+        if not count or not HNSW.is_id_mapped(index):
+            return
+
+        ids = HNSW.get_ids(index)
+        if len(skipped_ids):
+            ids = np.concatenate([ids, np.asarray(skipped_ids, dtype=np.int64)])
+        if int(ids.min()) != min_id or int(ids.max()) != max_id:
+            raise IndexOutOfSync(
+                f"Диапазон id индекса [{int(ids.min())}, {int(ids.max())}] не совпадает с базой [{min_id}, {max_id}]"
+            )
+
+    def load_from_file(self, mmap: bool | None = None) -> faiss.Index:
+        # манифест читается один раз: файл, проверка и версия берутся из одной публикации
+        meta = self.read_meta()
+        index_file = self.current_file(meta)
+        if not os.path.exists(index_file):
+            raise FileNotFoundError(f"Файл '{index_file}' не существует")
+
+        version = (meta or {}).get("version") or self.version()
+        if INDEX_VERIFY_CHECKSUM and meta and meta.get("sha256") and self.checksum(index_file) != meta["sha256"]:
+            raise IndexOutOfSync(f"Контрольная сумма '{index_file}' не совпадает с манифестом")
+
+        mmap = self.mmap if mmap is None else mmap
+        memory_before = memory_usage()
+        started_at = time.perf_counter()
+
+        index, mode = self._read_index(index_file, mmap)
+
+        elapsed = time.perf_counter() - started_at
+        INDEX_LOAD_SECONDS.observe(elapsed, mode=mode)
+        memory_after = memory_usage()
+
+        if not isinstance(self.get_base(index), (faiss.IndexHNSW, faiss.IndexIVF)):
+            raise TypeError(f"Неподдерживаемый тип индекса: {type(self.get_base(index)).__name__}")
+
+        if meta is not None:
+            self.check_meta(index, meta)
+        elif self.logger:
+            self.logger.warning(f"Нет метаданных '{self.meta_file}', проверка индекса пропущена")
+
+        # параметры, подобранные tune_index, важнее значений по умолчанию из настроек
+        tuned = (meta or {}).get("search_params") or {}
+        self.apply_search_params(index, tuned.get("ef_search", HNSW_EF_SEARCH), tuned.get("nprobe", IVF_NPROBE))
+        if tuned and self.logger:
+            self.logger.info(f"Параметры поиска из настройки индекса: {', '.join(f'{k}={tuned[k]}' for k in ('ef_search', 'nprobe') if k in tuned)}")
+
+        self.loaded_version = version
+        if self.logger: self.logger.info(
+            f"Индекс версии {version} загружен из '{index_file}' (ntotal: {index.ntotal:,}, режим: {mode}, {elapsed:.2f} с, "
+            f"RSS собственная +{(memory_after['anon'] - memory_before['anon']) / (1024 ** 2):,.0f} MB, "
+            f"файловая +{(memory_after['file'] - memory_before['file']) / (1024 ** 2):,.0f} MB)"
+        )
         return index
 
+    def _read_index(self, index_file: str, mmap: bool) -> tuple[faiss.Index, str]:
+        if not mmap:
+            return faiss.read_index(index_file), "heap"
+
+        # IO_FLAG_MMAP_IFC отображает в память хранилище векторов (IndexFlatCodes):
+        # страницы файла общие для всех процессов, читающих тот же индекс.
+        # Индекс только для чтения — дописывать в него нельзя. Файл версии не меняется
+        # после публикации, а удалённый старый inode остаётся валидным, пока отображён
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(index_file, flag | faiss.IO_FLAG_READ_ONLY), "mmap"
+        except RuntimeError as e:
+            if self.logger: self.logger.warning(f"Индекс нельзя отобразить в память, читаем целиком: {e}")
+            return faiss.read_index(index_file), "heap"
+
     def delete_index_file(self, force: bool = False) -> bool:
-        if not os.path.exists(self.index_file):
+        index_file = self.current_file()
+        if not os.path.exists(index_file):
             if not force:
-                if self.logger: self.logger.info("Файл '{self.index_file}' не существует — ничего не удаляем.")
+                if self.logger: self.logger.info(f"Файл '{index_file}' не существует — ничего не удаляем.")
                 return False
         else:
-            os.remove(self.index_file)
-            if self.logger: self.logger.info(f"Файл '{self.index_file}' удалён.")
+            os.remove(index_file)
+            if os.path.exists(self.meta_file):
+                os.remove(self.meta_file)
+            if self.logger: self.logger.info(f"Файл '{index_file}' удалён.")
             self._index = None
             return True
 
@@ -141,13 +605,18 @@ class HNSW:
             self,
             feedbacks=None,
             books=None,
+            embeddings: Mapping[int, np.ndarray] | None = None,
     ):
         if self.logger:
             self.logger.info("Обучаем reranker по feedback")
 
+        # векторы по book_id; при потоковой сборке передаются только книги из feedback
+        if embeddings is None:
+            embeddings = EmbeddingMatrix(self.ids, self.embeddings)
+
         self.reranker_trainer.train(
             feedbacks=feedbacks,
-            embeddings=self.embeddings,
+            embeddings=embeddings,
             books=books
         )
         
@@ -168,7 +637,8 @@ class HNSW:
         if self.logger:
             self.logger.info("Запущен rebuild HNSW")
 
-        self.delete_index_file(force=True)
+        # старый файл не удаляем: save() атомарно подменит его новым
+        self._index = None
         self._index = self.generate_and_save()
 
         if self.logger:
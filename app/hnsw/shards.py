@@ -0,0 +1,297 @@
+import ipaddress
+import os
+import queue
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from multiprocessing.connection import Client
+from typing import Any, Dict, List, Protocol, Tuple
+
+import numpy as np
+
+from app.metrics import SHARD_SEARCH_SECONDS, SHARD_ERRORS
+from app.settings.config import (
+    INDEX_FILE,
+    INDEX_SHARDS,
+    INDEX_SHARD_SCHEME,
+    INDEX_SHARD_ADDRESSES,
+    SHARD_AUTHKEY,
+    SHARD_TIMEOUT_SECONDS,
+)
+from .hnsw import HNSW
+
+SHARD_SCHEMES = ("range", "hash")
+
+def shard_file(index_file: str, number: int, count: int) -> str:
+    root, ext = os.path.splitext(str(index_file))
+    return f"{root}.shard-{number}-of-{count}{ext}"
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    Часть библиотеки со своим индексом. range — диапазон book_id [start, end)
+    (у крайних шардов граница открыта), hash — book_id % count == number.
+    """
+    number: int
+    count: int
+    scheme: str = "range"
+    start: int | None = None
+    end: int | None = None
+
+    @property
+    def index_file(self) -> str:
+        return shard_file(INDEX_FILE, self.number, self.count)
+
+    @property
+    def name(self) -> str:
+        return f"{self.number}/{self.count}"
+
+    def where(self) -> Tuple[str, tuple]:
+        # условие на embeddings.book_id для выборок этого шарда
+        if self.scheme == "hash":
+            return "book_id % ? = ?", (self.count, self.number)
+
+        conditions, params = [], []
+        if self.start is not None:
+            conditions.append("book_id >= ?")
+            params.append(self.start)
+        if self.end is not None:
+            conditions.append("book_id < ?")
+            params.append(self.end)
+        return " AND ".join(conditions) or "1", tuple(params)
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        if self.scheme == "hash":
+            return ids % self.count == self.number
+
+        mask = np.ones(len(ids), dtype=bool)
+        if self.start is not None:
+            mask &= ids >= self.start
+        if self.end is not None:
+            mask &= ids < self.end
+        return mask
+
+    def to_meta(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @staticmethod
+    def plan(count: int, scheme: str, min_id: int | None, max_id: int | None) -> List["Shard"]:
+        if scheme not in SHARD_SCHEMES:
+            raise ValueError(f"Неизвестная схема шардирования '{scheme}', допустимы: {', '.join(SHARD_SCHEMES)}")
+        if scheme == "hash" or min_id is None:
+            return [Shard(number, count, scheme) for number in range(count)]
+
+        # равные диапазоны id; новые книги (id больше max_id) попадают в последний шард
+        bounds = np.linspace(min_id, max_id + 1, count + 1).astype(np.int64).tolist()
+        return [
+            Shard(number, count, scheme, None if number == 0 else bounds[number], None if number == count - 1 else bounds[number + 1])
+            for number in range(count)
+        ]
+
+    @staticmethod
+    def load_plan(count: int = INDEX_SHARDS, scheme: str = INDEX_SHARD_SCHEME, min_id: int | None = None, max_id: int | None = None) -> List["Shard"]:
+        # границы берутся из метаданных уже собранных шардов, иначе считаются заново
+        shards = []
+        for number in range(count):
+            meta = HNSW(index_file=shard_file(INDEX_FILE, number, count)).read_meta() or {}
+            if "shard" not in meta or meta["shard"]["scheme"] != scheme:
+                return Shard.plan(count, scheme, min_id, max_id)
+            shards.append(Shard(**meta["shard"]))
+        return shards
+
+def is_loopback(host: str) -> bool:
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError):
+        return False
+
+def require_authkey(host: str, authkey: bytes | None):
+    # multiprocessing.connection распаковывает pickle: без ключа любой в сети выполнит код в процессе
+    if authkey is None and not is_loopback(host):
+        raise ValueError(f"Для адреса {host} нужен SHARD_AUTHKEY: без ключа шарды работают только через loopback")
+
+class SearchableShard(Protocol):
+    name: str
+    ntotal: int
+    d: int
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]: ...
+    def get_ids(self) -> np.ndarray: ...
+    def version(self) -> str: ...
+    def current_version(self) -> str: ...
+    def close(self): ...
+
+class LocalShard:
+    def __init__(self, shard: Shard, logger=None):
+        self.name = shard.name
+        self._hnsw = HNSW(index_file=shard.index_file, logger=logger)
+        self.index = self._hnsw.load_from_file()
+        self._version = self._hnsw.loaded_version
+        self.ntotal = self.index.ntotal
+        self.d = self.index.d
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.index.search(queries, k)
+
+    def get_ids(self) -> np.ndarray:
+        return HNSW.get_ids(self.index)
+
+    def version(self) -> str:
+        return self._version
+
+    def current_version(self) -> str:
+        return self._hnsw.version()
+
+    def close(self):
+        pass
+
+class RemoteShard:
+    """
+    Шард в отдельном процессе (app/shard_server.py), запросы по multiprocessing.connection.
+    Соединения переиспользуются: по одному на параллельный запрос.
+    """
+    def __init__(self, name: str, address: str, timeout: float = SHARD_TIMEOUT_SECONDS, authkey: bytes | None = SHARD_AUTHKEY):
+        host, _, port = address.rpartition(":")
+        require_authkey(host or "127.0.0.1", authkey)
+        self.name = name
+        self.address = (host or "127.0.0.1", int(port))
+        self.timeout = timeout
+        self.authkey = authkey
+        self._connections: queue.LifoQueue = queue.LifoQueue()
+
+        info = self._call("info")
+        self.ntotal = info["ntotal"]
+        self.d = info["d"]
+        self._version = info["version"]
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._call("search", queries, k)
+
+    def get_ids(self) -> np.ndarray:
+        return self._call("ids")
+
+    def version(self) -> str:
+        return self._version
+
+    def current_version(self) -> str:
+        # сервер шарда сам подгружает новую версию, здесь она только узнаётся
+        return self._call("info")["version"]
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _call(self, op: str, *args):
+        try:
+            conn = self._connections.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, authkey=self.authkey)
+
+        try:
+            conn.send((op, *args))
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Шард {self.name} ({self.address[0]}:{self.address[1]}) не ответил за {self.timeout} с")
+            status, result = conn.recv()
+        except BaseException:
+            # после ошибки или таймаута ответ может прийти позже — соединение не переиспользуем
+            conn.close()
+            raise
+
+        self._connections.put(conn)
+        if status != "ok":
+            raise RuntimeError(f"Шард {self.name}: {result}")
+        return result
+
+class ShardedIndex:
+    """
+    Несколько шардов как один индекс с интерфейсом faiss (search, ntotal, d):
+    запрос уходит во все шарды параллельно, списки top-k сливаются по score.
+    Недоступный шард пропускается с предупреждением, пока отвечает хотя бы один.
+    """
+    def __init__(self, shards: List[SearchableShard], logger=None):
+        if not shards:
+            raise ValueError("Нет ни одного шарда")
+        self.shards = shards
+        self.logger = logger
+        self.ntotal = sum(shard.ntotal for shard in shards)
+        self.d = shards[0].d
+        self._pool = ThreadPoolExecutor(len(shards), thread_name_prefix="shard")
+
+    @classmethod
+    def open(
+        cls,
+        count: int = INDEX_SHARDS,
+        scheme: str = INDEX_SHARD_SCHEME,
+        addresses: List[str] = INDEX_SHARD_ADDRESSES,
+        logger=None,
+    ) -> "ShardedIndex":
+        if addresses:
+            if len(addresses) != count:
+                raise ValueError(f"Адресов шардов {len(addresses)}, а INDEX_SHARDS = {count}")
+            return cls([RemoteShard(f"{number}/{count}", address) for number, address in enumerate(addresses)], logger)
+
+        return cls([LocalShard(shard, logger) for shard in Shard.load_plan(count, scheme)], logger)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        futures = [self._pool.submit(self._search_shard, shard, queries, k) for shard in self.shards]
+
+        distances, labels, errors = [], [], []
+        for shard, future in zip(self.shards, futures):
+            try:
+                shard_distances, shard_labels = future.result()
+            except Exception as e:
+                SHARD_ERRORS.inc(shard=shard.name)
+                errors.append(f"{shard.name}: {e}")
+                continue
+            distances.append(shard_distances)
+            labels.append(shard_labels)
+
+        if not distances:
+            raise RuntimeError(f"Все шарды недоступны: {'; '.join(errors)}")
+        if errors and self.logger:
+            self.logger.warning(f"Поиск без части шардов: {'; '.join(errors)}")
+
+        return self.merge(distances, labels, k)
+
+    @staticmethod
+    def _search_shard(shard: SearchableShard, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        started_at = time.perf_counter()
+        try:
+            return shard.search(queries, k)
+        finally:
+            SHARD_SEARCH_SECONDS.observe(time.perf_counter() - started_at, shard=shard.name)
+
+    @staticmethod
+    def merge(distances: List[np.ndarray], labels: List[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # скалярное произведение: больше — ближе; пустые места (-1) уходят в конец
+        all_distances = np.hstack(distances)
+        all_labels = np.hstack(labels)
+        all_distances = np.where(all_labels >= 0, all_distances, -np.inf)
+
+        order = np.argsort(-all_distances, axis=1, kind="stable")[:, :k]
+        merged_distances = np.take_along_axis(all_distances, order, axis=1)
+        merged_labels = np.take_along_axis(all_labels, order, axis=1)
+
+        if merged_labels.shape[1] < k:
+            pad = k - merged_labels.shape[1]
+            merged_distances = np.pad(merged_distances, ((0, 0), (0, pad)), constant_values=-np.inf)
+            merged_labels = np.pad(merged_labels, ((0, 0), (0, pad)), constant_values=-1)
+        return merged_distances.astype(np.float32), merged_labels
+
+    def get_ids(self) -> np.ndarray:
+        return np.concatenate([shard.get_ids() for shard in self.shards])
+
+    def version(self) -> str:
+        return "+".join(shard.version() for shard in self.shards)
+
+    def current_version(self) -> str:
+        return "+".join(shard.current_version() for shard in self.shards)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for shard in self.shards:
+            shard.close()
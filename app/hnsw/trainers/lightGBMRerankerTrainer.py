@@ -14,8 +14,8 @@ class LightGBMRerankerTrainer(RerankerTrainer):
             if fb.label == 0:
                 continue
 
-            src = embeddings[fb.source_id]
-            tgt = embeddings[fb.candidate_id]
+            src = embeddings.get(int(fb.source_id))
+            tgt = embeddings.get(int(fb.candidate_id))
 
             if src is None or tgt is None:
                 continue
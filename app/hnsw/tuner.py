@@ -0,0 +1,102 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+from app.models import EmbeddingMatrix
+from app.settings.config import INDEX_RECALL_SAMPLE, TUNE_TARGET_RECALL, TUNE_RECALL_K
+from .hnsw import HNSW
+
+MIN_EF_SEARCH = 16
+MAX_EF_SEARCH = 4096
+
+class SearchParamsTuner:
+    """
+    Подбирает минимальный efSearch (HNSW) или nprobe (IVF), при котором среди k
+    найденных индексом оказывается не меньше target доли точных recall_k ближайших.
+    k — размеры запросов, которые реально делают API и массовые задачи (с перебором).
+    """
+    def __init__(
+        self,
+        index: faiss.Index,
+        matrix: EmbeddingMatrix,
+        target: float = TUNE_TARGET_RECALL,
+        recall_k: int = TUNE_RECALL_K,
+        sample: int = INDEX_RECALL_SAMPLE,
+        logger=None,
+    ):
+        base = HNSW.get_base(index)
+        if isinstance(base, faiss.IndexHNSW):
+            self.param, self.low, self.high = "ef_search", MIN_EF_SEARCH, MAX_EF_SEARCH
+        elif isinstance(base, faiss.IndexIVF):
+            self.param, self.low, self.high = "nprobe", 1, base.nlist
+        else:
+            raise TypeError(f"Неподдерживаемый тип индекса: {type(base).__name__}")
+
+        self.index = index
+        self.target = target
+        self.recall_k = min(recall_k, index.ntotal)
+        self.logger = logger
+
+        rows = np.random.default_rng(2).choice(len(matrix), min(sample, len(matrix)), replace=False)
+        self.queries = matrix.vectors[np.sort(rows)]
+        _, exact_rows = faiss.knn(self.queries, matrix.vectors, self.recall_k, metric=faiss.METRIC_INNER_PRODUCT)
+        self.exact = np.where(exact_rows >= 0, matrix.ids[exact_rows], -1)
+
+    def recall(self, value: int, k: int) -> float:
+        # доля точных recall_k ближайших среди k найденных
+        self._apply(value)
+        _, found = self.index.search(self.queries, max(k, self.recall_k))
+        return HNSW.recall(self.exact, found)
+
+    def latency_ms(self, value: int, k: int) -> float:
+        self._apply(value)
+        latencies = []
+        for i in range(len(self.queries)):
+            started_at = time.perf_counter()
+            self.index.search(self.queries[i:i + 1], k)
+            latencies.append(time.perf_counter() - started_at)
+        return float(np.percentile(latencies, 50)) * 1000
+
+    def tune_k(self, k: int) -> Dict[str, Any]:
+        # recall растёт с параметром: удваиваем до цели, затем делим отрезок пополам
+        low, high = self.low, self.low
+        recall = self.recall(high, k)
+        while recall < self.target and high < self.high:
+            low, high = high, min(high * 2, self.high)
+            recall = self.recall(high, k)
+
+        reached = recall >= self.target
+        while reached and high - low > 1:
+            middle = (low + high) // 2
+            middle_recall = self.recall(middle, k)
+            if middle_recall >= self.target:
+                high, recall = middle, middle_recall
+            else:
+                low = middle
+
+        result = {"k": k, self.param: high, "recall": round(recall, 4), "reached": reached, "p50_ms": round(self.latency_ms(high, k), 3)}
+        if self.logger: self.logger.info(f"k={k}: {self.param}={high}, recall@{self.recall_k}={recall:.4f}{'' if reached else ' (цель не достигнута)'}")
+        return result
+
+    def tune(self, sizes: List[int]) -> Dict[str, Any]:
+        per_k = [self.tune_k(k) for k in sorted(set(sizes))]
+        # параметр общий для индекса: берём достаточный для самого требовательного размера
+        value = max(item[self.param] for item in per_k)
+        self._apply(value)
+        return {
+            self.param: value,
+            "target_recall": self.target,
+            "recall_k": self.recall_k,
+            "queries": len(self.queries),
+            "per_k": per_k,
+            "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def _apply(self, value: int):
+        if self.param == "ef_search":
+            HNSW.apply_search_params(self.index, ef_search=value)
+        else:
+            HNSW.apply_search_params(self.index, nprobe=value)
@@ -1,16 +1,14 @@
 import requests
-from typing import Tuple
 from app.hnsw import HNSW
 from app.model import Model
-from app.models import Book, Feedbacks
+from app.models import Book, EmbeddingMatrix, Feedbacks
 from app.hnsw.trainers import LightGBMRerankerTrainer
-from app.db import db, FeedbackRepository, EmbeddingsRepository, BookRepository
+from app.db import db, FeedbackRepository, BookRepository
 from app.settings.config import LIB_URL, MODEL_NAME
 
 def main():
     with db() as conn:
         sync_feedbacks(conn)
-        embeddings = list[Tuple[int, bytes]](EmbeddingsRepository().get_all(conn))
         feedbacks = Feedbacks(FeedbackRepository.get_all(conn))
         books: list[Book] = [
             Book.map_row(row)
@@ -21,8 +19,7 @@ def main():
         batch_size=10000,
         reranker_trainer=LightGBMRerankerTrainer()
     )
-    hnsw.load_emb(embeddings)
-    hnsw.rebuild_trainer(feedbacks=feedbacks, books=books)
+    hnsw.rebuild_trainer(feedbacks=feedbacks, books=books, embeddings=EmbeddingMatrix.load())
     print(f"Поисковая модель обновлена")
     print(f"Обучение модели {MODEL_NAME}")
 
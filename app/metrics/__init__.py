@@ -0,0 +1,99 @@
+from .registry import Registry, Counter, Gauge, Histogram, REGISTRY
+from .process import memory_usage, peak_rss
+
+ENGINE_LOAD_SECONDS = REGISTRY.histogram(
+    "similar_engine_load_seconds", "Построение резидентного поискового движка (индекс, книги, reranker)",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+INDEX_SEARCH_SECONDS = REGISTRY.histogram(
+    "similar_index_search_seconds", "Вызов index.search на батч запросов",
+)
+INDEX_SEARCH_BATCH_SIZE = REGISTRY.histogram(
+    "similar_index_search_batch_size", "Число запросов в одном index.search",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+FILTER_SECONDS = REGISTRY.histogram(
+    "similar_filter_seconds", "Фильтрация кандидатов (_should_skip) на один запрос",
+)
+RERANK_SECONDS = REGISTRY.histogram(
+    "similar_rerank_seconds", "Переранжирование кандидатов на один запрос",
+)
+FILTERED_CANDIDATES = REGISTRY.counter(
+    "similar_filtered_candidates_total", "Кандидаты, отброшенные фильтрами", labels=("reason",),
+)
+FETCH_K = REGISTRY.histogram(
+    "similar_fetch_k", "Итоговый k запроса к индексу после адаптивного расширения",
+    buckets=(25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+SEARCH_SECONDS = REGISTRY.histogram(
+    "similar_search_seconds", "Полное время поиска похожих книг", labels=("path",),
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "similar_search_queue_wait_seconds", "Ожидание запроса в коалесцере и очереди пула поиска",
+)
+DB_SECONDS = REGISTRY.histogram(
+    "similar_db_seconds", "Запросы к SQLite через AsyncDatabase", labels=("op",),
+)
+RENDER_SECONDS = REGISTRY.histogram(
+    "similar_render_seconds", "Рендеринг шаблона таблицы похожих книг",
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "similar_cache_requests_total", "Обращения к кэшу отрендеренных таблиц", labels=("result",),
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "similar_admission_rejected_total", "Отклонённые поиски (503)", labels=("reason",),
+)
+ADMISSION_PENDING = REGISTRY.gauge(
+    "similar_admission_pending", "Непосчитанные поиски в работе",
+)
+INDEX_LOAD_SECONDS = REGISTRY.histogram(
+    "similar_index_load_seconds", "Чтение файла индекса", labels=("mode",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+ENGINE_RELOADS = REGISTRY.counter(
+    "similar_engine_reloads_total", "Подмены движка после публикации новой версии индекса", labels=("result",),
+)
+SHARD_SEARCH_SECONDS = REGISTRY.histogram(
+    "similar_shard_search_seconds", "Поиск в одном шарде индекса", labels=("shard",),
+)
+SHARD_ERRORS = REGISTRY.counter(
+    "similar_shard_errors_total", "Шард не ответил или вернул ошибку", labels=("shard",),
+)
+PROCESS_ANON_BYTES = REGISTRY.gauge(
+    "process_resident_anon_bytes", "Собственная резидентная память процесса",
+)
+PROCESS_ANON_BYTES.set_function(lambda: memory_usage()["anon"])
+PROCESS_FILE_BYTES = REGISTRY.gauge(
+    "process_resident_file_bytes", "Резидентные страницы файлов, общие между процессами",
+)
+PROCESS_FILE_BYTES.set_function(lambda: memory_usage()["file"])
+
+__all__ = [
+    "Registry",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "REGISTRY",
+    "ENGINE_LOAD_SECONDS",
+    "INDEX_SEARCH_SECONDS",
+    "INDEX_SEARCH_BATCH_SIZE",
+    "FILTER_SECONDS",
+    "RERANK_SECONDS",
+    "FILTERED_CANDIDATES",
+    "FETCH_K",
+    "SEARCH_SECONDS",
+    "QUEUE_WAIT_SECONDS",
+    "DB_SECONDS",
+    "RENDER_SECONDS",
+    "CACHE_REQUESTS",
+    "ADMISSION_REJECTED",
+    "ADMISSION_PENDING",
+    "INDEX_LOAD_SECONDS",
+    "ENGINE_RELOADS",
+    "SHARD_SEARCH_SECONDS",
+    "SHARD_ERRORS",
+    "PROCESS_ANON_BYTES",
+    "PROCESS_FILE_BYTES",
+    "memory_usage",
+    "peak_rss",
+]
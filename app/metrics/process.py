@@ -0,0 +1,25 @@
+import resource
+
+def memory_usage() -> dict[str, int]:
+    """
+    Резидентная память процесса в байтах: anon — собственные страницы процесса,
+    file — страницы файлов (в т.ч. mmap индекса), общие для всех процессов.
+    """
+    usage = {"rss": 0, "anon": 0, "file": 0}
+    keys = {"VmRSS": "rss", "RssAnon": "anon", "RssFile": "file"}
+
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in keys:
+                    usage[keys[name]] = int(value.split()[0]) * 1024
+    except OSError:
+        # не Linux: доступен только пик RSS
+        usage["rss"] = usage["anon"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return usage
+
+def peak_rss() -> int:
+    # максимум RSS за жизнь процесса (Linux отдаёт ru_maxrss в килобайтах)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -1,7 +1,8 @@
 from .book import Book, BookRegistry
 from .task import Task, TaskRegistry
 from .feedback import FeedbackReq, Feedback, Feedbacks
-from .similar import Similar
-from .embedding import Embedding
+from .similar import Similar, SimilarBatchReq
+from .embedding import Embedding, EmbeddingMatrix
+from .tombstones import Tombstones
 
-__all__ = ["Book", "BookRegistry", "Task", "TaskRegistry", "FeedbackReq", "Feedback", "Feedbacks", "Similar", "Embedding"]
\ No newline at end of file
+__all__ = ["Book", "BookRegistry", "Task", "TaskRegistry", "FeedbackReq", "Feedback", "Feedbacks", "Similar", "SimilarBatchReq", "Embedding", "EmbeddingMatrix", "Tombstones"]
\ No newline at end of file
@@ -1,10 +1,15 @@
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+from app.db import db, EmbeddingsRepository, VectorStore, VectorStoreOutOfSync
+from app.settings.config import EMBEDDINGS_LOAD_WORKERS, VECTOR_STORE_ENABLED
 
 class Embedding:
     __slots__ = ("vec",)
 
     def __init__(self, vec: np.ndarray):
-        self.vec = vec.astype(np.float32)
+        # без копии, если вектор уже float32 (например, строка EmbeddingMatrix)
+        self.vec = np.asarray(vec, dtype=np.float32)
 
     @classmethod
     def from_db(cls, blob: bytes) -> "Embedding":
@@ -24,3 +29,139 @@ class Embedding:
         else:
             vec = self.vec / norm
         return vec.tobytes()
+
+class EmbeddingMatrix:
+    """
+    Векторы таблицы embeddings одной непрерывной матрицей float32: строка i — книга ids[i].
+    Нулевые векторы в матрицу не попадают, их id — в skipped_ids.
+    """
+    __slots__ = ("ids", "vectors", "skipped_ids", "_order")
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, skipped_ids: Iterable[int] = ()):
+        self.ids = ids
+        self.vectors = vectors
+        self.skipped_ids: List[int] = list(skipped_ids)
+        self._order: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    def row(self, book_id: int) -> int | None:
+        if self._order is None:
+            # загрузка идёт по возрастанию book_id, тогда сортировка не нужна
+            self._order = np.arange(len(self.ids)) if np.all(self.ids[:-1] < self.ids[1:]) else np.argsort(self.ids)
+
+        position = np.searchsorted(self.ids, book_id, sorter=self._order)
+        if position < len(self.ids) and self.ids[self._order[position]] == book_id:
+            return int(self._order[position])
+        return None
+
+    def get(self, book_id: int) -> np.ndarray | None:
+        row = self.row(book_id)
+        return None if row is None else self.vectors[row]
+
+    @classmethod
+    def from_vectors(cls, ids: np.ndarray, vectors: np.ndarray) -> "EmbeddingMatrix":
+        return cls(*cls.normalize(ids, vectors))
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[int, bytes]], dim: int | None = None) -> "EmbeddingMatrix":
+        if not rows:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, dim or 0), dtype=np.float32))
+
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+        vectors = vectors.reshape(len(rows), dim or vectors.size // len(rows)).copy()
+        return cls(*cls.normalize(ids, vectors))
+
+    @classmethod
+    def load(cls, workers: int = EMBEDDINGS_LOAD_WORKERS, logger=None) -> "EmbeddingMatrix":
+        """
+        Читает всю таблицу embeddings в заранее выделенную матрицу. Если хранилище
+        векторов (VectorStore) совпадает с базой — из его файлов, без SQLite. Иначе
+        диапазон book_id делится на workers частей, каждая читается своим соединением
+        в своём потоке (sqlite3 отпускает GIL на время выполнения запроса).
+        """
+        if VECTOR_STORE_ENABLED:
+            matrix = cls.from_store(VectorStore(), logger=logger)
+            if matrix is not None:
+                return matrix
+
+        repository = EmbeddingsRepository()
+        with db() as conn:
+            count, min_id, max_id = repository.stats(conn)
+            first = repository.get(conn, min_id) if count else None
+
+        if not count:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+
+        dim = len(first) // np.dtype(np.float32).itemsize
+        bounds = np.linspace(min_id, max_id + 1, max(1, workers) + 1).astype(np.int64)
+        ranges = [(int(start), int(end)) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+        with ThreadPoolExecutor(len(ranges)) as pool:
+            counts = list(pool.map(lambda r: cls._count_range(*r), ranges))
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+            ids = np.empty(offsets[-1], dtype=np.int64)
+            vectors = np.empty((offsets[-1], dim), dtype=np.float32)
+            filled = list(pool.map(
+                lambda i: cls._read_range(ranges[i], counts[i], ids[offsets[i]:offsets[i + 1]], vectors[offsets[i]:offsets[i + 1]]),
+                range(len(ranges)),
+            ))
+
+        if filled != counts:
+            # строки удалили между подсчётом и чтением: убираем недозаполненные хвосты
+            keep = np.concatenate([np.arange(offset, offset + size) for offset, size in zip(offsets, filled)])
+            ids, vectors = ids[keep], vectors[keep]
+
+        return cls(*cls.normalize(ids, vectors))
+
+    @classmethod
+    def from_store(cls, store: VectorStore, where: Tuple[str, tuple] | None = None, logger=None) -> "EmbeddingMatrix | None":
+        # из базы читаются только id и версии векторов: по ним проверяется, что хранилище не отстало
+        if not store.exists():
+            return None
+
+        with db() as conn:
+            book_ids, versions = VectorStore.split_versions(EmbeddingsRepository().get_versions(conn, *([where] if where else [])))
+        try:
+            ids, vectors = store.load(book_ids, versions)
+        except VectorStoreOutOfSync as e:
+            if logger: logger.warning(f"Хранилище векторов не совпадает с базой, читаем из SQLite: {e}")
+            return None
+
+        return cls.from_vectors(ids, vectors)
+
+    @staticmethod
+    def _count_range(start: int, end: int) -> int:
+        with db() as conn:
+            return EmbeddingsRepository().count_range(conn, start, end)
+
+    @staticmethod
+    def _read_range(bounds: Tuple[int, int], limit: int, ids: np.ndarray, vectors: np.ndarray) -> int:
+        position = 0
+        with db() as conn:
+            for rows in EmbeddingsRepository().get_range(conn, *bounds, limit):
+                end = position + len(rows)
+                ids[position:end] = [row[0] for row in rows]
+                vectors[position:end] = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+                position = end
+        return position
+
+    @staticmethod
+    def normalize(ids: np.ndarray, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        # to_db уже пишет нормированные векторы: делим только строки с заметно отличной от 1 нормой
+        norms = np.linalg.norm(vectors, axis=1)
+        valid = norms >= 1e-9
+        denormalized = valid & (np.abs(norms - 1.0) > 1e-4)
+        if denormalized.any():
+            vectors[denormalized] /= norms[denormalized, None]
+
+        if valid.all():
+            return ids, vectors, []
+        return ids[valid], np.ascontiguousarray(vectors[valid]), ids[~valid].tolist()
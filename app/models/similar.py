@@ -1,8 +1,14 @@
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from pydantic import BaseModel, Field
+from typing import Any, Optional, List, Tuple
 from app.models.book import Book
 from app.db import db, BookRepository
 
+class SimilarBatchReq(BaseModel):
+    files: List[str] = Field(..., min_length=1, max_length=200)
+    limit: int = Field(50, ge=1, le=100)
+    exclude_same_author: bool = False
+
 @dataclass(frozen=True, slots=True)
 class Similar:
     score: float
@@ -42,19 +48,21 @@ class Similar:
     @classmethod
     def to_similar_list(
         cls,
-        rows: List[Tuple[float, int, int]]
+        rows: List[Tuple[float, int, int]],
+        books_by_id: Optional[dict[int, Book]] = None,
     ) -> List["Similar"]:
         if not rows:
             return []
 
-        book_ids: set[int] = set[int]()
-        for _, source_id, candidate_id in rows:
-            book_ids.add(source_id)
-            book_ids.add(candidate_id)
+        if books_by_id is None:
+            book_ids: set[int] = set[int]()
+            for _, source_id, candidate_id in rows:
+                book_ids.add(source_id)
+                book_ids.add(candidate_id)
 
-        with db() as conn:
-            raw_books = BookRepository().get_many(conn, list[int](book_ids))
-            books_by_id = Book.map_by_id(raw_books, Book.map)
+            with db() as conn:
+                raw_books = BookRepository().get_many(conn, list[int](book_ids))
+                books_by_id = Book.map_by_id(raw_books, Book.map)
 
         result: List[Similar] = []
         for score, source_id, candidate_id in rows:
@@ -70,6 +78,26 @@ class Similar:
 
         return result
 
+    @classmethod
+    def to_rows(
+        cls,
+        base_book: Book,
+        rows: List[Tuple[float, int, int]],
+        feedbacks,
+        books_by_id: Optional[dict[int, Book]] = None,
+    ) -> List[dict[str, Any]]:
+        return [
+            {
+                "file_name": s.candidate.file_name,
+                "score": s.score,
+                "title": s.candidate.title,
+                "authors": s.candidate.authors,
+                "rating": feedbacks.get_rating(base_book.id, s.candidate.id),
+            }
+            for s in cls.to_similar_list(rows, books_by_id)
+            if s.candidate is not None
+        ]
+
     def __str__(self):
         return f"{self.score:.3f} — {self.book_id} → {self.similar_book_id}"
 
@@ -2,12 +2,13 @@ import asyncio
 from dataclasses import dataclass
 from typing import Optional, List, Tuple
 from .book import Book
+from .embedding import Embedding
 
 @dataclass
 class Task:
     name: str
     book: Optional[Book] = None
-    embedding: Optional[bytes] = None
+    embedding: Optional[Embedding] = None
 
 class TaskRegistry:
     def __init__(self):
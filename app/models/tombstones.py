@@ -0,0 +1,33 @@
+from typing import Iterable
+from app.db import db, TombstoneRepository
+
+class Tombstones:
+    """
+    Набор id удалённых книг для фильтрации выдачи. Один объект общий для всех
+    копий движка: refresh подменяет набор целиком, без перестроения индекса.
+    """
+    def __init__(self, ids: Iterable[int] = ()):
+        self.ids: frozenset[int] = frozenset(int(book_id) for book_id in ids)
+
+    def __contains__(self, book_id: int) -> bool:
+        return book_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def version(self) -> int:
+        # записи только добавляются, поэтому количества достаточно
+        return len(self.ids)
+
+    def refresh(self) -> bool:
+        with db() as conn:
+            if TombstoneRepository().count(conn) == len(self.ids):
+                return False
+            self.ids = frozenset(TombstoneRepository().get_ids(conn))
+        return True
+
+    @classmethod
+    def load(cls) -> "Tombstones":
+        with db() as conn:
+            return cls(TombstoneRepository().get_ids(conn))
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator
+from typing import AbstractSet, AsyncGenerator
 from app.models import Book
 
 class BaseBookSearchEngine(ABC):
+    # уже обработанные файлы, которые источник пометил удалёнными (заполняется search_books)
+    deleted_books: AbstractSet[str] = frozenset()
+
     @abstractmethod
     async def search_books(self) -> AsyncGenerator[Book, None]:
         pass
\ No newline at end of file
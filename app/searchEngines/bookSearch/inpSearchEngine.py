@@ -10,6 +10,7 @@ from .bookSearchEngine import BaseBookSearchEngine
 class InpBookSearchEngine(BaseBookSearchEngine):
     def __init__(self, folder: str):
         self.folder = folder
+        self.deleted_books: set[str] = set()
 
     def _load_completed_books(self) -> set[str]:
         with db() as conn:
@@ -64,10 +65,15 @@ class InpBookSearchEngine(BaseBookSearchEngine):
         return authors
 
     def _should_skip(self, book) -> bool:
+        file_name = f"{book["file"]}.{book["ext"]}"
+        if book["deleted"] and file_name in self._completed_books:
+            # книга уже в индексе: её нужно убрать из выдачи
+            self.deleted_books.add(file_name)
+
         if book["lang"] != "ru" or book["deleted"] or book["file"] == "":
             return True
             
-        if f"{book["file"]}.{book["ext"]}" in self._completed_books:
+        if file_name in self._completed_books:
             return True
 
         return False
@@ -1,5 +1,5 @@
 from .similarSearchEngineFactory import SimilarSearchEngineFactory
-from .similarSearchEngine import SimilarSearchEngine
+from .similarSearchEngine import SimilarSearchEngine, SearchCancelled
 
-__all__ = ["SimilarSearchEngineFactory", "SimilarSearchEngine"]
+__all__ = ["SimilarSearchEngineFactory", "SimilarSearchEngine", "SearchCancelled"]
 
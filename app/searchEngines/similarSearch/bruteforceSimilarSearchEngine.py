@@ -1,6 +1,6 @@
 import numpy as np
 from typing import List, Tuple
-from app.models import Book, Embedding
+from app.models import Book, Embedding, EmbeddingMatrix, Tombstones
 from app.hnsw.rerankers import Reranker
 from app.db import db, BookRepository
 from .similarSearchEngine import SimilarSearchEngine
@@ -12,10 +12,31 @@ class BruteforceSimilarSearchEngine(SimilarSearchEngine):
         exclude_same_authors: bool = False,
         step_percent: int = 5,
         reranker: Reranker = None,
+        data: tuple[EmbeddingMatrix, dict[int, Book]] | None = None,
     ):
         super().__init__(exclude_same_authors, reranker)
         self._limit = limit
         self._step_percent = step_percent
+        self._data = data
+
+    def configure(self, limit: int, exclude_same_authors: bool = False) -> "BruteforceSimilarSearchEngine":
+        return BruteforceSimilarSearchEngine(
+            limit=limit,
+            exclude_same_authors=exclude_same_authors,
+            step_percent=self._step_percent,
+            reranker=self._reranker,
+            data=self._load(),
+        )
+
+    def _load(self) -> tuple[EmbeddingMatrix, dict[int, Book]]:
+        # матрица векторов и каталог читаются один раз и переиспользуются между запросами
+        if self._data is None:
+            # удалённые книги не попадают в каталог и потому не становятся кандидатами
+            tombstones = Tombstones.load()
+            with db() as conn:
+                books = {row[0]: Book.map_row(row) for row in BookRepository().get_all(conn) if row[0] not in tombstones}
+            self._data = (EmbeddingMatrix.load(), books)
+        return self._data
 
     def search(
         self,
@@ -23,39 +44,36 @@ class BruteforceSimilarSearchEngine(SimilarSearchEngine):
         embedding: Embedding,
         progress_callback=None
     ) -> List[Tuple[float, int, int]]:
-        with db() as conn:
-            candidates = []
-            seen_books: set[tuple[str, tuple[str, ...]]] = set()
-            current = 0
-            total = BookRepository.count_embeddings(conn)
-            step = max(1, total * self._step_percent // 100)
-
-            for row in BookRepository().get_all_with_embeddings(conn):
-                current += 1
-
-                book_id, _, book, title, _, embedding_bytes = row
+        matrix, books = self._load()
+        total = len(matrix)
+        step = max(1, total * self._step_percent // 100)
+        scores = np.empty(total, dtype=np.float32)
 
-                if self._should_skip(
-                    source=source,
-                    candidate_name=book,
-                    candidate_title=title,
-                    seen=seen_books
-                ):
-                    continue
+        for start in range(0, total, step):
+            end = min(start + step, total)
+            scores[start:end] = matrix.vectors[start:end] @ embedding.vec
 
-                try:
-                    emb_norm = Embedding.from_db(embedding_bytes)
-                    score = np.dot(emb_norm.vec, embedding.vec)
+            if progress_callback and end < total:
+                progress_callback(min(99, end * 100 // total))
 
-                    candidates.append((score, book_id))
+        candidates = []
+        seen_books: set[tuple[str, tuple[str, ...]]] = set()
 
-                except Exception:
-                    continue
+        # как и раньше, дубликаты отсекаются в порядке book_id
+        for book_id, score in zip(matrix.ids.tolist(), scores.tolist()):
+            book = books.get(book_id)
+            if book is None:
+                continue
 
-                if progress_callback and current % step == 0:
-                    percent = min(99, current * 100 // total)
-                    progress_callback(percent)
+            if self._should_skip(
+                source=source,
+                candidate_name=book.file_name,
+                candidate_title=book.title,
+                seen=seen_books
+            ):
+                continue
 
+            candidates.append((score, book_id))
 
         reranked = self._rerank(candidates=candidates,)
         top = reranked[: self._limit]
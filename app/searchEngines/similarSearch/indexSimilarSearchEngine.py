@@ -1,68 +1,163 @@
+import time
 import numpy as np
-from typing import List, Sequence, Tuple
-from app.models import Book, Embedding
+from collections import Counter
+from typing import Callable, List, Mapping, Sequence, Tuple
+from app.models import Book, Embedding, Tombstones
 from app.hnsw.rerankers import Reranker
-from .similarSearchEngine import SimilarSearchEngine
+from app.metrics import INDEX_SEARCH_SECONDS, INDEX_SEARCH_BATCH_SIZE, FILTER_SECONDS, RERANK_SECONDS, FILTERED_CANDIDATES, FETCH_K
+from app.settings.config import SEARCH_OVERFETCH_FACTOR, SEARCH_OVERFETCH_MIN
+from .similarSearchEngine import SimilarSearchEngine, SearchCancelled
+
+CANCEL_CHECK_EVERY = 256
+OVERFETCH_GROWTH = 4
+
+# (движок, книга, вектор, should_stop, progress_callback) — одна строка батча
+SearchRow = Tuple["IndexSimilarSearchEngine", Book, Embedding, Callable[[], bool] | None, Callable[[int], None] | None]
 
 class IndexSimilarSearchEngine(SimilarSearchEngine):
     def __init__(
         self,
         index,
-        books: Sequence[Book],
+        books: Mapping[int, Book] | Sequence[Book],
         limit: int,
         reranker: Reranker = None,
         exclude_same_authors: bool = False,
         step_percent: int = 5,
         logger = None,
+        version: str | None = None,
+        tombstones: Tombstones | None = None,
     ):
         super().__init__(exclude_same_authors, reranker)
         self.index = index
-        self.books = list[Book](books)
+        # метка индекса -> книга; последовательность трактуется как позиционные метки
+        self.books = books if isinstance(books, Mapping) else dict(enumerate(books))
         self._limit = limit
         self.reranker = reranker
         self._step_percent = step_percent
         self.logger = logger
-        
-    def search(
+        self.version = version
+        # удалённые книги отсекаются при поиске, пока компактизация не уберёт их из индекса
+        self.tombstones = tombstones if tombstones is not None else Tombstones()
+
+    def configure(self, limit: int, exclude_same_authors: bool = False) -> "IndexSimilarSearchEngine":
+        # дешёвая копия с параметрами запроса: индекс, книги и reranker общие
+        return IndexSimilarSearchEngine(
+            index=self.index,
+            books=self.books,
+            limit=limit,
+            reranker=self.reranker,
+            exclude_same_authors=exclude_same_authors,
+            step_percent=self._step_percent,
+            logger=self.logger,
+            version=self.version,
+            tombstones=self.tombstones,
+        )
+
+    def close(self):
+        # у faiss-индекса закрывать нечего, у ShardedIndex — пул потоков и соединения
+        close = getattr(self.index, "close", None)
+        if close is not None:
+            close()
+
+    def is_empty(self) -> bool:
+        return self.index is None or self.index.ntotal == 0
+
+    def fetch_k(self) -> int:
+        return self.fetch_k_for(self._limit, self.index.ntotal)
+
+    def max_k(self) -> int:
+        return self.max_k_for(self._limit, self.index.ntotal)
+
+    @staticmethod
+    def fetch_k_for(limit: int, ntotal: int) -> int:
+        # обычно фильтры отсекают немного, поэтому начинаем с небольшого k
+        return min(int(limit * SEARCH_OVERFETCH_FACTOR) + SEARCH_OVERFETCH_MIN, IndexSimilarSearchEngine.max_k_for(limit, ntotal))
+
+    @staticmethod
+    def max_k_for(limit: int, ntotal: int) -> int:
+        return min(limit * 20 + 200, ntotal)
+
+    def widen(self, k: int, candidates: List[Tuple[float, Book]]) -> int | None:
+        # следующий k, если после фильтров не набрался limit и есть куда расширяться
+        if len(candidates) >= self._limit or k >= self.max_k():
+            return None
+        return min(k * OVERFETCH_GROWTH, self.max_k())
+
+    def query(self, embeddings: Sequence[Embedding], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.vstack([embedding.vec for embedding in embeddings]).astype(np.float32)
+        INDEX_SEARCH_BATCH_SIZE.observe(len(queries))
+        with INDEX_SEARCH_SECONDS.time():
+            return self.index.search(queries, k)
+
+    def filter(
         self,
         source: Book,
-        embedding: Embedding,
-        progress_callback=None
-    ) -> List[Tuple[float, int, int]]:
+        scores: np.ndarray,
+        indices: np.ndarray,
+        progress_callback=None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> Tuple[List[Tuple[float, Book]], Counter[str]]:
+        """
+        Кандидаты после фильтров и число отброшенных по причинам. Отброшенные
+        не попадают в метрику сразу: при расширении k тот же префикс фильтруется
+        заново, поэтому считается только последний проход (record_skipped).
+        """
         seen_books: set[tuple[str, tuple[str, ...]]] = set()
-        if self.index is None or self.index.ntotal == 0:
-            return []
-
-        step = max(1, self.index.ntotal * self._step_percent // 100)
-
-        query = embedding.vec.reshape(1, -1).astype(np.float32)
-        k = min(self._limit * 20 + 200, self.index.ntotal)
-        scores, indices = self.index.search(query, k)
+        step = max(1, len(scores) * self._step_percent // 100)
+        skipped: Counter[str] = Counter()
 
         candidates: List[Tuple[float, Book]] = []
+        started_at = time.perf_counter()
+
+        for position, (score_raw, idx) in enumerate(zip(scores, indices)):
+            if should_stop and position % CANCEL_CHECK_EVERY == 0 and should_stop():
+                raise SearchCancelled()
 
-        for score_raw, idx in zip(scores[0], indices[0]):
-            if idx == -1 or idx < 0 or idx >= len(self.books):
+            if int(idx) in self.tombstones:
+                skipped[self.SKIP_DELETED] += 1
                 continue
 
-            candidate = self.books[idx]
+            candidate = self.books.get(int(idx))
+            if candidate is None:
+                skipped[self.SKIP_INVALID] += 1
+                continue
 
-            if self._should_skip(
+            reason = self._skip_reason(
                 source=source,
                 candidate_name=candidate.file_name,
                 candidate_title=candidate.title,
                 candidate_authors=candidate.authors,
                 seen=seen_books
-            ):
+            )
+            if reason is not None:
+                skipped[reason] += 1
                 continue
 
             candidates.append((score_raw, candidate))
 
-            if progress_callback and idx % step == 0:
-                percent = min(99, idx * 100 // self.index.ntotal)
+            if progress_callback and position % step == 0:
+                percent = min(99, position * 100 // len(scores))
                 progress_callback(percent)
 
-        reranked = self._rerank(candidates=candidates)
+        FILTER_SECONDS.observe(time.perf_counter() - started_at)
+        return candidates, skipped
+
+    @staticmethod
+    def record_skipped(skipped: Counter[str]):
+        for reason, count in skipped.items():
+            FILTERED_CANDIDATES.inc(count, reason=reason)
+
+    def finish(
+        self,
+        source: Book,
+        candidates: List[Tuple[float, Book]],
+        should_stop: Callable[[], bool] | None = None,
+    ) -> List[Tuple[float, int, int]]:
+        if should_stop and should_stop():
+            raise SearchCancelled()
+
+        with RERANK_SECONDS.time():
+            reranked = self._rerank(candidates=candidates)
         top = reranked[: self._limit]
 
         if not top:
@@ -74,3 +169,107 @@ class IndexSimilarSearchEngine(SimilarSearchEngine):
 
         return result
 
+    def collect(
+        self,
+        source: Book,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        progress_callback=None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> List[Tuple[float, int, int]]:
+        candidates, skipped = self.filter(source, scores, indices, progress_callback, should_stop)
+        self.record_skipped(skipped)
+        return self.finish(source, candidates, should_stop)
+
+    def search(
+        self,
+        source: Book,
+        embedding: Embedding,
+        progress_callback=None
+    ) -> List[Tuple[float, int, int]]:
+        if self.is_empty() or embedding is None:
+            return []
+
+        k = self.fetch_k()
+        while True:
+            scores, indices = self.query([embedding], k)
+            candidates, skipped = self.filter(source, scores[0], indices[0], progress_callback)
+
+            wider = self.widen(k, candidates)
+            if wider is None:
+                break
+            k = wider
+
+        FETCH_K.observe(k)
+        self.record_skipped(skipped)
+        return self.finish(source, candidates)
+
+    def search_many(
+        self,
+        sources: Sequence[Book],
+        embeddings: Sequence[Embedding],
+    ) -> List[List[Tuple[float, int, int]]]:
+        if self.is_empty() or not sources:
+            return [[] for _ in sources]
+
+        results = self.search_batch([(self, source, embedding, None, None) for source, embedding in zip(sources, embeddings)])
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    @staticmethod
+    def search_batch(
+        rows: Sequence[SearchRow],
+    ) -> List[List[Tuple[float, int, int]] | Exception]:
+        """
+        Поиск для строк (движок, книга, вектор, should_stop, progress_callback) общими index.search.
+        k берётся по самой «жадной» строке, каждой строке отдаётся только её k;
+        строки, которым после фильтров не хватило кандидатов, ищутся повторно с большим k.
+        """
+        results: List[List[Tuple[float, int, int]] | Exception] = [[] for _ in rows]
+        if not rows:
+            return results
+
+        # после подмены движка в одном батче могут оказаться строки старого и нового индекса
+        groups: dict[int, List[int]] = {}
+        for row, (engine, *_) in enumerate(rows):
+            groups.setdefault(id(engine.index), []).append(row)
+        if len(groups) > 1:
+            for group in groups.values():
+                for row, result in zip(group, IndexSimilarSearchEngine.search_batch([rows[row] for row in group])):
+                    results[row] = result
+            return results
+
+        lead = rows[0][0]
+        if lead.is_empty():
+            return results
+
+        # у книги без вектора (или с нулевым) соседей нет; в матрицу запроса она не попадает
+        pending = {row: engine.fetch_k() for row, (engine, _, embedding, *_) in enumerate(rows) if embedding is not None}
+        while pending:
+            try:
+                scores, indices = lead.query([rows[row][2] for row in pending], max(pending.values()))
+            except Exception as e:
+                for row in pending:
+                    results[row] = e
+                break
+
+            wider: dict[int, int] = {}
+            for position, (row, k) in enumerate(pending.items()):
+                engine, source, _, should_stop, progress_callback = rows[row]
+                try:
+                    candidates, skipped = engine.filter(source, scores[position][:k], indices[position][:k], progress_callback, should_stop)
+                    next_k = engine.widen(k, candidates)
+                    if next_k is not None:
+                        wider[row] = next_k
+                        continue
+
+                    FETCH_K.observe(k)
+                    engine.record_skipped(skipped)
+                    results[row] = engine.finish(source, candidates, should_stop)
+                except Exception as e:
+                    results[row] = e
+            pending = wider
+
+        return results
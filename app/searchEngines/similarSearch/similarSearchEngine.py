@@ -3,11 +3,20 @@ from typing import List, Tuple
 from app.hnsw.rerankers import Reranker
 from app.models import Book, Embedding
 
+class SearchCancelled(Exception):
+    pass
+
 class SimilarSearchEngine:
     def __init__(self, exclude_same_authors: bool, reranker: Reranker = None):
         self._exclude_same_authors = exclude_same_authors
         self._reranker = reranker
 
+    SKIP_SAME_FILE = "same_file"
+    SKIP_SAME_TITLE = "same_title"
+    SKIP_DUPLICATE = "duplicate"
+    SKIP_INVALID = "invalid"
+    SKIP_DELETED = "deleted"
+
     def _should_skip(
             self,
             source: Book,
@@ -16,11 +25,21 @@ class SimilarSearchEngine:
             seen: set[tuple[str, tuple[str, ...]]],
             candidate_authors: list[str] = None,
         ) -> bool:
+        return self._skip_reason(source, candidate_name, candidate_title, seen, candidate_authors) is not None
+
+    def _skip_reason(
+            self,
+            source: Book,
+            candidate_name: str,
+            candidate_title: str,
+            seen: set[tuple[str, tuple[str, ...]]],
+            candidate_authors: list[str] = None,
+        ) -> str | None:
         if source.file_name is not None and source.file_name == candidate_name:
-            return True
+            return self.SKIP_SAME_FILE
 
         if source.title is not None and source.title == candidate_title:
-            return True
+            return self.SKIP_SAME_TITLE
 
         key = (
             candidate_title,
@@ -28,11 +47,11 @@ class SimilarSearchEngine:
         )
 
         if key in seen:
-            return True
+            return self.SKIP_DUPLICATE
         
         seen.add(key)
 
-        return False
+        return None
 
     def _rerank(
         self,
@@ -66,7 +85,14 @@ class SimilarSearchEngine:
         reranked.sort(key=lambda x: x[0], reverse=True)
         return reranked
 
-    
+
+    def configure(self, limit: int, exclude_same_authors: bool = False) -> "SimilarSearchEngine":
+        raise NotImplementedError()
+
+    def close(self):
+        # освобождает ресурсы движка после его замены новой версией
+        pass
+
     def search(
         self,
         source: Book,
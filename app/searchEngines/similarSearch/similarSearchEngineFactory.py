@@ -1,8 +1,10 @@
+import numpy as np
 from typing import Literal
-from app.hnsw import HNSW
+from app.hnsw import HNSW, IndexOutOfSync, ShardedIndex
 from app.hnsw.rerankers import LightGBMReranker
 from app.db import db, BookRepository
-from app.models import Book
+from app.models import Book, Tombstones
+from app.settings.config import INDEX_SHARDS
 from .similarSearchEngine import SimilarSearchEngine
 from .indexSimilarSearchEngine import IndexSimilarSearchEngine
 from .bruteforceSimilarSearchEngine import BruteforceSimilarSearchEngine
@@ -22,22 +24,26 @@ class SimilarSearchEngineFactory:
         step_percent: int = 5,
     ) -> SimilarSearchEngine:
         if mode == SimilarSearchEngineFactory.INDEX:
-            hnsw = HNSW()
-            index = hnsw.load_from_file()
+            if INDEX_SHARDS > 1:
+                # шарды ищутся параллельно и сливаются, для движка это один индекс
+                index = ShardedIndex.open()
+                version = index.version()
+            else:
+                hnsw = HNSW()
+                index = hnsw.load_from_file()
+                version = hnsw.loaded_version
 
-            with db() as conn:
-                books: list[Book] = [
-                    Book.map_row(row)
-                    for row in BookRepository().get_all_with_embeddings(conn)
-                ]
+            books_by_label = cls._load_books(index)
 
             return IndexSimilarSearchEngine(
                 reranker=LightGBMReranker(),
                 index=index,
-                books=books,
+                books=books_by_label,
                 limit=limit,
                 exclude_same_authors=exclude_same_authors,
                 step_percent=step_percent,
+                version=version,
+                tombstones=Tombstones.load(),
             )
 
         elif mode == SimilarSearchEngineFactory.BRUTEFORCE:
@@ -48,4 +54,33 @@ class SimilarSearchEngineFactory:
                 step_percent=step_percent,
             )
 
-        raise ValueError(f"Unknown mode: {mode}")
\ No newline at end of file
+        raise ValueError(f"Unknown mode: {mode}")
+
+    @staticmethod
+    def current_version(index) -> str:
+        # опубликованная версия без загрузки индекса: сравнивается с версией работающего движка
+        if isinstance(index, ShardedIndex):
+            return index.current_version()
+        return HNSW().version()
+
+    @staticmethod
+    def _load_books(index) -> dict[int, Book]:
+        sharded = isinstance(index, ShardedIndex)
+        with db() as conn:
+            if not sharded and not HNSW.is_id_mapped(index):
+                # старый индекс возвращает позицию строки в порядке books.id на момент сборки
+                books = [Book.map_row(row) for row in BookRepository().get_all_with_embeddings(conn)]
+                if len(books) != index.ntotal:
+                    raise IndexOutOfSync(
+                        f"Позиционный индекс на {index.ntotal:,} векторов не совпадает с базой ({len(books):,} книг), нужно перестроение"
+                    )
+                return dict(enumerate(books))
+
+            # IDMap-индекс возвращает books.id: каталог читается без сортировки и join с embeddings
+            books = {row[0]: Book.map_row(row) for row in BookRepository().get_all(conn)}
+
+        labels = index.get_ids() if sharded else HNSW.get_ids(index)
+        missing = np.count_nonzero(~np.isin(labels, np.fromiter(books, dtype=np.int64, count=len(books))))
+        if missing:
+            raise IndexOutOfSync(f"{missing:,} меток индекса нет в таблице books: индекс собран для другой базы")
+        return books
\ No newline at end of file
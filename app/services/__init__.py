@@ -1,5 +1,10 @@
 from .similar_search_service import SimilarSearchService
 from .bulk_similar_search_service import BulkSimilarSearchService
+from .search_coalescer import SearchCoalescer
+from .admission import AdmissionController, AdmissionRejected
+from .similar_cache import SimilarCache
 from .similarity import TaskState, Similarity
+from .warmup import Warmup
+from .view_counter import ViewCounter
 
-__all__ = ["SimilarSearchService", "BulkSimilarSearchService", "TaskState", "Similarity",]
\ No newline at end of file
+__all__ = ["SimilarSearchService", "BulkSimilarSearchService", "SearchCoalescer", "AdmissionController", "AdmissionRejected", "SimilarCache", "TaskState", "Similarity", "Warmup", "ViewCounter",]
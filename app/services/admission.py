@@ -0,0 +1,70 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+from app.metrics import ADMISSION_REJECTED
+from app.settings.config import SEARCH_QUEUE_MAX, SEARCH_PER_CLIENT_MAX, SEARCH_RETRY_AFTER_SECONDS
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Сервер перегружен ({reason}), повторите через {retry_after} сек")
+        self.reason = reason
+        self.retry_after = retry_after
+
+@dataclass(frozen=True)
+class AdmissionTicket:
+    client_id: str
+    cost: int = 1
+
+class AdmissionController:
+    """
+    Ограничивает число непосчитанных поисков: общий лимит очереди и лимит на клиента.
+    Пакетный запрос стоит столько поисков, сколько книг он считает, но не больше
+    лимита клиента — иначе его никогда бы не приняли.
+    Живёт в event loop, поэтому обходится без блокировок.
+    """
+    def __init__(
+        self,
+        max_pending: int = SEARCH_QUEUE_MAX,
+        per_client: int = SEARCH_PER_CLIENT_MAX,
+        retry_after: int = SEARCH_RETRY_AFTER_SECONDS,
+    ):
+        self.max_pending = max(1, max_pending)
+        self.per_client = max(1, per_client)
+        self.retry_after = retry_after
+        self.pending = 0
+        self.accepted = 0
+        self.rejected: Counter[str] = Counter()
+        self._per_client: Counter[str] = Counter()
+
+    def acquire(self, client_id: str, cost: int = 1) -> AdmissionTicket:
+        cost = max(1, min(cost, self.per_client, self.max_pending))
+        if self.pending + cost > self.max_pending:
+            self._reject("queue_full")
+        if self._per_client[client_id] + cost > self.per_client:
+            self._reject("client_limit")
+
+        self.pending += cost
+        self.accepted += 1
+        self._per_client[client_id] += cost
+        return AdmissionTicket(client_id, cost)
+
+    def release(self, ticket: AdmissionTicket):
+        self.pending -= ticket.cost
+        self._per_client[ticket.client_id] -= ticket.cost
+        if self._per_client[ticket.client_id] <= 0:
+            del self._per_client[ticket.client_id]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "per_client": self.per_client,
+            "clients": len(self._per_client),
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+        }
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTED.inc(reason=reason)
+        raise AdmissionRejected(reason, self.retry_after)
@@ -1,5 +1,5 @@
 from typing import List, Tuple
-from app.models import Book, Embedding
+from app.models import Book, Embedding, EmbeddingMatrix
 from app.searchEngines.similarSearch import SimilarSearchEngine
 
 class BulkSimilarSearchService:
@@ -7,7 +7,7 @@ class BulkSimilarSearchService:
         self,
         engine: SimilarSearchEngine,
         books: List[Book],
-        embeddings: List[Tuple[int, bytes]],
+        embeddings: EmbeddingMatrix,
         logger = None, 
     ):
         self.engine = engine
@@ -15,11 +15,10 @@ class BulkSimilarSearchService:
         self.embeddings = embeddings
         self.logger = logger
 
-    def run(self, source_book: Book, source_embedding: bytes) -> List[Tuple[float, int, int]]:
-        query_emb = Embedding.from_db(source_embedding)
+    def run(self, source_book: Book, source_embedding: Embedding) -> List[Tuple[float, int, int]]:
         similars = self.engine.search(
             source=source_book, 
-            embedding=query_emb
+            embedding=source_embedding
         )
 
         return similars
\ No newline at end of file
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Callable, List, Tuple
+from app.metrics import QUEUE_WAIT_SECONDS
+from app.models import Book, Embedding
+from app.searchEngines.similarSearch import SearchCancelled
+from app.searchEngines.similarSearch.indexSimilarSearchEngine import IndexSimilarSearchEngine
+from app.settings.config import SEARCH_BATCH_MAX_SIZE, SEARCH_BATCH_MAX_WAIT_MS
+
+@dataclass
+class PendingSearch:
+    engine: IndexSimilarSearchEngine
+    source: Book
+    embedding: Embedding
+    future: asyncio.Future
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    # вызывается из потока пула с процентом разобранных кандидатов
+    progress_callback: Callable[[int], None] | None = None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+class SearchCoalescer:
+    """
+    Собирает запросы, пришедшие в течение max_wait_ms (или до max_batch_size),
+    и выполняет их одним index.search с матрицей (n, d).
+    """
+    def __init__(
+        self,
+        executor: Executor,
+        max_batch_size: int = SEARCH_BATCH_MAX_SIZE,
+        max_wait_ms: float = SEARCH_BATCH_MAX_WAIT_MS,
+    ):
+        self._executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._pending: list[PendingSearch] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    async def search(
+        self,
+        engine: IndexSimilarSearchEngine,
+        source: Book,
+        embedding: Embedding,
+        cancel_event: threading.Event | None = None,
+        progress_callback: Callable[[int], None] | None = None,
+    ) -> List[Tuple[float, int, int]]:
+        loop = asyncio.get_running_loop()
+        item = PendingSearch(engine, source, embedding, loop.create_future(), cancel_event or threading.Event(), progress_callback)
+        self._pending.append(item)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await item.future
+
+    async def search_many(
+        self,
+        engine: IndexSimilarSearchEngine,
+        sources: List[Book],
+        embeddings: List[Embedding],
+    ) -> list[List[Tuple[float, int, int]] | Exception]:
+        # явный батч уже собран вызывающим — отправляем его в пул без ожидания
+        loop = asyncio.get_running_loop()
+        batch = [
+            PendingSearch(engine, source, embedding, loop.create_future())
+            for source, embedding in zip(sources, embeddings)
+        ]
+        if not batch:
+            return []
+        return await loop.run_in_executor(self._executor, self.run_batch, batch)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        batch = self._drop_cancelled(batch)
+        if not batch:
+            return
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self.run_batch, batch)
+        future.add_done_callback(lambda f: self._resolve(batch, f))
+
+    @staticmethod
+    def run_batch(batch: list[PendingSearch]) -> list[List[Tuple[float, int, int]] | Exception]:
+        results: list[List[Tuple[float, int, int]] | Exception] = [SearchCancelled() for _ in batch]
+
+        started_at = time.perf_counter()
+        for item in batch:
+            QUEUE_WAIT_SECONDS.observe(started_at - item.enqueued_at)
+
+        # пока батч ждал свободного воркера, клиенты могли уйти
+        alive = [row for row, item in enumerate(batch) if not item.is_cancelled()]
+        if not alive:
+            return results
+
+        searched = IndexSimilarSearchEngine.search_batch([
+            (batch[row].engine, batch[row].source, batch[row].embedding, batch[row].is_cancelled, batch[row].progress_callback)
+            for row in alive
+        ])
+        for row, result in zip(alive, searched):
+            results[row] = result
+
+        return results
+
+    @staticmethod
+    def _drop_cancelled(batch: list[PendingSearch]) -> list[PendingSearch]:
+        alive = []
+        for item in batch:
+            if item.is_cancelled():
+                if not item.future.done():
+                    item.future.set_exception(SearchCancelled())
+            else:
+                alive.append(item)
+        return alive
+
+    @staticmethod
+    def _resolve(batch: list[PendingSearch], future: asyncio.Future):
+        # отменённый future не отдаёт исключение, а бросает CancelledError
+        error = SearchCancelled() if future.cancelled() else future.exception()
+
+        for row, item in enumerate(batch):
+            if item.future.done():
+                continue
+
+            if error is not None:
+                item.future.set_exception(error)
+                continue
+
+            result = future.result()[row]
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
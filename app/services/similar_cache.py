@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from typing import Any
+from app.metrics import CACHE_REQUESTS
+from app.settings.config import SIMILAR_CACHE_SIZE
+
+CacheKey = tuple[int, int, bool]
+
+class SimilarCache:
+    """
+    LRU отрендеренных таблиц похожих книг, ключ — (book_id, limit, exclude_same_author).
+    Поколение книги увеличивается при инвалидации, а общая эпоха — при clear,
+    поэтому результат, посчитанный до нового фидбека или смены индекса, в кэш уже не попадёт.
+    Поколений хранится не больше max_entries: при переполнении они сбрасываются вместе
+    со сменой эпохи, и отклоняются лишь рендеры, начатые до сброса.
+    """
+    def __init__(self, max_entries: int = SIMILAR_CACHE_SIZE):
+        self.max_entries = max(0, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[CacheKey, str] = OrderedDict()
+        self._keys_by_book: dict[int, set[CacheKey]] = {}
+        self._generations: dict[int, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> str | None:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(result="miss")
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_REQUESTS.inc(result="hit")
+            return html
+
+    def generation(self, book_id: int) -> tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(book_id, 0)
+
+    def put(self, key: CacheKey, html: str, generation: tuple[int, int]):
+        if self.max_entries == 0:
+            return
+
+        with self._lock:
+            if (self._epoch, self._generations.get(key[0], 0)) != generation:
+                return
+
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            self._keys_by_book.setdefault(key[0], set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget(evicted)
+
+    def invalidate_book(self, book_id: int) -> int:
+        with self._lock:
+            if book_id not in self._generations and len(self._generations) >= max(1, self.max_entries):
+                self._next_epoch()
+            self._generations[book_id] = self._generations.get(book_id, 0) + 1
+            keys = self._keys_by_book.pop(book_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._next_epoch()
+            self._entries.clear()
+            self._keys_by_book.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hit_rate, 4),
+            }
+
+    def _next_epoch(self):
+        # рендеры, начатые до смены эпохи, могли ещё не обращаться к кэшу;
+        # поколения книг сравниваются только внутри эпохи, поэтому старые не нужны
+        self._epoch += 1
+        self._generations.clear()
+
+    def _forget(self, key: CacheKey):
+        keys = self._keys_by_book.get(key[0])
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_book[key[0]]
@@ -1,7 +1,7 @@
 import time
 from typing import List, Tuple
+from app.metrics import SEARCH_SECONDS
 from app.models import Book, Embedding
-from app.db import db, BookRepository
 from app.searchEngines.similarSearch import SimilarSearchEngine
 
 class SimilarSearchService:
@@ -15,9 +15,6 @@ class SimilarSearchService:
         self._source = source
         self._embedding = embedding
         self.last_run_seconds = None
-        
-        with db() as conn:
-            self._total = BookRepository.count_embeddings(conn)
 
     def run(self, progress_callback=None) -> List[Tuple[float, int, int]]:
         if self._embedding is None:
@@ -31,6 +28,7 @@ class SimilarSearchService:
             progress_callback=progress_callback
         )
         self.last_run_seconds = time.perf_counter() - started_at
+        SEARCH_SECONDS.observe(self.last_run_seconds, path="service")
 
         if progress_callback:
             progress_callback(100)
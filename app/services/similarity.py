@@ -1,11 +1,18 @@
 import time
 import asyncio
-from typing import Optional, List, Tuple
+import threading
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncIterator, Callable, Optional, List, Tuple
 
-from app.db import db, SimilarRepository
+from app.db import AsyncDatabase, SimilarRepository
+from app.metrics import ENGINE_LOAD_SECONDS, ENGINE_RELOADS, SEARCH_SECONDS
 from app.models import Book, Embedding
-from app.searchEngines.similarSearch import SimilarSearchEngineFactory
-from app.services import SimilarSearchService
+from app.searchEngines.similarSearch import SimilarSearchEngineFactory, SimilarSearchEngine, SearchCancelled
+from app.services.search_coalescer import SearchCoalescer
+from app.services.admission import AdmissionController, AdmissionTicket
+from app.settings.config import SIMILARS_PER_BOOK, SIMILAR_TASK_TTL_SECONDS, INDEX_RELOAD_SECONDS
+
+TaskKey = Tuple[str, int, bool]
 
 class TaskState:
     def __init__(self):
@@ -13,59 +20,318 @@ class TaskState:
         self.result: Optional[List[Tuple[float, int, int]]] = None
         self.error: Optional[str] = None
         self.start_time: float = time.perf_counter()
+        self.finished_at: Optional[float] = None
         self.done_event = asyncio.Event()
+        self.cancel_event = threading.Event()
+        self._loop = asyncio.get_running_loop()
+        self._subscribers: set[asyncio.Queue] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
 
     def set_progress(self, percent: int):
         self.progress = percent
+        self._publish({"type": "progress", "progress": percent})
 
     def set_done(self, similars: List[Tuple[float, int, int]]):
         self.result = similars
-        self.done_event.set()
+        self._finish({"type": "done"})
 
     def set_error(self, msg: str):
         self.error = msg
+        self._finish({"type": "error", "message": msg})
+
+    def snapshot(self) -> dict:
+        if self.error is not None:
+            return {"type": "error", "message": self.error}
+        if self.result is not None:
+            return {"type": "done"}
+        return {"type": "progress", "progress": self.progress}
+
+    async def events(self) -> AsyncIterator[dict]:
+        # подписчик сразу получает текущее состояние, дальше — только изменения
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait(self.snapshot())
+        self._subscribers.add(queue)
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["type"] != "progress":
+                    return
+        finally:
+            self._subscribers.discard(queue)
+            # последний подписчик ушёл — вычисление больше никому не нужно
+            if not self._subscribers and self.finished_at is None:
+                self.cancel_event.set()
+
+    def _finish(self, event: dict):
+        self.finished_at = time.monotonic()
         self.done_event.set()
+        self._publish(event)
+
+    def _publish(self, event: dict):
+        if _running_loop() is not self._loop:
+            self._loop.call_soon_threadsafe(self._publish, event)
+            return
+
+        for queue in self._subscribers:
+            # медленному клиенту промежуточный прогресс не нужен
+            if event["type"] == "progress" and not queue.empty():
+                continue
+            queue.put_nowait(event)
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
 
 class Similarity:
-    def __init__(self):
-        self.tasks: dict[str, TaskState] = {}
+    def __init__(
+        self,
+        coalescer: SearchCoalescer,
+        database: AsyncDatabase,
+        admission: AdmissionController,
+        task_ttl: float = SIMILAR_TASK_TTL_SECONDS,
+        on_change: Callable[[], None] | None = None,
+    ):
+        self.tasks: dict[TaskKey, TaskState] = {}
+        self.engine: SimilarSearchEngine | None = None
+        self._coalescer = coalescer
+        self._database = database
+        self.admission = admission
+        self._task_ttl = task_ttl
+        # вызывается, когда выдача могла измениться: новая версия индекса или удалённые книги
+        self._on_change = on_change
+        self._engine_lock = threading.Lock()
+        # поиски на каждом движке: старый закрывается, когда закончится последний
+        self._engine_users: dict[int, int] = {}
+        self._running: set[asyncio.Task] = set()
+
+    def load_engine(self) -> SimilarSearchEngine:
+        # индекс, каталог книг и reranker загружаются вместе и живут до публикации новой версии
+        with self._engine_lock:
+            if self.engine is None:
+                self.engine = self._create_engine()
+            return self.engine
+
+    @staticmethod
+    def _create_engine() -> SimilarSearchEngine:
+        with ENGINE_LOAD_SECONDS.time():
+            return SimilarSearchEngineFactory.create(
+                SimilarSearchEngineFactory.INDEX, SIMILARS_PER_BOOK, False, 1
+            )
+
+    @asynccontextmanager
+    async def using_engine(self) -> AsyncIterator[SimilarSearchEngine]:
+        # движок не закроется при перезагрузке, пока поиск на нём не завершится
+        if self.engine is None:
+            await asyncio.to_thread(self.load_engine)
+        with self._engine_lock:
+            engine = self.engine
+            self._engine_users[id(engine)] = self._engine_users.get(id(engine), 0) + 1
+        try:
+            yield engine
+        finally:
+            with self._engine_lock:
+                users = self._engine_users.pop(id(engine)) - 1
+                if users:
+                    self._engine_users[id(engine)] = users
+                retired = not users and engine is not self.engine
+            if retired:
+                engine.close()
+
+    def reload_engine(self, logger=None) -> bool:
+        """
+        Если опубликована новая версия индекса, загружает её вторым движком и подменяет
+        ссылку. Запросы, уже взявшие старый движок, дорабатывают на нём, после
+        последнего старый движок закрывается.
+        """
+        engine = self.engine
+        if engine is None:
+            # индекс мог появиться впервые уже после старта
+            try:
+                fresh = self.load_engine()
+            except FileNotFoundError:
+                return False
+            ENGINE_RELOADS.inc(result="ok")
+            if logger: logger.info(f"Движок загружен, версия {fresh.version} ({fresh.index.ntotal:,} векторов, {len(fresh.books):,} книг)")
+            self._changed()
+            return True
+
+        version = SimilarSearchEngineFactory.current_version(engine.index)
+        if version == engine.version:
+            return False
+
+        if logger: logger.info(f"Новая версия индекса {version} (сейчас {engine.version}), загружаем...")
+        fresh = self._create_engine()
+        with self._engine_lock:
+            self.engine = fresh
+            idle = id(engine) not in self._engine_users
+
+        ENGINE_RELOADS.inc(result="ok")
+        if logger: logger.info(f"Движок переключён на версию {fresh.version} ({fresh.index.ntotal:,} векторов, {len(fresh.books):,} книг)")
+        self._changed()
+        if idle:
+            engine.close()
+        return True
+
+    def refresh_tombstones(self, logger=None) -> bool:
+        # новые удалённые книги отсекаются работающим движком, индекс не перезагружается
+        engine = self.engine
+        if engine is None or not engine.tombstones.refresh():
+            return False
+
+        if logger: logger.info(f"Удалённых книг: {len(engine.tombstones):,}, выдача обновлена")
+        self._changed()
+        return True
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
 
-    def remove_task(self, file_name: str):
-        self.tasks.pop(file_name, None)
+    async def watch_index(self, interval: float = INDEX_RELOAD_SECONDS, logger=None):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh_tombstones, logger)
+            except Exception as e:
+                if logger: logger.warning(f"Список удалённых книг не обновлён: {e}")
 
-    def update_progress(self, file_name: str, percent: int):
-        if file_name in self.tasks:
-            self.tasks[file_name].set_progress(percent)
+            try:
+                await asyncio.to_thread(self.reload_engine, logger)
+            except Exception as e:
+                # сборка могла опубликовать битую версию — продолжаем работать на старой
+                ENGINE_RELOADS.inc(result="error")
+                if logger: logger.warning(f"Новая версия индекса не загружена: {e}")
 
-    def compute_similar(
-        self, 
+    @property
+    def index_version(self) -> str:
+        # удалённые книги меняют выдачу так же, как новая версия индекса
+        engine = self.engine
+        version = getattr(engine, "version", None) or "none"
+        tombstones = getattr(engine, "tombstones", None)
+        return f"{version}-t{tombstones.version}" if tombstones else version
+
+    async def wait_result(self, state: TaskState) -> List[Tuple[float, int, int]]:
+        async with aclosing(state.events()) as events:
+            async for _ in events:
+                pass
+
+        if state.error:
+            raise RuntimeError(state.error)
+        return state.result
+
+    def remove_task(self, key: TaskKey):
+        self.tasks.pop(key, None)
+
+    def get_or_start(
+        self,
+        book: Book,
+        embedding_bytes: bytes,
+        limit: int,
+        exclude_same_author: bool,
+        client_id: str = "",
+    ) -> TaskState:
+        # одно вычисление на ключ, все остальные запросы подписываются на него
+        key = (book.file_name, limit, exclude_same_author)
+        state = self.tasks.get(key)
+        if state is not None and not state.cancelled:
+            return state
+
+        # место в очереди занимает только новое вычисление
+        ticket = self.admission.acquire(client_id)
+
+        state = TaskState()
+        self.tasks[key] = state
+
+        task = asyncio.create_task(
+            self.compute_similar(state, ticket, book, embedding_bytes, limit, exclude_same_author)
+        )
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return state
+
+    async def compute_similar(
+        self,
+        state: TaskState,
+        ticket: AdmissionTicket,
         book: Book,
         embedding_bytes: bytes,
         limit: int,
         exclude_same_author: bool
     ):
-        state = self.tasks.get(book.file_name)
-        if not state:
-            return
-
         try:
-            engine = SimilarSearchEngineFactory.create(
-                SimilarSearchEngineFactory.INDEX, limit, exclude_same_author, 1
-            )
-            service = SimilarSearchService(
-                engine=engine,
-                source=book,
-                embedding=Embedding.from_db(embedding_bytes)
-            )
+            embedding = Embedding.from_db(embedding_bytes)
+            if embedding is None:
+                # как и SimilarSearchService: у книги без вектора (или с нулевым) соседей нет
+                state.set_done([])
+                return
 
-            similars = service.run(
-                progress_callback=lambda p: self.update_progress(book.file_name, p)
-            )
+            async with self.using_engine() as engine:
+                similars = await self._coalescer.search(
+                    engine.configure(limit, exclude_same_author),
+                    book,
+                    embedding,
+                    cancel_event=state.cancel_event,
+                    progress_callback=state.set_progress,
+                )
 
-            with db() as conn:
-                SimilarRepository().replace(conn, similars)
+            SEARCH_SECONDS.observe(time.perf_counter() - state.start_time, path="api")
 
+            await self._database.write(SimilarRepository().replace, similars)
             state.set_done(similars)
 
+        except SearchCancelled:
+            state.set_error("Поиск отменён")
+
         except Exception as e:
-            state.set_error(str(e))
\ No newline at end of file
+            state.set_error(str(e))
+
+        finally:
+            self.admission.release(ticket)
+
+            # готовый результат ещё TTL секунд раздаётся опоздавшим, ошибка — нет
+            key = (book.file_name, limit, exclude_same_author)
+            ttl = self._task_ttl if state.error is None else 0
+            asyncio.get_running_loop().call_later(ttl, self._expire, key, state)
+
+    def _expire(self, key: TaskKey, state: TaskState):
+        if self.tasks.get(key) is state:
+            del self.tasks[key]
+
+    async def search_many(
+        self,
+        books: List[Book],
+        embeddings: List[Embedding],
+        limit: int,
+        exclude_same_author: bool,
+        client_id: str = "",
+    ) -> dict[int, List[Tuple[float, int, int]]]:
+        ticket = self.admission.acquire(client_id, cost=len(books))
+        try:
+            async with self.using_engine() as engine:
+                with SEARCH_SECONDS.time(path="batch"):
+                    results = await self._coalescer.search_many(
+                        engine.configure(limit, exclude_same_author), books, embeddings
+                    )
+        finally:
+            self.admission.release(ticket)
+
+        found: dict[int, List[Tuple[float, int, int]]] = {}
+        for book, result in zip(books, results):
+            if isinstance(result, Exception):
+                raise result
+            found[book.id] = result
+
+        await self._database.write(
+            SimilarRepository().replace,
+            [s for similars in found.values() for s in similars],
+        )
+        return found
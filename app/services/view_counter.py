@@ -0,0 +1,43 @@
+import asyncio
+from collections import Counter
+from app.db import AsyncDatabase, BookViewsRepository
+from app.settings.config import VIEWS_FLUSH_SECONDS
+
+class ViewCounter:
+    """
+    Просмотры страниц копятся в памяти и раз в flush_seconds пишутся в book_views
+    одной транзакцией: страница не стоит в очереди писателя вместе с результатами поиска.
+    Считаются только найденные в базе книги, поэтому буфер не больше их числа.
+    """
+    def __init__(self, database: AsyncDatabase, flush_seconds: float = VIEWS_FLUSH_SECONDS):
+        self._database = database
+        self.flush_seconds = flush_seconds
+        self._pending: Counter[int] = Counter()
+
+    @property
+    def pending(self) -> int:
+        return sum(self._pending.values())
+
+    def add(self, book_id: int):
+        self._pending[book_id] += 1
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+
+        try:
+            await self._database.write(BookViewsRepository.add_many, dict(pending))
+        except Exception:
+            # не записанные просмотры уйдут со следующей порцией
+            self._pending.update(pending)
+            raise
+        return sum(pending.values())
+
+    async def run(self, logger=None):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                if logger: logger.warning(f"Просмотры не записаны: {e}")
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from app.db import AsyncDatabase, BookRepository, BookViewsRepository, EmbeddingsRepository, SimilarRepository
+from app.hnsw import HNSW, shard_file
+from app.models import Book, Embedding
+from app.services.search_coalescer import SearchCoalescer
+from app.services.similarity import Similarity
+from app.settings.config import (
+    DB_FILE,
+    INDEX_FILE,
+    INDEX_SHARDS,
+    SEARCH_BATCH_MAX_SIZE,
+    SIMILARS_PER_BOOK,
+    WARMUP_CANARY_FILES,
+    WARMUP_HOT_BOOKS,
+    WARMUP_PREFETCH,
+)
+
+PREFETCH_CHUNK_SIZE = 8 * 1024 * 1024
+
+def _load_canaries(conn, files: list[str]) -> tuple[list[Book], list[Embedding]]:
+    if files:
+        rows = BookRepository().get_many_by_files(conn, files).values()
+    else:
+        # без настройки прогреваем на одной любой книге с вектором
+        first = next(EmbeddingsRepository().get_all(conn), None)
+        rows = [BookRepository().get_by_id(conn, first[0])] if first else []
+
+    books = [Book.map(row) for row in rows if row]
+    embeddings = EmbeddingsRepository().get_many(conn, [book.id for book in books])
+    pairs = [(book, Embedding.from_db(embeddings.get(book.id))) for book in books]
+    pairs = [(book, embedding) for book, embedding in pairs if embedding is not None]
+    return [book for book, _ in pairs], [embedding for _, embedding in pairs]
+
+def _load_hot(conn, count: int, limit: int) -> tuple[int, list[Book], list[Embedding]]:
+    book_ids = BookViewsRepository.top(conn, count)
+    books = Book.map_by_id(BookRepository().get_many(conn, book_ids), Book.map)
+
+    # чтение готовых соседей заодно прогревает страницы similar
+    ready = SimilarRepository().get_many(conn, list(books), limit)
+    misses = [book_id for book_id in book_ids if book_id in books and book_id not in ready]
+    embeddings = EmbeddingsRepository().get_many(conn, misses)
+    pairs = [(books[book_id], Embedding.from_db(embeddings.get(book_id))) for book_id in misses]
+    pairs = [(book, embedding) for book, embedding in pairs if embedding is not None]
+    return len(ready), [book for book, _ in pairs], [embedding for _, embedding in pairs]
+
+class Warmup:
+    """
+    Прогрев после старта: файлы индекса и БД читаются в page cache, движок
+    загружается, выполняются контрольные запросы и заранее считаются соседи
+    самых просматриваемых книг. Сервис готов (ready), когда прогрев прошёл без
+    ошибок и движок загружен; после ошибки прогрева stage = "failed".
+    """
+    def __init__(
+        self,
+        similarity: Similarity,
+        coalescer: SearchCoalescer,
+        database: AsyncDatabase,
+        prefetch: bool = WARMUP_PREFETCH,
+        canary_files: list[str] = WARMUP_CANARY_FILES,
+        hot_books: int = WARMUP_HOT_BOOKS,
+        logger=None,
+    ):
+        self._similarity = similarity
+        self._coalescer = coalescer
+        self._database = database
+        self.prefetch_files = prefetch
+        self.canary_files = canary_files
+        self.hot_books = max(0, hot_books)
+        self.logger = logger
+        self._reset()
+
+    async def run(self):
+        self._reset()
+        self.started_at = time.perf_counter()
+        try:
+            if self.prefetch_files:
+                self.stage = "prefetch"
+                self.prefetched_bytes = await asyncio.to_thread(
+                    self.prefetch, [*self.index_files(), DB_FILE, Path(f"{DB_FILE}-wal")]
+                )
+                self._log(f"Прочитано в page cache: {self.prefetched_bytes / (1024 ** 2):,.1f} MB")
+
+            self.stage = "engine"
+            try:
+                await asyncio.to_thread(self._similarity.load_engine)
+            except FileNotFoundError as e:
+                # без индекса сервис работает, но не готов, пока наблюдатель не загрузит индекс
+                self.error = str(e)
+                self.stage = "done"
+                self._log(f"Поисковый движок не загружен: {e}")
+                return
+
+            self.stage = "canary"
+            await self._run_canaries()
+
+            if self.hot_books:
+                self.stage = "hot_books"
+                await self._precompute_hot()
+
+            self.stage = "done"
+
+        except Exception as e:
+            self.error = str(e)
+            self.stage = "failed"
+            self._log(f"Прогрев прерван: {e}")
+
+        finally:
+            self.finished_at = time.perf_counter()
+            self._log(f"Прогрев завершён за {self.finished_at - self.started_at:.1f} с")
+
+    @property
+    def ready(self) -> bool:
+        return self.stage in ("done", "skipped") and self._similarity.engine is not None
+
+    def _reset(self):
+        self.stage = "pending"
+        self.error: str | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.prefetched_bytes = 0
+        self.canaries = 0
+        self.canary_seconds = 0.0
+        self.hot_ready = 0
+        self.hot_computed = 0
+
+    def skip(self):
+        self.stage = "skipped"
+
+    @staticmethod
+    def index_files() -> list[Path]:
+        # файлы опубликованных версий, а не сами имена из настроек
+        if INDEX_SHARDS > 1:
+            files = [shard_file(INDEX_FILE, number, INDEX_SHARDS) for number in range(INDEX_SHARDS)]
+        else:
+            files = [INDEX_FILE]
+        return [Path(HNSW(index_file=file).current_file()) for file in files]
+
+    @staticmethod
+    def prefetch(paths: list[Path]) -> int:
+        total = 0
+        buffer = bytearray(PREFETCH_CHUNK_SIZE)
+
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+
+            with open(path, "rb", buffering=0) as f:
+                # WILLNEED запускает readahead в ядре, последовательное чтение дожидается его
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                while read := f.readinto(buffer):
+                    total += read
+
+        return total
+
+    async def _run_canaries(self):
+        books, embeddings = await self._database.read(_load_canaries, self.canary_files)
+        if not books:
+            return
+
+        started_at = time.perf_counter()
+        async with self._similarity.using_engine() as engine:
+            await self._coalescer.search_many(engine.configure(SIMILARS_PER_BOOK), books, embeddings)
+        self.canaries = len(books)
+        self.canary_seconds = time.perf_counter() - started_at
+        self._log(f"Контрольные запросы: {self.canaries} за {self.canary_seconds:.2f} с")
+
+    async def _precompute_hot(self):
+        self.hot_ready, books, embeddings = await self._database.read(_load_hot, self.hot_books, SIMILARS_PER_BOOK)
+
+        for start in range(0, len(books), SEARCH_BATCH_MAX_SIZE):
+            end = start + SEARCH_BATCH_MAX_SIZE
+            found = await self._similarity.search_many(
+                books[start:end], embeddings[start:end], SIMILARS_PER_BOOK, False, "warmup"
+            )
+            self.hot_computed += len(found)
+
+        self._log(f"Популярные книги: {self.hot_ready} уже посчитаны, {self.hot_computed} посчитано при прогреве")
+
+    def stats(self) -> dict[str, Any]:
+        end = self.finished_at or time.perf_counter()
+        return {
+            "ready": self.ready,
+            "stage": self.stage,
+            "error": self.error,
+            "elapsed": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "prefetched_bytes": self.prefetched_bytes,
+            "canaries": self.canaries,
+            "canary_seconds": round(self.canary_seconds, 3),
+            "hot_ready": self.hot_ready,
+            "hot_computed": self.hot_computed,
+        }
+
+    def _log(self, message: str):
+        if self.logger: self.logger.info(message)
@@ -8,7 +8,13 @@ SITE_BASE_PATH = os.getenv("SITE_BASE_PATH", "")
 LIB_URL = os.getenv("LIB_URL", "https://lib.some.ru")
 
 DB_FILE = Path(os.getenv("DB_FILE", str(DATA_DIR / "data.db")))
+DB_READERS = int(os.getenv("DB_READERS","4"))
 INDEX_FILE = Path(os.getenv("INDEX_FILE", str(DATA_DIR / "index.faiss")))
+INDEX_MMAP = os.getenv("INDEX_MMAP","0") == "1"
+INDEX_KEEP_VERSIONS = max(2, int(os.getenv("INDEX_KEEP_VERSIONS","2")))
+INDEX_VERIFY_CHECKSUM = os.getenv("INDEX_VERIFY_CHECKSUM","0") == "1"
+INDEX_RELOAD_SECONDS = float(os.getenv("INDEX_RELOAD_SECONDS","30"))
+INDEX_COMPACT_RATIO = float(os.getenv("INDEX_COMPACT_RATIO","0.05"))
 RERANKER_FILE = Path(os.getenv("RERANKER_FILE", str(DATA_DIR / "reranker.lgb")))
 MODEL_NAME = os.getenv("MODEL_NAME","all-MiniLM-L6-v2")
 
@@ -21,9 +27,51 @@ SIMILARS_PER_BOOK = int(os.getenv("SIMILARS_PER_BOOK","100"))
 
 DATABASE_QUEUE_BATCH_SIZE = int(os.getenv("DATABASE_QUEUE_BATCH_SIZE","20000"))
 
-HNSW_M: int = 32
-HNSW_EF_CONSTRUCTION: int = 200
-HNSW_EF_SEARCH: int = 64
+SEARCH_WORKERS = max(1, int(os.getenv("SEARCH_WORKERS","1")))
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE","32"))
+SEARCH_BATCH_MAX_WAIT_MS = float(os.getenv("SEARCH_BATCH_MAX_WAIT_MS","5"))
+SEARCH_OVERFETCH_FACTOR = float(os.getenv("SEARCH_OVERFETCH_FACTOR","2"))
+SEARCH_OVERFETCH_MIN = int(os.getenv("SEARCH_OVERFETCH_MIN","20"))
+
+SEARCH_QUEUE_MAX = int(os.getenv("SEARCH_QUEUE_MAX","64"))
+SEARCH_PER_CLIENT_MAX = int(os.getenv("SEARCH_PER_CLIENT_MAX","4"))
+SEARCH_RETRY_AFTER_SECONDS = int(os.getenv("SEARCH_RETRY_AFTER_SECONDS","2"))
+# адреса прокси, которым доверяем X-Forwarded-For; остальным клиентам — только адрес соединения
+TRUSTED_PROXIES = {a.strip() for a in os.getenv("TRUSTED_PROXIES","").split(",") if a.strip()}
+
+SIMILAR_CACHE_SIZE = int(os.getenv("SIMILAR_CACHE_SIZE","1000"))
+SIMILAR_TASK_TTL_SECONDS = float(os.getenv("SIMILAR_TASK_TTL_SECONDS","60"))
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED","0") == "1"
+WARMUP_PREFETCH = os.getenv("WARMUP_PREFETCH","0") == "1"
+WARMUP_CANARY_FILES = [f.strip() for f in os.getenv("WARMUP_CANARY_FILES","").split(",") if f.strip()]
+WARMUP_HOT_BOOKS = int(os.getenv("WARMUP_HOT_BOOKS","100"))
+VIEWS_FLUSH_SECONDS = float(os.getenv("VIEWS_FLUSH_SECONDS","10"))
+
+INDEX_TYPE = os.getenv("INDEX_TYPE","hnsw_flat")
+HNSW_M = int(os.getenv("HNSW_M","32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION","200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH","64"))
+IVF_NLIST = int(os.getenv("IVF_NLIST","0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE","32"))
+PQ_M = int(os.getenv("PQ_M","32"))
+PQ_NBITS = int(os.getenv("PQ_NBITS","8"))
+INDEX_TRAIN_SIZE = int(os.getenv("INDEX_TRAIN_SIZE","200000"))
+INDEX_RECALL_SAMPLE = int(os.getenv("INDEX_RECALL_SAMPLE","1000"))
+TUNE_TARGET_RECALL = float(os.getenv("TUNE_TARGET_RECALL","0.95"))
+TUNE_RECALL_K = int(os.getenv("TUNE_RECALL_K","100"))
+INDEX_BUILD_STREAMING = os.getenv("INDEX_BUILD_STREAMING","1") == "1"
+INDEX_BUILD_THREADS = int(os.getenv("INDEX_BUILD_THREADS","0"))
+INDEX_BUILD_CHUNK_SIZE = int(os.getenv("INDEX_BUILD_CHUNK_SIZE","50000"))
+INDEX_SHARDS = max(1, int(os.getenv("INDEX_SHARDS","1")))
+INDEX_SHARD_SCHEME = os.getenv("INDEX_SHARD_SCHEME","range")
+INDEX_SHARD_ADDRESSES = [a.strip() for a in os.getenv("INDEX_SHARD_ADDRESSES","").split(",") if a.strip()]
+SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY","").encode() or None
+SHARD_TIMEOUT_SECONDS = float(os.getenv("SHARD_TIMEOUT_SECONDS","5"))
+EMBEDDINGS_LOAD_WORKERS = max(1, int(os.getenv("EMBEDDINGS_LOAD_WORKERS","4")))
+VECTOR_STORE_ENABLED = os.getenv("VECTOR_STORE_ENABLED","0") == "1"
+VECTOR_STORE_FILE = Path(os.getenv("VECTOR_STORE_FILE", str(DATA_DIR / "vectors")))
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE","float16")
 FEEDBACK_BOOST_FACTOR: float = 0.4
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY","")
@@ -0,0 +1,105 @@
+import argparse
+import logging
+import threading
+import time
+from multiprocessing.connection import Listener
+
+from app.hnsw import HNSW, Shard
+from app.hnsw.shards import LocalShard, require_authkey
+from app.settings.config import INDEX_SHARDS, SHARD_AUTHKEY
+
+RELOAD_CHECK_SECONDS = 5.0
+
+class ShardServer:
+    """
+    Один шард индекса в отдельном процессе. Запросы приходят от ShardedIndex
+    (RemoteShard) по multiprocessing.connection, на каждое соединение — поток.
+    Если файл шарда пересобран, новый индекс загружается в фоне и подменяет старый.
+    """
+    def __init__(self, shard: Shard, logger=None):
+        self.shard = shard
+        self.logger = logger
+        self.local = LocalShard(shard, logger)
+        self._checked_at = time.monotonic()
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def serve(self, host: str, port: int, authkey: bytes | None = SHARD_AUTHKEY):
+        require_authkey(host, authkey)
+        with Listener((host, port), authkey=authkey) as listener:
+            if self.logger: self.logger.info(f"Шард {self.shard.name} ({self.local.ntotal:,} векторов) слушает {host}:{port}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    if self.logger: self.logger.warning(f"Соединение отклонено: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                self.maybe_reload()
+                local = self.local
+                try:
+                    if op == "search":
+                        result = local.search(*args)
+                    elif op == "ids":
+                        result = local.get_ids()
+                    elif op == "info":
+                        result = {"ntotal": local.ntotal, "d": local.d, "version": local.version()}
+                    else:
+                        raise ValueError(f"Неизвестная операция '{op}'")
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._reloading or now - self._checked_at < RELOAD_CHECK_SECONDS:
+                return
+            self._checked_at = now
+
+            try:
+                if HNSW(index_file=self.shard.index_file).version() == self.local.version():
+                    return
+            except OSError as e:
+                if self.logger: self.logger.warning(f"Файл шарда недоступен: {e}")
+                return
+            self._reloading = True
+
+        # старый индекс продолжает отвечать, пока грузится новый
+        threading.Thread(target=self._reload, daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.local = LocalShard(self.shard, self.logger)
+            if self.logger: self.logger.info(f"Шард {self.shard.name} перезагружен ({self.local.ntotal:,} векторов)")
+        except Exception as e:
+            if self.logger: self.logger.error(f"Не удалось перезагрузить шард {self.shard.name}: {e}")
+        finally:
+            self._reloading = False
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер одного шарда индекса")
+    parser.add_argument("--shard", type=int, required=True, help="Номер шарда")
+    parser.add_argument("--shards", type=int, default=INDEX_SHARDS, help="Всего шардов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=f"[шард {args.shard}] %(message)s")
+    try:
+        require_authkey(args.host, SHARD_AUTHKEY)
+    except ValueError as e:
+        parser.error(str(e))
+    ShardServer(Shard(args.shard, args.shards), logging.getLogger("shard_server")).serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
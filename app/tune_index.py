@@ -0,0 +1,81 @@
+import argparse
+import logging
+
+from app.hnsw import HNSW, IndexOutOfSync, SearchParamsTuner, Shard
+from app.models import EmbeddingMatrix
+from app.searchEngines.similarSearch.indexSimilarSearchEngine import IndexSimilarSearchEngine
+from app.settings.config import INDEX_RECALL_SAMPLE, INDEX_SHARDS, SIMILARS_PER_BOOK, TUNE_TARGET_RECALL, TUNE_RECALL_K
+
+# limit API (по умолчанию и максимум) и массовой генерации similar
+DEFAULT_LIMITS = f"50,100,{SIMILARS_PER_BOOK}"
+
+def parse_ints(value: str) -> list[int]:
+    return sorted({int(v) for v in value.split(",") if v.strip()})
+
+def tune(hnsw: HNSW, matrix: EmbeddingMatrix, args, logger) -> bool:
+    index = hnsw.load_from_file()
+    version = hnsw.loaded_version
+
+    # те же k, с которых начинает поиск IndexSimilarSearchEngine
+    sizes = [IndexSimilarSearchEngine.fetch_k_for(limit, index.ntotal) for limit in parse_ints(args.limits)]
+    print(f"Цель: recall@{args.recall_k} >= {args.target} для k = {', '.join(map(str, sorted(set(sizes))))}")
+
+    tuner = SearchParamsTuner(index, matrix, target=args.target, recall_k=args.recall_k, sample=args.sample, logger=logger)
+    result = tuner.tune(sizes)
+
+    print(f"\n{'k':>6}  {tuner.param:>9}  {'recall':>7}  {'p50_ms':>8}")
+    for item in result["per_k"]:
+        print(f"{item['k']:>6}  {item[tuner.param]:>9}  {item['recall']:>7.4f}  {item['p50_ms']:>8.3f}{'' if item['reached'] else '  цель не достигнута'}")
+    print(f"\nИтог: {tuner.param} = {result[tuner.param]}")
+
+    if args.dry_run:
+        return True
+
+    try:
+        # параметры относятся к измеренной версии: новую, опубликованную за время подбора, не трогаем
+        hnsw.update_meta({"search_params": result}, version=version)
+    except IndexOutOfSync as e:
+        print(f"Не сохранено: {e}. Запустите подбор заново")
+        return False
+    print(f"Сохранено в '{hnsw.meta_file}', применится при следующей загрузке индекса")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор минимального efSearch/nprobe под целевой recall")
+    parser.add_argument("--target", type=float, default=TUNE_TARGET_RECALL, help="Целевой recall, например 0.95")
+    parser.add_argument("--recall-k", type=int, default=TUNE_RECALL_K, help="recall считается по стольким точным ближайшим")
+    parser.add_argument("--limits", default=DEFAULT_LIMITS, help="Значения limit запросов; k считается с учётом перебора")
+    parser.add_argument("--sample", type=int, default=INDEX_RECALL_SAMPLE, help="Количество запросов из базы")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать результат, не сохранять в метаданные")
+    parser.add_argument("--reset", action="store_true", help="Удалить подобранные параметры из метаданных")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logger = logging.getLogger("tune_index")
+
+    # у каждого шарда свой индекс и свои параметры: подбираются по его книгам
+    shards = Shard.load_plan() if INDEX_SHARDS > 1 else [None]
+    targets = [(shard, HNSW(index_file=shard.index_file, logger=logger) if shard else HNSW(logger=logger)) for shard in shards]
+
+    if args.reset:
+        for _, hnsw in targets:
+            hnsw.update_meta({"search_params": None})
+        print("Подобранные параметры удалены, используются значения из настроек")
+        return
+
+    matrix = EmbeddingMatrix.load(logger=logger)
+    saved = True
+    for shard, hnsw in targets:
+        if shard is None:
+            saved &= tune(hnsw, matrix, args, logger)
+            continue
+
+        print(f"\nШард {shard.name}")
+        rows = shard.contains(matrix.ids)
+        saved &= tune(hnsw, EmbeddingMatrix(matrix.ids[rows], matrix.vectors[rows]), args, logger)
+
+    if not saved:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from typing import Literal
 
+from app.metrics import RENDER_SECONDS
 from app.settings.config import BASE_DIR
 from app.models import Book, Similar, Feedbacks
 
@@ -15,35 +16,29 @@ class Html:
         from app.settings.config import LIB_URL
         return f"{LIB_URL}/#/{kind}?{kind}={value}"
 
+    @staticmethod
+    def render_elapsed(elapsed: float) -> str:
+        # время ответа не входит в таблицу: таблица кэшируется, а время у каждого запроса своё
+        return f'<p class="elapsed">Время выполнения: {elapsed:.3f} сек</p>\n'
+
     @staticmethod
     def render_similar_table(
         request: Request,
         base_book: Book,
         similars: list[tuple[float, int, int]],
-        elapsed: float,
-        feedbacks: Feedbacks
+        feedbacks: Feedbacks,
+        books_by_id: dict[int, Book] | None = None,
     ) -> HTMLResponse:
-        similars_converted = Similar.to_similar_list(similars)
-
-        rows = [
-            {
-                "file_name": s.candidate.file_name,
-                "score": s.score,
-                "title": s.candidate.title,
-                "authors": s.candidate.authors,
-                "rating": feedbacks.get_rating(base_book.id, s.candidate.id),
-            }
-            for s in similars_converted
-        ]
+        with RENDER_SECONDS.time():
+            rows = Similar.to_rows(base_book, similars, feedbacks, books_by_id)
 
-        return Html.templates.TemplateResponse(
-            "similar_table.html",
-            {
-                "request": request,
-                "base_book": base_book,
-                "rows": rows,
-                "elapsed": elapsed,
-                "source_file_name": base_book.file_name,
-                "make_lib_url": Html.make_lib_url,
-            }
-        )
\ No newline at end of file
+            return Html.templates.TemplateResponse(
+                "similar_table.html",
+                {
+                    "request": request,
+                    "base_book": base_book,
+                    "rows": rows,
+                    "source_file_name": base_book.file_name,
+                    "make_lib_url": Html.make_lib_url,
+                }
+            )
\ No newline at end of file
@@ -1,18 +1,18 @@
 import time
-from typing import Tuple
+import asyncio
 from app.workers import BaseWorker
 from app.utils import FB2Book
-from app.hnsw import HNSW
-from app.models import Task, Embedding, Book, Feedbacks
-from app.db import db, BookRepository, EmbeddingsRepository, AuthorRepository, FeedbackRepository
+from app.hnsw import IndexBuilder, IndexCompactor
+from app.models import Task, Embedding
+from app.db import db, BookRepository, EmbeddingsRepository, AuthorRepository, TombstoneRepository, VectorStore
 from app.searchEngines.bookSearch import BookSearchEngineFactory
-from app.settings.config import INPX_FOLDER
+from app.settings.config import INPX_FOLDER, VECTOR_STORE_ENABLED
 
 class GenerateEmbeddingsWorker(BaseWorker):
-    def __init__(self, model, **kwargs):
+    def __init__(self, model, full_rebuild: bool = False, **kwargs):
         super().__init__(**kwargs)
         self.model = model
-        self.hnsw = HNSW(batch_size=10000)
+        self.full_rebuild = full_rebuild
         self.engine = BookSearchEngineFactory.create(BookSearchEngineFactory.INPIX, INPX_FOLDER)
 
     async def stat_books(self):
@@ -33,8 +33,18 @@ class GenerateEmbeddingsWorker(BaseWorker):
                 last_update = now
                 
         await self.ui.update_total(self.registry.total)
+        await asyncio.to_thread(self.record_deleted, self.engine.deleted_books)
         self._queue_pulled = True
 
+    def record_deleted(self, files):
+        if not files:
+            return
+
+        with db() as conn:
+            added = TombstoneRepository().add_by_files(conn, files, reason="inpx_deleted")
+            dropped = TombstoneRepository().drop_similar(conn)
+        self.logger.info(f"Помечено удалёнными: {len(files):,} книг (новых: {added:,}), удалено строк similar: {dropped:,}")
+
     def process_book(self, task: Task):
         data = task.book.get_file_bytes_from_zip()
         book = FB2Book(data)
@@ -69,16 +79,17 @@ class GenerateEmbeddingsWorker(BaseWorker):
                 authors=authors)
 
     async def fin(self):
-        with db() as conn:
-            embeddings = list[Tuple[int, bytes]](EmbeddingsRepository().get_all(conn))
-            feedbacks = Feedbacks(FeedbackRepository.get_all(conn))
-            books: list[Book] = [
-                Book.map_row(row)
-                for row in BookRepository().get_all(conn)
-            ]
-            
-        self.hnsw.load_emb(embeddings)
-        self.hnsw.rebuild(
-            feedbacks=feedbacks,
-            books=books,
-        )
\ No newline at end of file
+        if VECTOR_STORE_ENABLED:
+            # новые векторы дописываются в хранилище до сборки, чтобы она читала их оттуда
+            VectorStore(logger=self.logger).sync()
+
+        builders = IndexBuilder.for_config(logger=self.logger)
+
+        # удалённые книги вычищаются, когда их набралось достаточно для перестроения;
+        # перестроение заодно включает и новые книги
+        if IndexCompactor(logger=self.logger).run(force=self.full_rebuild, builders=builders):
+            return
+
+        for builder in builders:
+            if builder.shard: self.logger.info(f"Шард {builder.shard.name}: {builder.hnsw.index_file}")
+            builder.update(self.full_rebuild)
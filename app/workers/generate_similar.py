@@ -1,10 +1,10 @@
 import queue
 import threading
 from tqdm import tqdm
-from typing import Tuple, List
+from typing import List
 from app.workers import BaseWorker
 from app.services import BulkSimilarSearchService
-from app.models import Task, Book
+from app.models import Task, Book, Embedding, EmbeddingMatrix
 from app.db import db, BookRepository, SimilarRepository
 from app.searchEngines.similarSearch import SimilarSearchEngineFactory
 from app.settings.config import SIMILARS_PER_BOOK, DATABASE_QUEUE_BATCH_SIZE
@@ -79,38 +79,31 @@ class GenerateSimilarWorker(BaseWorker):
             SimilarRepository().clear(conn)
 
             self.logger.info(f"Получение всех книг из базы данных")
-            books_with_embeddings = list[Tuple[int, str, str, str, str, bytes]](BookRepository().get_all_with_embeddings(conn))
+            books = {row[0]: Book.map_row(row) for row in BookRepository().get_all(conn)}
 
-            self.logger.info(f"Фильтрация книг и эмбеддингов по ID")
-            valid_books: List[Book] = []
-            valid_embeddings: List[bytes] = []
+        self.logger.info(f"Загрузка эмбеддингов")
+        matrix = EmbeddingMatrix.load(logger=self.logger)
 
-            for book_id, archive, book_name, title, author, embedding in books_with_embeddings:
-                valid_books.append(Book(id=book_id, archive_name=archive, file_name=book_name, title=title, author=author))
-                valid_embeddings.append(embedding)
+        self.logger.info(f"Фильтрация книг и эмбеддингов по ID")
+        rows = [row for row, book_id in enumerate(matrix.ids.tolist()) if book_id in books]
+        valid_books: List[Book] = [books[int(matrix.ids[row])] for row in rows]
 
         engine = SimilarSearchEngineFactory.create(SimilarSearchEngineFactory.INDEX, SIMILARS_PER_BOOK, False, 1)
 
         self._service = BulkSimilarSearchService(
             engine,
             valid_books,
-            valid_embeddings,
+            matrix,
             logger=self.logger
         )
 
         self.logger.info(f"Добавление книг и эмбеддингов в очередь")
-        tasks: List[Task] = []
-        for book_id, archive, book_name, title, embedding in books_with_embeddings:
-            tasks.append(Task(
-                name=book_name,
-                book=Book(
-                    id=book_id,
-                    archive_name=archive,
-                    file_name=book_name,
-                    title=title),
-                embedding=embedding))
+        tasks: List[Task] = [
+            # строка матрицы без копии
+            Task(name=book.file_name, book=book, embedding=Embedding(matrix.vectors[row]))
+            for row, book in zip(rows, valid_books)
+        ]
         await self.registry.add(tasks)
-        del books_with_embeddings
     
     def process_book(self, task: Task):
         similar = self._service.run(task.book, task.embedding)
@@ -0,0 +1,102 @@
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import faiss
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.db import AsyncDatabase, migrate
+from app.models import Book, Embedding, Tombstones
+from app.searchEngines.similarSearch.indexSimilarSearchEngine import IndexSimilarSearchEngine
+from app.services import AdmissionController, SearchCoalescer, SimilarCache, Similarity, ViewCounter
+
+# пакет routers экспортирует одноимённый APIRouter, поэтому модуль берём через importlib
+similar_router = importlib.import_module("app.api.routers.similar_router")
+
+DIM = 8
+
+
+class SimilarApiTestCase(unittest.TestCase):
+    """
+    Роутер /similar на временной базе: книги 1..BOOKS, у книг из WITHOUT_EMBEDDING
+    нет вектора, движок — точный faiss-индекс по всем векторам.
+    """
+    BOOKS = 20
+    WITHOUT_EMBEDDING = (20,)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.db_file = os.path.join(self.dir.name, "data.db")
+
+        rng = np.random.default_rng(0)
+        self.vectors = {book_id: Embedding(rng.normal(size=DIM)) for book_id in range(1, self.BOOKS + 1)}
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executescript(Path(migrate.__file__).with_name("schema.sql").read_text(encoding="utf-8"))
+            conn.executemany(
+                "INSERT INTO books (id, book, archive, title, author) VALUES (?, ?, 'a.zip', ?, ?)",
+                [(book_id, f"{book_id}.fb2", f"Книга {book_id}", f"Автор {book_id}") for book_id in self.vectors],
+            )
+            conn.executemany(
+                "INSERT INTO embeddings (book_id, embedding) VALUES (?, ?)",
+                [(book_id, emb.to_db()) for book_id, emb in self.vectors.items() if book_id not in self.WITHOUT_EMBEDDING],
+            )
+
+        # tombstones и фабрика движка читают базу через app.db.connection
+        patcher = mock.patch("app.db.connection.DB_FILE", self.db_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        self.database = AsyncDatabase(self.db_file, readers=2)
+        self.addCleanup(self.database.close)
+        self.cache = SimilarCache()
+        self.admission = AdmissionController(max_pending=4, per_client=2, retry_after=3)
+        self.coalescer = SearchCoalescer(executor, max_wait_ms=1)
+        self.similarity = Similarity(self.coalescer, self.database, self.admission, on_change=self.cache.clear)
+        self.similarity.engine = self.make_engine("v1")
+        self.views = ViewCounter(self.database)
+
+        for name, value in (
+            ("database", self.database),
+            ("similarity", self.similarity),
+            ("similar_cache", self.cache),
+            ("admission", self.admission),
+            ("views", self.views),
+        ):
+            patcher = mock.patch.object(similar_router, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.include_router(similar_router.router, prefix="/similar")
+        self.client = self.enterContext(TestClient(app))
+
+    def make_engine(self, version: str) -> IndexSimilarSearchEngine:
+        ids = [book_id for book_id in self.vectors if book_id not in self.WITHOUT_EMBEDDING]
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(DIM))
+        index.add_with_ids(np.vstack([self.vectors[book_id].vec for book_id in ids]).astype(np.float32), np.asarray(ids, dtype=np.int64))
+        books = {
+            book_id: Book(archive_name="a.zip", file_name=f"{book_id}.fb2", id=book_id, title=f"Книга {book_id}", author=f"Автор {book_id}")
+            for book_id in ids
+        }
+        return IndexSimilarSearchEngine(index=index, books=books, limit=10, version=version, tombstones=Tombstones())
+
+    def execute(self, sql: str, params: tuple = ()):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute(sql, params)
+
+    def store_similar(self, book_id: int, similar_ids: list[int]):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany(
+                "INSERT INTO similar (book_id, similar_book_id, score) VALUES (?, ?, ?)",
+                [(book_id, similar_id, 1.0 - position / 100) for position, similar_id in enumerate(similar_ids)],
+            )
@@ -0,0 +1,137 @@
+import json
+import unittest
+from unittest import mock
+
+from app.services import AdmissionController, AdmissionRejected
+from tests.similar_api import SimilarApiTestCase, similar_router
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_queue_and_client_limits(self):
+        admission = AdmissionController(max_pending=3, per_client=2, retry_after=5)
+        tickets = [admission.acquire("a"), admission.acquire("a")]
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admission.acquire("a")
+        self.assertEqual((rejected.exception.reason, rejected.exception.retry_after), ("client_limit", 5))
+
+        tickets.append(admission.acquire("b"))
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admission.acquire("c")
+        self.assertEqual(rejected.exception.reason, "queue_full")
+
+        for ticket in tickets:
+            admission.release(ticket)
+        self.assertEqual(admission.stats()["pending"], 0)
+        self.assertEqual(admission.stats()["clients"], 0)
+        self.assertEqual(admission.stats()["rejected"], {"client_limit": 1, "queue_full": 1})
+        admission.acquire("a")
+
+    def test_batch_cost_is_capped_by_client_limit(self):
+        admission = AdmissionController(max_pending=5, per_client=3, retry_after=5)
+        batch = admission.acquire("a", cost=200)
+        self.assertEqual((batch.cost, admission.pending), (3, 3))
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admission.acquire("a")
+        self.assertEqual(rejected.exception.reason, "client_limit")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admission.acquire("b", cost=3)
+        self.assertEqual(rejected.exception.reason, "queue_full")
+
+        admission.release(batch)
+        self.assertEqual(admission.stats()["pending"], 0)
+        self.assertEqual(admission.stats()["clients"], 0)
+
+
+class TestSimilarApiAdmission(SimilarApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # TestClient подключается с адреса "testclient": считаем его своим прокси
+        patcher = mock.patch.object(similar_router, "TRUSTED_PROXIES", {"testclient"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, file: str, client: str = "client"):
+        return self.client.get("/similar/api", params={"file": file, "limit": 3}, headers={"X-Forwarded-For": client})
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        for client in ("a", "b", "a", "b"):
+            self.admission.acquire(client)
+
+        response = self.get("1.fb2")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "3")
+        self.assertEqual(response.json()["reason"], "queue_full")
+
+        batch = self.client.post("/similar/batch", json={"files": ["1.fb2"], "limit": 3})
+        self.assertEqual(batch.status_code, 503)
+        self.assertEqual(batch.headers["Retry-After"], "3")
+
+    def test_client_limit_applies_only_to_that_client(self):
+        self.admission.acquire("greedy")
+        self.admission.acquire("greedy")
+
+        response = self.get("1.fb2", client="greedy")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["reason"], "client_limit")
+
+        self.assertEqual(self.get("1.fb2", client="other").status_code, 200)
+
+    def test_forwarded_header_is_ignored_without_trusted_proxy(self):
+        self.admission.acquire("testclient")
+        self.admission.acquire("testclient")
+
+        with mock.patch.object(similar_router, "TRUSTED_PROXIES", set()):
+            for client in ("x", "y", "z"):
+                response = self.get("1.fb2", client=client)
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.json()["reason"], "client_limit")
+
+    def test_batch_pays_for_every_book_it_computes(self):
+        response = self.client.post("/similar/batch", json={"files": [f"{i}.fb2" for i in range(1, 6)], "limit": 3})
+        self.assertEqual(response.status_code, 200)
+
+        self.admission.acquire("testclient")
+        response = self.client.post("/similar/batch", json={"files": ["6.fb2", "7.fb2"], "limit": 3})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["reason"], "client_limit")
+
+    def test_ready_results_need_no_ticket(self):
+        self.store_similar(1, [2, 3])
+        for client in ("a", "b", "a", "b"):
+            self.admission.acquire(client)
+
+        self.assertEqual(self.get("1.fb2").status_code, 200)
+
+    def test_book_without_vector_takes_no_ticket(self):
+        with mock.patch.object(self.admission, "acquire", wraps=self.admission.acquire) as acquire:
+            events = self.client.get("/similar/events", params={"file": "20.fb2", "limit": 3})
+            api = self.get("20.fb2")
+
+        event = json.loads(events.text.removeprefix("data: "))
+        self.assertEqual(event, {"type": "error", "message": "Для книги не сгенерирован вектор"})
+        self.assertEqual(api.status_code, 404)
+        acquire.assert_not_called()
+        self.assertEqual(self.admission.pending, 0)
+
+    def test_ticket_is_released_when_search_fails(self):
+        with mock.patch.object(self.coalescer, "search", side_effect=RuntimeError("индекс недоступен")):
+            response = self.get("1.fb2")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.admission.pending, 0)
+
+        with mock.patch.object(self.coalescer, "search_many", side_effect=RuntimeError("индекс недоступен")):
+            response = self.client.post("/similar/batch", json={"files": ["1.fb2", "2.fb2"], "limit": 3})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.admission.pending, 0)
+
+    def test_ticket_is_released_after_successful_search(self):
+        self.assertEqual(self.get("1.fb2").status_code, 200)
+        self.assertEqual(self.client.post("/similar/batch", json={"files": ["2.fb2"], "limit": 3}).status_code, 200)
+        self.assertEqual(self.admission.pending, 0)
+        self.assertEqual(self.admission.accepted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from app.db import AsyncDatabase
+
+
+def insert(conn, value: int, started: threading.Event | None = None, release: threading.Event | None = None):
+    conn.execute("INSERT INTO items (value) VALUES (?)", (value,))
+    if started is not None:
+        started.set()
+        release.wait(5)
+
+def count(conn) -> int:
+    return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+def connection_info(conn) -> tuple[str, int]:
+    return threading.current_thread().name, id(conn)
+
+def fail_after_insert(conn):
+    conn.execute("INSERT INTO items (value) VALUES (-1)")
+    raise ValueError("ошибка в транзакции")
+
+
+class TestAsyncDatabase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.db_file = os.path.join(self.dir.name, "data.db")
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("CREATE TABLE items (value INTEGER)")
+
+        self.database = AsyncDatabase(self.db_file, readers=2)
+        self.addCleanup(self.database.close)
+
+    def test_reads_are_not_blocked_by_open_write(self):
+        started, release = threading.Event(), threading.Event()
+
+        async def run():
+            write = asyncio.create_task(self.database.write(insert, 1, started, release))
+            await asyncio.to_thread(started.wait, 5)
+
+            # транзакция записи открыта: читатели видят последнее зафиксированное состояние
+            counts = await asyncio.wait_for(asyncio.gather(*[self.database.read(count) for _ in range(4)]), timeout=2)
+            release.set()
+            await write
+            return counts, await self.database.read(count)
+
+        during, after = asyncio.run(run())
+        self.assertEqual(during, [0, 0, 0, 0])
+        self.assertEqual(after, 1)
+
+    def test_write_error_reaches_caller_and_rolls_back(self):
+        async def run():
+            with self.assertRaises(ValueError):
+                await self.database.write(fail_after_insert)
+            await self.database.write(insert, 2)
+            return await self.database.read(count)
+
+        self.assertEqual(asyncio.run(run()), 1)
+
+    def test_connections_are_confined_to_pool_threads(self):
+        async def run():
+            writes = await asyncio.gather(*[self.database.write(connection_info) for _ in range(5)])
+            reads = await asyncio.gather(*[self.database.read(connection_info) for _ in range(20)])
+            return writes, reads
+
+        writes, reads = asyncio.run(run())
+
+        # один писатель: все записи в одном потоке на одном соединении
+        self.assertEqual(len(set(writes)), 1)
+        self.assertTrue(writes[0][0].startswith("db-write"))
+
+        # у каждого reader-потока своё соединение, отдельное от писателя
+        self.assertTrue(all(thread.startswith("db-read") for thread, _ in reads))
+        self.assertLessEqual(len({thread for thread, _ in reads}), 2)
+        self.assertEqual(len({thread for thread, _ in reads}), len({conn for _, conn in reads}))
+        self.assertNotIn(writes[0][1], {conn for _, conn in reads})
+
+    def test_close_releases_connections_and_database_stays_usable(self):
+        asyncio.run(self.database.write(insert, 3))
+        connections = list(self.database._connections)
+
+        self.database.close()
+
+        self.assertEqual(self.database._connections, [])
+        for conn in connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        self.assertEqual(asyncio.run(self.database.read(count)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
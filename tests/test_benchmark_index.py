@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+
+from app.benchmark_index import format_table, run_benchmark
+from app.models import EmbeddingMatrix
+
+
+def make_matrix(count: int = 400, dim: int = 8) -> EmbeddingMatrix:
+    vectors = np.random.default_rng(0).normal(size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return EmbeddingMatrix(np.arange(1, count + 1, dtype=np.int64) * 3, vectors)
+
+
+class TestBenchmarkIndex(unittest.TestCase):
+    def test_sweep_reports_recall_against_exact_search(self):
+        report = run_benchmark(make_matrix(), ["hnsw_flat"], [8], [4, 200], [], queries=50, threads=1)
+        rows = {row["config"]: row for row in report["results"]}
+
+        self.assertEqual(list(rows), ["flat", "hnsw_flat M=8 ef=4", "hnsw_flat M=8 ef=200"])
+        self.assertEqual(rows["flat"]["recall@100"], 1.0)
+        self.assertGreater(rows["hnsw_flat M=8 ef=200"]["recall@100"], rows["hnsw_flat M=8 ef=4"]["recall@100"])
+        for row in rows.values():
+            self.assertGreater(row["qps"], 0)
+            self.assertLessEqual(row["p50_ms"], row["p99_ms"])
+
+        table = format_table(report).splitlines()
+        self.assertEqual(len(table), 2 + len(rows))
+        self.assertTrue(table[2].startswith("flat"))
+
+
+if __name__ == "__main__":
+    unittest.main()
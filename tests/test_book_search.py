@@ -0,0 +1,39 @@
+import sqlite3
+import unittest
+from pathlib import Path
+
+from app.db import BookRepository, migrate
+
+
+class TestBookSearch(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(Path(migrate.__file__).with_name("schema.sql").read_text(encoding="utf-8"))
+
+    def tearDown(self):
+        self.conn.close()
+
+    def add(self, file_name: str, title: str, author: str):
+        self.conn.execute(
+            "INSERT INTO books (book, archive, title, author) VALUES (?, ?, ?, ?)",
+            (file_name, "a.zip", title, author),
+        )
+
+    def test_fts_query_quotes_tokens_and_prefixes_last(self):
+        self.assertEqual(BookRepository.fts_query('Война "и ми'), '"Война" "и" "ми"*')
+        self.assertEqual(BookRepository.fts_query("ёж и"), '"еж" "и"')
+        self.assertIsNone(BookRepository.fts_query(" *() "))
+
+    def test_search_prefers_title_and_follows_updates(self):
+        self.add("1.fb2", "Про Толстого", "Петров,Пётр")
+        self.add("2.fb2", "Война и мир", "Толстой,Лев")
+        self.add("3.fb2", "Ёлка", "Иванов,Иван")
+
+        self.assertEqual([row["book"] for row in BookRepository().search(self.conn, "толст", 10)], ["1.fb2", "2.fb2"])
+        self.assertEqual([row["book"] for row in BookRepository().search(self.conn, "елк", 10)], ["3.fb2"])
+
+        self.conn.execute("UPDATE books SET title = 'Сосна' WHERE book = '3.fb2'")
+        self.assertEqual(BookRepository().search(self.conn, "елк", 10), [])
+        self.conn.execute("DELETE FROM books WHERE book = '3.fb2'")
+        self.assertEqual(BookRepository().search(self.conn, "сосн", 10), [])
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from app.db import migrate
+from app.models import Embedding, EmbeddingMatrix
+
+
+class TestEmbeddingMatrix(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.db_file = os.path.join(self.dir.name, "data.db")
+
+        rng = np.random.default_rng(0)
+        self.rows = [(book_id, Embedding(rng.normal(size=8)).to_db()) for book_id in range(3, 300, 7)]
+        self.rows[5] = (self.rows[5][0], np.zeros(8, dtype=np.float32).tobytes())
+        # вектор, записанный в обход to_db, должен быть нормирован при загрузке
+        self.rows[6] = (self.rows[6][0], (np.ones(8, dtype=np.float32) * 3).tobytes())
+
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executescript(Path(migrate.__file__).with_name("schema.sql").read_text(encoding="utf-8"))
+            conn.executemany("INSERT INTO embeddings (book_id, embedding) VALUES (?, ?)", self.rows)
+
+        patcher = mock.patch("app.db.connection.DB_FILE", self.db_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parallel_load_matches_row_by_row_decoding(self):
+        matrix = EmbeddingMatrix.load(workers=4)
+        expected = [(book_id, Embedding.from_db(blob)) for book_id, blob in self.rows]
+
+        self.assertEqual(matrix.skipped_ids, [self.rows[5][0]])
+        self.assertEqual(list(matrix.ids), [book_id for book_id, emb in expected if emb is not None])
+        self.assertTrue(matrix.vectors.flags["C_CONTIGUOUS"])
+        for book_id, emb in expected:
+            if emb is not None:
+                np.testing.assert_allclose(matrix.get(book_id), emb.vec, rtol=1e-6)
+
+        self.assertIsNone(matrix.get(self.rows[5][0]))
+        self.assertIsNone(matrix.get(4))
+
+    def test_from_rows_looks_up_unsorted_ids(self):
+        matrix = EmbeddingMatrix.from_rows(list(reversed(self.rows[:4])))
+
+        self.assertEqual(matrix.row(self.rows[0][0]), 3)
+        np.testing.assert_allclose(matrix.get(self.rows[1][0]), Embedding.from_db(self.rows[1][1]).vec, rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
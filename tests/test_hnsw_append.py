@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.hnsw import HNSW, IndexOutOfSync
+from app.models import Embedding
+
+
+def make_rows(ids: list[int], dim: int = 8) -> list[tuple[int, bytes]]:
+    rng = np.random.default_rng(ids[0])
+    return [(book_id, Embedding(rng.normal(size=dim).astype(np.float32)).to_db()) for book_id in ids]
+
+
+class TestHNSWAppend(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.index_file = os.path.join(self.dir.name, "index.faiss")
+
+    def build(self, ids: list[int]):
+        hnsw = HNSW(index_file=self.index_file, batch_size=16)
+        hnsw.load_emb(make_rows(ids))
+        return hnsw.generate_and_save()
+
+    def test_append_adds_only_new_ids_and_keeps_labels(self):
+        self.build([3, 5, 9])
+        rows = make_rows([12, 15])
+
+        hnsw = HNSW(index_file=self.index_file, batch_size=16)
+        index = hnsw.load_from_file()
+        hnsw.load_emb(rows)
+        self.assertEqual(hnsw.append(index), 2)
+
+        reloaded = HNSW(index_file=self.index_file).load_from_file()
+        self.assertEqual(list(HNSW.get_ids(reloaded)), [3, 5, 9, 12, 15])
+        HNSW.verify(reloaded, 5, 3, 15)
+
+        _, labels = reloaded.search(Embedding.from_db(rows[1][1]).vec.reshape(1, -1), 1)
+        self.assertEqual(labels[0][0], 15)
+
+    def test_append_rejects_ids_already_covered(self):
+        index = self.build([3, 5, 9])
+        hnsw = HNSW(index_file=self.index_file)
+        hnsw.load_emb(make_rows([7]))
+
+        with self.assertRaises(IndexOutOfSync):
+            hnsw.append(index)
+
+    def test_verify_detects_count_and_range_mismatch(self):
+        index = self.build([3, 5, 9])
+
+        with self.assertRaises(IndexOutOfSync):
+            HNSW.verify(index, 4, 3, 10)
+        with self.assertRaises(IndexOutOfSync):
+            HNSW.verify(index, 3, 1, 9)
+
+    def test_zero_vectors_are_skipped_and_recorded(self):
+        rows = make_rows([1, 2, 3])
+        rows[1] = (2, np.zeros(8, dtype=np.float32).tobytes())
+
+        hnsw = HNSW(index_file=self.index_file, batch_size=16)
+        hnsw.load_emb(rows)
+        index = hnsw.generate_and_save()
+
+        self.assertEqual(list(HNSW.get_ids(index)), [1, 3])
+        self.assertEqual(hnsw.read_meta()["skipped_ids"], [2])
+        HNSW.verify(index, 3, 1, 3, hnsw.read_meta()["skipped_ids"])
+
+    def test_load_rejects_index_not_matching_meta(self):
+        self.build([3, 5, 9])
+        other = os.path.join(self.dir.name, "other.faiss")
+        hnsw = HNSW(index_file=other, batch_size=16)
+        hnsw.load_emb(make_rows([3, 5, 10]))
+        hnsw.generate_and_save()
+        os.replace(hnsw.current_file(), HNSW(index_file=self.index_file).current_file())
+
+        with self.assertRaises(IndexOutOfSync):
+            HNSW(index_file=self.index_file).load_from_file()
+
+    def test_quantized_index_type_is_built_and_loaded(self):
+        hnsw = HNSW(index_file=self.index_file, batch_size=64, index_type="hnsw_sq8")
+        hnsw.load_emb(make_rows(list(range(1, 301))))
+        hnsw.generate_and_save()
+
+        meta = hnsw.read_meta()
+        index = HNSW(index_file=self.index_file).load_from_file()
+
+        self.assertEqual(meta["index_type"], "hnsw_sq8")
+        self.assertGreater(meta["recall_at_10"], 0.8)
+        self.assertEqual(type(HNSW.get_base(index)).__name__, "IndexHNSWSQ")
+
+    def test_streaming_build_matches_in_memory_build(self):
+        rows = make_rows(list(range(1, 201)))
+        rows[50] = (51, np.zeros(8, dtype=np.float32).tobytes())
+        chunks = [rows[i:i + 37] for i in range(0, len(rows), 37)]
+
+        hnsw = HNSW(index_file=self.index_file, threads=2)
+        index = hnsw.generate_streaming(iter(chunks), len(rows), rows[::3])
+        meta = hnsw.read_meta()
+
+        self.assertEqual(list(HNSW.get_ids(index)), [i for i in range(1, 201) if i != 51])
+        self.assertEqual(meta["skipped_ids"], [51])
+        self.assertGreater(meta["recall_at_10"], 0.9)
+        HNSW.verify(HNSW(index_file=self.index_file).load_from_file(), 200, 1, 200, meta["skipped_ids"])
+
+    def test_unknown_index_type_is_rejected(self):
+        with self.assertRaises(ValueError):
+            HNSW(index_file=self.index_file, index_type="lsh")
+
+
+if __name__ == "__main__":
+    unittest.main()
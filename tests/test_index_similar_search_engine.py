@@ -0,0 +1,103 @@
+import unittest
+
+import faiss
+import numpy as np
+
+from app.metrics import FILTERED_CANDIDATES
+from app.models import Book, Embedding
+from app.searchEngines.similarSearch.indexSimilarSearchEngine import IndexSimilarSearchEngine
+
+
+class RecordingIndex:
+    def __init__(self, vectors: np.ndarray):
+        self._index = faiss.IndexFlatIP(vectors.shape[1])
+        self._index.add(vectors)
+        self.ntotal = self._index.ntotal
+        self.ks = []
+
+    def search(self, queries, k):
+        self.ks.append(k)
+        return self._index.search(queries, k)
+
+
+def make_engine(duplicates: int, limit: int = 5) -> tuple[IndexSimilarSearchEngine, RecordingIndex, Embedding]:
+    rng = np.random.default_rng(0)
+    query = np.ones(8, dtype=np.float32) / np.sqrt(8)
+
+    # первые duplicates векторов — почти копии запроса с одинаковым названием и автором
+    vectors = rng.normal(size=(500, 8)).astype(np.float32)
+    vectors[:duplicates] = query + rng.normal(scale=0.01, size=(duplicates, 8))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    books = [
+        Book(
+            archive_name="a.zip",
+            file_name=f"{i}.fb2",
+            id=i,
+            title="Копия" if i < duplicates else f"Книга {i}",
+            author="Автор",
+        )
+        for i in range(len(vectors))
+    ]
+    index = RecordingIndex(vectors)
+    engine = IndexSimilarSearchEngine(index=index, books=books, limit=limit)
+    return engine, index, Embedding(query)
+
+
+class TestAdaptiveOverfetch(unittest.TestCase):
+    def test_common_case_uses_small_k(self):
+        engine, index, query = make_engine(duplicates=0)
+        source = Book(archive_name="a.zip", file_name="src.fb2", id=-1, title="Источник")
+
+        result = engine.search(source, query)
+
+        self.assertEqual(len(result), 5)
+        self.assertEqual(index.ks, [engine.fetch_k()])
+        self.assertLess(engine.fetch_k(), engine.max_k())
+
+    def test_widens_when_duplicates_eat_the_window(self):
+        engine, index, query = make_engine(duplicates=150)
+        source = Book(archive_name="a.zip", file_name="src.fb2", id=-1, title="Источник")
+
+        result = engine.search(source, query)
+        scores, indices = index._index.search(np.array([query.vec]), engine.max_k())
+        exhaustive = engine.collect(source, scores[0], indices[0])
+
+        self.assertGreater(len(index.ks), 1)
+        self.assertEqual([r[2] for r in result], [r[2] for r in exhaustive])
+
+    def test_skipped_candidates_are_counted_once_after_widening(self):
+        engine, index, query = make_engine(duplicates=150)
+        source = Book(archive_name="a.zip", file_name="src.fb2", id=-1, title="Источник")
+        reasons = (engine.SKIP_SAME_FILE, engine.SKIP_SAME_TITLE, engine.SKIP_DUPLICATE, engine.SKIP_INVALID, engine.SKIP_DELETED)
+        before = {reason: FILTERED_CANDIDATES.value(reason=reason) for reason in reasons}
+
+        engine.search(source, query)
+
+        scores, indices = index._index.search(np.array([query.vec]), index.ks[-1])
+        _, skipped = engine.filter(source, scores[0], indices[0])
+        self.assertGreater(len(index.ks), 1)
+        self.assertGreater(sum(skipped.values()), 0)
+        self.assertEqual(
+            {reason: FILTERED_CANDIDATES.value(reason=reason) - before[reason] for reason in reasons},
+            {reason: skipped[reason] for reason in reasons},
+        )
+
+    def test_search_batch_widens_only_short_rows(self):
+        short, index, query = make_engine(duplicates=150)
+        full = IndexSimilarSearchEngine(index=index, books=short.books, limit=5)
+        source = Book(archive_name="a.zip", file_name="src.fb2", id=-1, title="Источник")
+        other = Embedding(-query.vec)
+
+        results = IndexSimilarSearchEngine.search_batch([
+            (short, source, query, None, None),
+            (full, source, other, None, None),
+        ])
+
+        self.assertEqual([len(r) for r in results], [5, 5])
+        self.assertEqual(index.ks[0], short.fetch_k())
+        self.assertTrue(all(k > short.fetch_k() for k in index.ks[1:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
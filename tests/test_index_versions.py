@@ -0,0 +1,156 @@
+import asyncio
+import glob
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import faiss
+import numpy as np
+
+from app.hnsw import HNSW
+from app.models import Embedding
+from app.services.similarity import Similarity
+
+
+def make_rows(ids: list[int], dim: int = 8) -> list[tuple[int, bytes]]:
+    rng = np.random.default_rng(ids[0])
+    return [(book_id, Embedding(rng.normal(size=dim).astype(np.float32)).to_db()) for book_id in ids]
+
+
+class TestIndexVersions(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.index_file = os.path.join(self.dir.name, "index.faiss")
+
+    def build(self, ids: list[int]) -> HNSW:
+        hnsw = HNSW(index_file=self.index_file, batch_size=16)
+        hnsw.load_emb(make_rows(ids))
+        hnsw.generate_and_save()
+        return hnsw
+
+    def versions(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(self.dir.name, "index.v*.faiss")))
+
+    def test_build_is_published_through_manifest(self):
+        hnsw = self.build(list(range(1, 50)))
+        meta = hnsw.read_meta()
+
+        self.assertEqual(hnsw.current_file(), os.path.join(self.dir.name, meta["file"]))
+        self.assertEqual(hnsw.version(), meta["version"])
+        self.assertEqual(meta["sha256"], HNSW.checksum(hnsw.current_file()))
+        self.assertEqual(meta["size"], os.path.getsize(hnsw.current_file()))
+        self.assertFalse(os.path.exists(self.index_file))
+
+        reader = HNSW(index_file=self.index_file)
+        self.assertEqual(reader.load_from_file().ntotal, 49)
+        self.assertEqual(reader.loaded_version, meta["version"])
+
+    def test_old_versions_are_removed_but_previous_is_kept(self):
+        first = self.build(list(range(1, 50))).version()
+        for _ in range(3):
+            self.build(list(range(1, 50)))
+
+        self.assertEqual(len(self.versions()), 2)
+        self.assertNotIn(HNSW(index_file=self.index_file).version_file(first), self.versions())
+
+    def test_legacy_index_is_loaded_and_replaced_on_next_build(self):
+        legacy = faiss.IndexIDMap(faiss.IndexHNSWFlat(8, 8, faiss.METRIC_INNER_PRODUCT))
+        legacy.add_with_ids(np.eye(8, dtype=np.float32), np.arange(1, 9, dtype=np.int64))
+        faiss.write_index(legacy, self.index_file)
+
+        reader = HNSW(index_file=self.index_file)
+        self.assertEqual(reader.load_from_file().ntotal, 8)
+        self.assertIsNotNone(reader.loaded_version)
+
+        self.build(list(range(1, 50)))
+        self.assertFalse(os.path.exists(self.index_file))
+        self.assertEqual(HNSW(index_file=self.index_file).load_from_file().ntotal, 49)
+
+    def test_mapped_reader_survives_new_publications(self):
+        self.build(list(range(1, 50)))
+        index = HNSW(index_file=self.index_file, mmap=True).load_from_file()
+        queries = np.frombuffer(make_rows([1])[0][1], dtype=np.float32).reshape(1, -1)
+
+        for _ in range(3):
+            self.build(list(range(100, 200)))
+
+        _, labels = index.search(queries, 5)
+        self.assertTrue(np.all((labels >= 1) & (labels < 50)))
+
+
+class TestEngineReload(unittest.TestCase):
+    def make_engine(self, version: str):
+        return SimpleNamespace(version=version, index=SimpleNamespace(ntotal=10), books={}, close=mock.Mock())
+
+    def test_engine_is_swapped_only_when_version_changes(self):
+        similarity = Similarity(None, None, None)
+        old = similarity.engine = self.make_engine("v1")
+        fresh = self.make_engine("v2")
+
+        factory = "app.services.similarity.SimilarSearchEngineFactory"
+        with mock.patch(f"{factory}.current_version", return_value="v1"), mock.patch(f"{factory}.create") as create:
+            self.assertFalse(similarity.reload_engine())
+            create.assert_not_called()
+
+        with mock.patch(f"{factory}.current_version", return_value="v2"), mock.patch(f"{factory}.create", return_value=fresh):
+            self.assertTrue(similarity.reload_engine())
+
+        self.assertIs(similarity.engine, fresh)
+        self.assertEqual(old.version, "v1")
+        old.close.assert_called_once()
+
+    def test_old_engine_is_closed_after_in_flight_search(self):
+        similarity = Similarity(None, None, None)
+        old = similarity.engine = self.make_engine("v1")
+        fresh = self.make_engine("v2")
+
+        factory = "app.services.similarity.SimilarSearchEngineFactory"
+
+        async def run():
+            async with similarity.using_engine() as engine:
+                self.assertIs(engine, old)
+                with mock.patch(f"{factory}.current_version", return_value="v2"), mock.patch(f"{factory}.create", return_value=fresh):
+                    self.assertTrue(similarity.reload_engine())
+                old.close.assert_not_called()
+            old.close.assert_called_once()
+
+            async with similarity.using_engine() as engine:
+                self.assertIs(engine, fresh)
+            fresh.close.assert_not_called()
+        asyncio.run(run())
+
+    def test_index_published_after_startup_is_loaded(self):
+        changed = mock.Mock()
+        similarity = Similarity(None, None, None, on_change=changed)
+        fresh = self.make_engine("v1")
+
+        factory = "app.services.similarity.SimilarSearchEngineFactory"
+        with mock.patch(f"{factory}.create", side_effect=FileNotFoundError("нет индекса")):
+            self.assertFalse(similarity.reload_engine())
+        with mock.patch(f"{factory}.create", return_value=fresh):
+            self.assertTrue(similarity.reload_engine())
+
+        self.assertIs(similarity.engine, fresh)
+        changed.assert_called_once()
+
+    def test_failed_reload_keeps_serving_old_engine(self):
+        similarity = Similarity(None, None, None)
+        old = similarity.engine = self.make_engine("v1")
+
+        factory = "app.services.similarity.SimilarSearchEngineFactory"
+        with mock.patch(f"{factory}.current_version", return_value="v2"), \
+                mock.patch(f"{factory}.create", side_effect=ValueError("битый индекс")):
+            async def run():
+                task = asyncio.create_task(similarity.watch_index(0.01))
+                await asyncio.sleep(0.1)
+                task.cancel()
+            asyncio.run(run())
+
+        self.assertIs(similarity.engine, old)
+
+
+if __name__ == "__main__":
+    unittest.main()
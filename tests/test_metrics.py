@@ -0,0 +1,33 @@
+import unittest
+
+from app.metrics import Registry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_exposes_cumulative_buckets(self):
+        registry = Registry()
+        histogram = registry.histogram("stage_seconds", "Stage", labels=("op",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, op="read")
+        histogram.observe(0.5, op="read")
+        histogram.observe(5.0, op="read")
+
+        text = registry.expose()
+
+        self.assertIn("# TYPE stage_seconds histogram", text)
+        self.assertIn('stage_seconds_bucket{op="read",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_bucket{op="read",le="1.0"} 2', text)
+        self.assertIn('stage_seconds_bucket{op="read",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{op="read"} 3', text)
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = registry.counter("hits_total", "Hits", labels=("result",))
+        counter.inc(result="hit")
+        counter.inc(2, result="hit")
+        registry.gauge("pending", "Pending").set_function(lambda: 7)
+
+        text = registry.expose()
+
+        self.assertIn('hits_total{result="hit"} 3', text)
+        self.assertIn("pending 7", text)
+        self.assertIs(registry.counter("hits_total", "Hits"), counter)
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.models import Book, Embedding
+from app.searchEngines.similarSearch import SearchCancelled
+from app.services.search_coalescer import SearchCoalescer
+
+
+class FakeEngine:
+    def __init__(self, limit: int, calls: list, index: str = "index"):
+        self._limit = limit
+        self._calls = calls
+        self.index = index
+
+    def is_empty(self) -> bool:
+        return False
+
+    def fetch_k(self) -> int:
+        return self._limit * 2
+
+    def query(self, embeddings, k):
+        self._calls.append((len(embeddings), k))
+        rows = np.array([[e.vec[0]] * k for e in embeddings], dtype=np.float32)
+        return rows, np.tile(np.arange(k), (len(embeddings), 1))
+
+    def filter(self, source, scores, indices, progress_callback=None, should_stop=None):
+        if source.id < 0:
+            raise ValueError("bad source")
+        if progress_callback:
+            progress_callback(source.id)
+        return [(float(scores[0]), int(i)) for i in indices], Counter()
+
+    def record_skipped(self, skipped):
+        pass
+
+    def widen(self, k, candidates):
+        return None
+
+    def finish(self, source, candidates, should_stop=None):
+        return [(score, source.id, i) for score, i in candidates]
+
+
+def make_query(book_id: int) -> tuple[Book, Embedding]:
+    book = Book(archive_name="a.zip", file_name=f"{book_id}.fb2", id=book_id)
+    return book, Embedding(np.array([book_id, 1.0], dtype=np.float32))
+
+
+class TestSearchCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_concurrent_queries_share_one_index_search(self):
+        calls = []
+        coalescer = SearchCoalescer(self.executor, max_batch_size=10, max_wait_ms=20)
+
+        async def run():
+            return await asyncio.gather(*[
+                coalescer.search(FakeEngine(limit, calls), *make_query(book_id))
+                for book_id, limit in ((1, 1), (2, 3), (3, 2))
+            ])
+
+        results = asyncio.run(run())
+
+        self.assertEqual(calls, [(3, 6)])
+        # каждая строка обрезана до собственного k
+        self.assertEqual([len(r) for r in results], [2, 6, 4])
+        self.assertEqual([r[0][1] for r in results], [1, 2, 3])
+        self.assertEqual(results[1][0][0], 2.0)
+
+    def test_engines_of_different_index_versions_are_searched_separately(self):
+        calls = []
+        coalescer = SearchCoalescer(self.executor, max_batch_size=10, max_wait_ms=20)
+
+        async def run():
+            return await asyncio.gather(*[
+                coalescer.search(FakeEngine(1, calls, index), *make_query(book_id))
+                for book_id, index in ((1, "old"), (2, "new"), (3, "old"))
+            ])
+
+        results = asyncio.run(run())
+
+        self.assertEqual(sorted(calls), [(1, 2), (2, 2)])
+        self.assertEqual([r[0][1] for r in results], [1, 2, 3])
+
+    def test_batch_is_flushed_when_max_size_reached(self):
+        calls = []
+        coalescer = SearchCoalescer(self.executor, max_batch_size=2, max_wait_ms=10_000)
+
+        async def run():
+            return await asyncio.wait_for(asyncio.gather(*[
+                coalescer.search(FakeEngine(1, calls), *make_query(book_id))
+                for book_id in (1, 2, 3, 4)
+            ]), timeout=5)
+
+        asyncio.run(run())
+
+        self.assertEqual(calls, [(2, 2), (2, 2)])
+
+    def test_row_error_is_delivered_only_to_its_request(self):
+        coalescer = SearchCoalescer(self.executor, max_batch_size=10, max_wait_ms=5)
+
+        async def run():
+            return await asyncio.gather(
+                coalescer.search(FakeEngine(1, []), *make_query(-1)),
+                coalescer.search(FakeEngine(1, []), *make_query(2)),
+                return_exceptions=True,
+            )
+
+        bad, good = asyncio.run(run())
+
+        self.assertIsInstance(bad, ValueError)
+        self.assertEqual(good[0][1], 2)
+
+    def test_row_without_vector_does_not_fail_its_batch(self):
+        calls = []
+        coalescer = SearchCoalescer(self.executor, max_batch_size=10, max_wait_ms=5)
+        book, _ = make_query(2)
+
+        async def run():
+            return await asyncio.gather(
+                coalescer.search(FakeEngine(1, calls), *make_query(1)),
+                coalescer.search(FakeEngine(1, calls), book, None),
+            )
+
+        valid, vectorless = asyncio.run(run())
+
+        self.assertEqual(valid[0][1], 1)
+        self.assertEqual(vectorless, [])
+        self.assertEqual(calls, [(1, 2)])
+
+    def test_progress_is_reported_to_its_own_request(self):
+        coalescer = SearchCoalescer(self.executor, max_batch_size=10, max_wait_ms=5)
+        progress = {1: [], 2: []}
+
+        async def run():
+            await asyncio.gather(
+                coalescer.search(FakeEngine(1, []), *make_query(1), progress_callback=progress[1].append),
+                coalescer.search(FakeEngine(1, []), *make_query(2), progress_callback=progress[2].append),
+                coalescer.search(FakeEngine(1, []), *make_query(3)),
+            )
+
+        asyncio.run(run())
+
+        self.assertEqual(progress, {1: [1], 2: [2]})
+
+    def test_cancelled_queries_are_dropped_before_index_search(self):
+        calls = []
+        coalescer = SearchCoalescer(self.executor, max_batch_size=10, max_wait_ms=5)
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        async def run():
+            return await asyncio.gather(
+                coalescer.search(FakeEngine(1, calls), *make_query(1), cancel_event=cancel_event),
+                coalescer.search(FakeEngine(2, calls), *make_query(2)),
+                return_exceptions=True,
+            )
+
+        cancelled, alive = asyncio.run(run())
+
+        self.assertIsInstance(cancelled, SearchCancelled)
+        self.assertEqual(len(alive), 4)
+        self.assertEqual(calls, [(1, 4)])
+
+
+if __name__ == "__main__":
+    unittest.main()
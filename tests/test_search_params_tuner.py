@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.hnsw import HNSW, IndexOutOfSync, SearchParamsTuner
+from app.models import EmbeddingMatrix
+
+
+def make_matrix(count: int = 600, dim: int = 16) -> EmbeddingMatrix:
+    vectors = np.random.default_rng(0).normal(size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return EmbeddingMatrix(np.arange(1, count + 1, dtype=np.int64), vectors)
+
+
+class TestSearchParamsTuner(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.matrix = make_matrix()
+        self.hnsw = HNSW(index_file=os.path.join(self.dir.name, "index.faiss"), m=8, threads=1)
+        self.hnsw.load_matrix(self.matrix)
+        self.index = self.hnsw.generate_and_save()
+
+    def test_finds_smallest_ef_meeting_target(self):
+        tuner = SearchParamsTuner(self.index, self.matrix, target=0.97, recall_k=50, sample=100)
+        result = tuner.tune([60])
+        ef = result["ef_search"]
+
+        self.assertTrue(result["per_k"][0]["reached"])
+        self.assertGreaterEqual(tuner.recall(ef, 60), 0.97)
+        if ef > tuner.low:
+            self.assertLess(tuner.recall(ef - 1, 60), 0.97)
+
+    def test_saved_params_are_applied_on_load(self):
+        self.hnsw.update_meta({"search_params": {"ef_search": 77}})
+        index = HNSW(index_file=self.hnsw.index_file).load_from_file()
+        self.assertEqual(HNSW.get_base(index).hnsw.efSearch, 77)
+
+        self.hnsw.update_meta({"search_params": None})
+        self.assertNotIn("search_params", self.hnsw.read_meta())
+
+    def test_params_are_not_saved_over_newer_version(self):
+        tuned = self.hnsw.version()
+        self.hnsw.load_matrix(self.matrix)
+        self.hnsw.generate_and_save()
+
+        with self.assertRaises(IndexOutOfSync):
+            self.hnsw.update_meta({"search_params": {"ef_search": 77}}, version=tuned)
+        self.assertNotIn("search_params", self.hnsw.read_meta())
+
+        self.hnsw.update_meta({"search_params": {"ef_search": 77}}, version=self.hnsw.version())
+        self.assertEqual(self.hnsw.read_meta()["search_params"], {"ef_search": 77})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import faiss
+import numpy as np
+
+from app.hnsw import HNSW, Shard, ShardedIndex
+from app.hnsw.shards import RemoteShard
+from app.models import EmbeddingMatrix
+from app.shard_server import ShardServer
+
+
+def make_matrix(count: int = 300, dim: int = 8) -> EmbeddingMatrix:
+    vectors = np.random.default_rng(0).normal(size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return EmbeddingMatrix(np.arange(1, count + 1, dtype=np.int64), vectors)
+
+
+class FlatShard:
+    def __init__(self, name: str, matrix: EmbeddingMatrix, mask: np.ndarray):
+        self.name = name
+        self.index = faiss.IndexIDMap(faiss.IndexFlatIP(matrix.dim))
+        self.index.add_with_ids(matrix.vectors[mask], matrix.ids[mask])
+        self.ntotal = self.index.ntotal
+        self.d = self.index.d
+
+    def search(self, queries, k):
+        return self.index.search(queries, k)
+
+    def get_ids(self):
+        return HNSW.get_ids(self.index)
+
+    def version(self):
+        return self.name
+
+
+class BrokenShard(FlatShard):
+    def search(self, queries, k):
+        raise TimeoutError("нет ответа")
+
+
+class TestShardedIndex(unittest.TestCase):
+    def setUp(self):
+        self.matrix = make_matrix()
+        self.flat = faiss.IndexIDMap(faiss.IndexFlatIP(self.matrix.dim))
+        self.flat.add_with_ids(self.matrix.vectors, self.matrix.ids)
+
+    def test_plans_cover_every_id_exactly_once(self):
+        for scheme in ("range", "hash"):
+            shards = Shard.plan(3, scheme, int(self.matrix.ids.min()), int(self.matrix.ids.max()))
+            owners = np.sum([shard.contains(self.matrix.ids) for shard in shards], axis=0)
+            self.assertTrue(np.all(owners == 1), scheme)
+
+        self.assertEqual(Shard(1, 3, "range", 10, 20).where(), ("book_id >= ? AND book_id < ?", (10, 20)))
+        self.assertEqual(Shard(2, 3, "hash").where(), ("book_id % ? = ?", (3, 2)))
+
+    def test_merged_top_k_matches_single_index(self):
+        shards = Shard.plan(3, "hash", None, None)
+        index = ShardedIndex([FlatShard(s.name, self.matrix, s.contains(self.matrix.ids)) for s in shards])
+        queries = self.matrix.vectors[:20]
+
+        distances, labels = index.search(queries, 15)
+        expected_distances, expected_labels = self.flat.search(queries, 15)
+
+        np.testing.assert_array_equal(labels, expected_labels)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-6)
+        self.assertEqual(index.ntotal, len(self.matrix))
+        self.assertEqual(sorted(index.get_ids()), sorted(self.matrix.ids))
+
+    def test_failed_shard_is_skipped(self):
+        shards = Shard.plan(2, "hash", None, None)
+        alive = FlatShard("0/2", self.matrix, shards[0].contains(self.matrix.ids))
+        broken = BrokenShard("1/2", self.matrix, shards[1].contains(self.matrix.ids))
+
+        _, labels = ShardedIndex([alive, broken]).search(self.matrix.vectors[:5], 10)
+        self.assertTrue(np.all(np.isin(labels, alive.get_ids())))
+
+        with self.assertRaises(RuntimeError):
+            ShardedIndex([broken]).search(self.matrix.vectors[:5], 10)
+
+    def test_remote_shard_serves_search(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        patcher = mock.patch("app.hnsw.shards.INDEX_FILE", os.path.join(workdir.name, "index.faiss"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        shard = Shard(0, 1)
+        hnsw = HNSW(index_file=shard.index_file, threads=1)
+        hnsw.load_matrix(self.matrix)
+        hnsw.generate_and_save()
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = ShardServer(shard)
+        threading.Thread(target=server.serve, args=("127.0.0.1", port), daemon=True).start()
+
+        remote = None
+        for _ in range(50):
+            try:
+                remote = RemoteShard("0/1", f"127.0.0.1:{port}")
+                break
+            except ConnectionRefusedError:
+                threading.Event().wait(0.05)
+
+        self.assertIsNotNone(remote)
+        self.assertEqual(remote.ntotal, len(self.matrix))
+        _, labels = remote.search(self.matrix.vectors[:3], 1)
+        self.assertEqual(list(labels[:, 0]), list(self.matrix.ids[:3]))
+
+    def test_non_loopback_host_requires_authkey(self):
+        server = ShardServer.__new__(ShardServer)
+        with self.assertRaises(ValueError):
+            server.serve("0.0.0.0", 0, authkey=None)
+        with self.assertRaises(ValueError):
+            RemoteShard("0/1", "10.0.0.1:9000", authkey=None)
+
+
+if __name__ == "__main__":
+    unittest.main()
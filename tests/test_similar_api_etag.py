@@ -0,0 +1,64 @@
+import unittest
+
+from app.db import TombstoneRepository, db
+from tests.similar_api import SimilarApiTestCase
+
+
+class TestSimilarApiEtag(SimilarApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.store_similar(1, [2, 3, 4])
+
+    def get(self, etag: str | None = None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get("/similar/api", params={"file": "1.fb2", "limit": 3}, headers=headers)
+
+    def assert_revalidates(self, etag: str) -> str:
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(self.get(response.headers["ETag"]).status_code, 304)
+        return response.headers["ETag"]
+
+    def test_matching_etag_returns_304_without_body(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["file_name"] for item in response.json()["items"]], ["2.fb2", "3.fb2", "4.fb2"])
+        etag = response.headers["ETag"]
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            cached = self.get(header)
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.content, b"")
+            self.assertEqual(cached.headers["ETag"], etag)
+
+        self.assertEqual(self.get('"other"').status_code, 200)
+
+    def test_new_index_version_invalidates_etag(self):
+        etag = self.get().headers["ETag"]
+        self.similarity.engine = self.make_engine("v2")
+        self.assert_revalidates(etag)
+
+    def test_new_tombstones_invalidate_etag(self):
+        etag = self.get().headers["ETag"]
+        with db() as conn:
+            TombstoneRepository().add(conn, [7], "inpx_deleted")
+        self.assertTrue(self.similarity.refresh_tombstones())
+        self.assert_revalidates(etag)
+
+    def test_feedback_change_invalidates_etag(self):
+        etag = self.get().headers["ETag"]
+        self.execute("INSERT INTO feedback (source_book_id, candidate_book_id, label) VALUES (1, 2, 1.0)")
+        etag = self.assert_revalidates(etag)
+
+        self.execute("DELETE FROM feedback WHERE source_book_id = 1")
+        self.assert_revalidates(etag)
+
+    def test_feedback_for_other_book_keeps_etag(self):
+        etag = self.get().headers["ETag"]
+        self.execute("INSERT INTO feedback (source_book_id, candidate_book_id, label) VALUES (2, 1, 1.0)")
+        self.assertEqual(self.get(etag).status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
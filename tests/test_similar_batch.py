@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+from tests.similar_api import SimilarApiTestCase
+
+
+class TestSimilarBatch(SimilarApiTestCase):
+    def post(self, files: list[str], limit: int = 3):
+        return self.client.post("/similar/batch", json={"files": files, "limit": limit})
+
+    def test_db_hits_and_misses_are_combined(self):
+        self.store_similar(1, [5, 6, 7])
+
+        with mock.patch.object(self.coalescer, "search_many", wraps=self.coalescer.search_many) as search_many:
+            response = self.post(["1.fb2", "2.fb2", "3.fb2"])
+
+        self.assertEqual(response.status_code, 200)
+        items = response.json()["items"]
+        self.assertEqual(set(items), {"1.fb2", "2.fb2", "3.fb2"})
+        self.assertEqual([item["file_name"] for item in items["1.fb2"]], ["5.fb2", "6.fb2", "7.fb2"])
+        self.assertTrue(all(len(items[file]) == 3 for file in ("2.fb2", "3.fb2")))
+
+        # промахи ищутся одним батчем, готовые соседи из базы в поиск не попадают
+        search_many.assert_called_once()
+        self.assertEqual([book.id for book in search_many.call_args.args[1]], [2, 3])
+        self.assertEqual(response.json()["missing"], [])
+
+    def test_computed_results_are_saved_for_next_request(self):
+        self.post(["2.fb2"])
+
+        with mock.patch.object(self.coalescer, "search_many") as search_many:
+            response = self.post(["2.fb2"])
+        search_many.assert_not_called()
+        self.assertEqual(len(response.json()["items"]["2.fb2"]), 3)
+
+    def test_duplicate_files_are_searched_once(self):
+        with mock.patch.object(self.coalescer, "search_many", wraps=self.coalescer.search_many) as search_many:
+            response = self.post(["2.fb2", "3.fb2", "2.fb2"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book.id for book in search_many.call_args.args[1]], [2, 3])
+        self.assertEqual(set(response.json()["items"]), {"2.fb2", "3.fb2"})
+
+    def test_unknown_books_and_books_without_embedding_are_missing(self):
+        response = self.post(["unknown.fb2", "20.fb2", "4.fb2", "unknown.fb2"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["items"]), ["4.fb2"])
+        self.assertEqual(response.json()["missing"], ["unknown.fb2", "20.fb2"])
+
+    def test_only_missing_books_need_no_search(self):
+        with mock.patch.object(self.coalescer, "search_many") as search_many:
+            response = self.post(["20.fb2"])
+
+        search_many.assert_not_called()
+        self.assertEqual(response.json(), {"items": {}, "missing": ["20.fb2"]})
+
+    def test_request_is_validated(self):
+        self.assertEqual(self.post([]).status_code, 422)
+        self.assertEqual(self.post(["1.fb2"], limit=101).status_code, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from app.services.similar_cache import SimilarCache
+
+
+class TestSimilarCache(unittest.TestCase):
+    def test_lru_eviction_and_hit_rate(self):
+        cache = SimilarCache(max_entries=2)
+        cache.put((1, 10, False), "a", cache.generation(1))
+        cache.put((2, 10, False), "b", cache.generation(2))
+
+        self.assertEqual(cache.get((1, 10, False)), "a")
+        cache.put((3, 10, False), "c", cache.generation(3))
+
+        self.assertIsNone(cache.get((2, 10, False)))
+        self.assertEqual(cache.get((3, 10, False)), "c")
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+
+    def test_invalidate_book_evicts_only_that_book(self):
+        cache = SimilarCache(max_entries=10)
+        for key in ((1, 10, False), (1, 50, True), (2, 10, False)):
+            cache.put(key, "html", cache.generation(key[0]))
+
+        self.assertEqual(cache.invalidate_book(1), 2)
+
+        self.assertIsNone(cache.get((1, 10, False)))
+        self.assertIsNone(cache.get((1, 50, True)))
+        self.assertEqual(cache.get((2, 10, False)), "html")
+
+    def test_put_with_stale_generation_is_ignored(self):
+        cache = SimilarCache(max_entries=10)
+        generation = cache.generation(1)
+        cache.invalidate_book(1)
+
+        cache.put((1, 10, False), "stale", generation)
+
+        self.assertIsNone(cache.get((1, 10, False)))
+
+    def test_clear_rejects_renders_started_before_it(self):
+        cache = SimilarCache(max_entries=10)
+        generation = cache.generation(7)
+        cache.clear()
+
+        cache.put((7, 10, False), "old engine", generation)
+
+        self.assertIsNone(cache.get((7, 10, False)))
+        cache.put((7, 10, False), "new engine", cache.generation(7))
+        self.assertEqual(cache.get((7, 10, False)), "new engine")
+
+    def test_generations_are_bounded(self):
+        cache = SimilarCache(max_entries=2)
+        cache.put((500, 10, False), "kept", cache.generation(500))
+        in_flight = cache.generation(3)
+        for book_id in range(100):
+            cache.invalidate_book(book_id)
+
+        self.assertLessEqual(len(cache._generations), 2)
+        self.assertEqual(cache.get((500, 10, False)), "kept")
+        cache.put((3, 10, False), "stale", in_flight)
+        self.assertIsNone(cache.get((3, 10, False)))
+
+        cache.put((3, 10, False), "fresh", cache.generation(3))
+        self.assertEqual(cache.get((3, 10, False)), "fresh")
+
+
+if __name__ == "__main__":
+    unittest.main()
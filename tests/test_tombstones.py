@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from app.db import db, migrate, TombstoneRepository
+from app.hnsw import HNSW, IndexBuilder, IndexCompactor
+from app.models import Book, Embedding, Tombstones
+from app.searchEngines.similarSearch.indexSimilarSearchEngine import IndexSimilarSearchEngine
+
+
+class TestTombstones(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.db_file = os.path.join(self.dir.name, "data.db")
+        self.index_file = os.path.join(self.dir.name, "index.faiss")
+
+        rng = np.random.default_rng(0)
+        self.ids = list(range(1, 101))
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executescript(Path(migrate.__file__).with_name("schema.sql").read_text(encoding="utf-8"))
+            conn.executemany(
+                "INSERT INTO books (id, book, archive, title, author) VALUES (?, ?, 'a.zip', ?, 'Автор')",
+                [(book_id, f"{book_id}.fb2", f"Книга {book_id}") for book_id in self.ids],
+            )
+            conn.executemany(
+                "INSERT INTO embeddings (book_id, embedding) VALUES (?, ?)",
+                [(book_id, Embedding(rng.normal(size=8)).to_db()) for book_id in self.ids],
+            )
+            conn.executemany(
+                "INSERT INTO similar (book_id, similar_book_id, score) VALUES (?, ?, 0.5)",
+                [(1, 2), (2, 3), (3, 4)],
+            )
+
+        patcher = mock.patch("app.db.connection.DB_FILE", self.db_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def builders(self) -> list[IndexBuilder]:
+        return [IndexBuilder(HNSW(index_file=self.index_file, threads=1))]
+
+    def test_deleted_files_are_recorded_once_and_similar_rows_dropped(self):
+        with db() as conn:
+            self.assertEqual(TombstoneRepository().add_by_files(conn, ["2.fb2", "missing.fb2"], "inpx_deleted"), 1)
+            self.assertEqual(TombstoneRepository().add_by_files(conn, ["2.fb2"], "inpx_deleted"), 0)
+            self.assertEqual(TombstoneRepository().drop_similar(conn), 2)
+            self.assertEqual(TombstoneRepository().get_pending(conn), [2])
+
+    def test_search_skips_deleted_books_without_rebuild(self):
+        builder = self.builders()[0]
+        builder.rebuild()
+        index = builder.hnsw.load_from_file()
+        books = {book_id: Book(archive_name="a.zip", file_name=f"{book_id}.fb2", title=f"Книга {book_id}", id=book_id) for book_id in self.ids}
+
+        tombstones = Tombstones.load()
+        engine = IndexSimilarSearchEngine(index=index, books=books, limit=10, tombstones=tombstones)
+        source = Book(archive_name="a.zip", file_name="0.fb2", title="Другая", id=0)
+        query = Embedding.from_db(self.embedding(5))
+        self.assertIn(5, [candidate for _, _, candidate in engine.search(source, query)])
+
+        with db() as conn:
+            TombstoneRepository().add(conn, [5], "inpx_deleted")
+        self.assertTrue(tombstones.refresh())
+        self.assertFalse(tombstones.refresh())
+
+        found = [candidate for _, _, candidate in engine.configure(10).search(source, query)]
+        self.assertNotIn(5, found)
+        self.assertEqual(len(found), 10)
+
+    def test_compaction_waits_for_ratio_then_purges_and_rebuilds(self):
+        builders = self.builders()
+        builders[0].rebuild()
+
+        with db() as conn:
+            TombstoneRepository().add(conn, [10, 20], "inpx_deleted")
+
+        compactor = IndexCompactor(ratio=0.05)
+        self.assertEqual(compactor.run(builders=builders), 0)
+
+        with db() as conn:
+            TombstoneRepository().add(conn, [30, 40, 50], "inpx_deleted")
+        self.assertEqual(compactor.run(builders=builders), 5)
+
+        index = HNSW(index_file=self.index_file).load_from_file()
+        self.assertEqual(index.ntotal, 95)
+        self.assertFalse(set(HNSW.get_ids(index).tolist()) & {10, 20, 30, 40, 50})
+        with db() as conn:
+            self.assertEqual(TombstoneRepository().get_pending(conn), [])
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0], 95)
+            self.assertEqual(len(TombstoneRepository().get_ids(conn)), 5)
+
+    def embedding(self, book_id: int) -> bytes:
+        with db() as conn:
+            return conn.execute("SELECT embedding FROM embeddings WHERE book_id = ?", (book_id,)).fetchone()[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
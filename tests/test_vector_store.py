@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from app.db import migrate, VectorStore, VectorStoreOutOfSync
+from app.models import Embedding, EmbeddingMatrix
+
+
+class TestVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.db_file = os.path.join(self.dir.name, "data.db")
+        self.path = os.path.join(self.dir.name, "vectors")
+
+        rng = np.random.default_rng(0)
+        self.rows = [(book_id, Embedding(rng.normal(size=16)).to_db()) for book_id in range(1, 200, 3)]
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executescript(Path(migrate.__file__).with_name("schema.sql").read_text(encoding="utf-8"))
+            conn.executemany("INSERT INTO embeddings (book_id, embedding) VALUES (?, ?)", self.rows)
+
+        patcher = mock.patch("app.db.connection.DB_FILE", self.db_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def expected(self) -> tuple[np.ndarray, np.ndarray]:
+        ids = np.array([book_id for book_id, _ in self.rows], dtype=np.int64)
+        return ids, np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in self.rows])
+
+    def versions(self) -> list[tuple[int, int]]:
+        with sqlite3.connect(self.db_file) as conn:
+            return conn.execute("SELECT book_id, version FROM embedding_versions ORDER BY book_id").fetchall()
+
+    def insert(self, rows: list[tuple[int, bytes]]):
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (book_id, embedding) VALUES (?, ?)", rows)
+        self.rows = sorted({**dict(self.rows), **dict(rows)}.items())
+
+    def test_sync_appends_only_new_books_and_load_matches_sqlite(self):
+        for dtype, tolerance in (("float16", 1e-3), ("int8", 2e-2)):
+            store = VectorStore(f"{self.path}-{dtype}", dtype)
+            self.assertEqual(store.sync(chunk_size=10), len(self.rows))
+            self.assertEqual(store.sync(), 0)
+
+            ids, vectors = self.expected()
+            loaded_ids, loaded = store.load(ids, chunk_size=7)
+            np.testing.assert_array_equal(loaded_ids, ids)
+            self.assertEqual(loaded.dtype, np.float32)
+            np.testing.assert_allclose(loaded, vectors, atol=tolerance)
+
+        size = os.path.getsize(f"{self.path}-float16.1.codes")
+        self.assertEqual(size, len(self.rows) * 16 * 2)
+
+    def test_reembedded_book_is_stale_until_sync_appends_it(self):
+        store = VectorStore(self.path)
+        store.sync()
+        fresh = np.ones(16, dtype=np.float32) / 4
+        self.insert([(4, Embedding(fresh).to_db())])
+
+        with self.assertRaises(VectorStoreOutOfSync):
+            store.check()
+        self.assertEqual(store.sync(), 1)
+
+        ids, _ = self.expected()
+        np.testing.assert_allclose(store.load(ids, store.split_versions(self.versions())[1])[1][1], fresh, atol=1e-3)
+        self.assertEqual(store.check(), (len(self.rows), 1))
+
+    def test_unfinished_append_tail_is_truncated(self):
+        store = VectorStore(self.path, "int8")
+        store.sync()
+        header = store.read_header()
+        for path in store.files(header["generation"]).values():
+            with open(path, "ab") as f:
+                f.write(b"\xff" * 5)
+
+        store.append(np.array([1000]), np.ones((1, 16), dtype=np.float32), np.array([1000]))
+        ids, _, _, scales = store.open()
+        self.assertEqual(os.path.getsize(store.files(1)["ids"]), (len(self.rows) + 1) * 8)
+        self.assertEqual(ids[-1], 1000)
+        self.assertEqual(len(scales), len(self.rows) + 1)
+
+    def test_rewrite_keeps_only_given_books_in_new_generation(self):
+        store = VectorStore(self.path)
+        store.sync()
+        ids, vectors = self.expected()
+
+        self.assertEqual(store.rewrite(ids[::2]), len(ids[::2]))
+        header = store.read_header()
+        self.assertEqual((header["generation"], header["count"]), (2, len(ids[::2])))
+        self.assertFalse(os.path.exists(store.files(1)["codes"]))
+        np.testing.assert_allclose(store.load(ids[::2])[1], vectors[::2], atol=1e-3)
+        with self.assertRaises(VectorStoreOutOfSync):
+            store.rows_for(ids[1:2])
+        self.assertEqual(store.sync(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
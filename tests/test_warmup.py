@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from app.db import AsyncDatabase, migrate
+from app.services import ViewCounter, Warmup
+from tests.similar_api import SimilarApiTestCase
+
+
+class FakeSimilarity:
+    def __init__(self, error: Exception | None = None):
+        self.engine = None
+        self._error = error
+
+    def load_engine(self):
+        if self._error is not None:
+            raise self._error
+        self.engine = SimpleNamespace(version="v1")
+        return self.engine
+
+
+class TestWarmupReadiness(unittest.TestCase):
+    def run_warmup(self, similarity: FakeSimilarity) -> Warmup:
+        warmup = Warmup(similarity, None, None, prefetch=False, hot_books=0)
+        with mock.patch.object(Warmup, "_run_canaries", mock.AsyncMock()):
+            asyncio.run(warmup.run())
+        return warmup
+
+    def test_ready_after_successful_warmup(self):
+        self.assertTrue(self.run_warmup(FakeSimilarity()).ready)
+
+    def test_failed_engine_load_is_not_ready(self):
+        warmup = self.run_warmup(FakeSimilarity(ValueError("битый индекс")))
+        self.assertFalse(warmup.ready)
+        self.assertEqual(warmup.stats()["stage"], "failed")
+
+    def test_missing_index_becomes_ready_once_engine_appears(self):
+        similarity = FakeSimilarity(FileNotFoundError("нет индекса"))
+        warmup = self.run_warmup(similarity)
+        self.assertFalse(warmup.ready)
+
+        similarity.engine = SimpleNamespace(version="v1")
+        self.assertTrue(warmup.ready)
+
+
+class TestViewCounter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.db_file = os.path.join(self.dir.name, "data.db")
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executescript(Path(migrate.__file__).with_name("schema.sql").read_text(encoding="utf-8"))
+            conn.executemany(
+                "INSERT INTO books (id, book, archive, title, author) VALUES (?, ?, 'a.zip', 'Книга', 'Автор')",
+                [(1, "1.fb2"), (2, "2.fb2")],
+            )
+
+        self.database = AsyncDatabase(self.db_file, readers=2)
+        self.addCleanup(self.database.close)
+
+    def views(self) -> dict[int, int]:
+        with sqlite3.connect(self.db_file) as conn:
+            return dict(conn.execute("SELECT book_id, views FROM book_views").fetchall())
+
+    def test_views_are_buffered_until_flush(self):
+        counter = ViewCounter(self.database)
+        for book_id in (1, 1, 2):
+            counter.add(book_id)
+        self.assertEqual(self.views(), {})
+
+        self.assertEqual(asyncio.run(counter.flush()), 3)
+        counter.add(1)
+        asyncio.run(counter.flush())
+
+        self.assertEqual(self.views(), {1: 3, 2: 1})
+        self.assertEqual(counter.pending, 0)
+
+    def test_failed_flush_keeps_views(self):
+        counter = ViewCounter(self.database)
+        counter.add(1)
+        with mock.patch("app.db.BookViewsRepository.add_many", side_effect=sqlite3.OperationalError("database is locked")):
+            with self.assertRaises(sqlite3.OperationalError):
+                asyncio.run(counter.flush())
+
+        self.assertEqual(counter.pending, 1)
+
+
+class TestSimilarApiViews(SimilarApiTestCase):
+    def test_only_existing_books_are_counted(self):
+        for file in ("1.fb2", "missing.fb2", "other-missing.fb2"):
+            self.client.get("/similar/api", params={"file": file, "limit": 3})
+        self.client.get("/similar/events", params={"file": "1.fb2", "limit": 3})
+        self.client.get("/similar/", params={"file": "missing.fb2"})
+
+        self.assertEqual(self.views.pending, 2)
+        asyncio.run(self.views.flush())
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(conn.execute("SELECT book_id, views FROM book_views").fetchall(), [(1, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()